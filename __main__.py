@@ -0,0 +1,14 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,1469 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import asyncio, concurrent.futures, functools, http.client, io, logging, os, os.path, socket, ssl, threading, time, urllib.parse, urllib.request, xml.etree.ElementTree, zlib
+from urllib.error import HTTPError, URLError
+
+from .wcs import CapabilitiesReader
+from .coverage import Coverage, splitDescriptions
+from .httpclient import userAgent, acceptEncoding, encodedChunkSize, getDecoder
+from .metrics import Metrics
+from .download import DownloadCanceled, ProgressGroup, PartialFile, chunkSize
+from .client import getCapabilitiesUrl, getDescribeCoverageUrl, buildCoverageUrls, buildCoverageUrl, getMissingBands, getFileFromCache, beginDownload, recordDownload, buildCachedVrt
+from .cache import normalizeUrl
+from .scheduler import PriorityLimit, requestPriority
+from .retry import RetryPolicy
+from .encoding import EncodingNegotiator
+
+logger = logging.getLogger('simplewcs')
+
+# exception reports of the server are read up to this size
+errorBodySize = 64 * 1024
+
+# max number of coverage ids in one DescribeCoverage request, keeps the url short
+describeBatchSize = 50
+
+# a request is hedged once this many earlier ones of the operation and host are known
+hedgeMinCount = 20
+
+# lower bound of the hedge delay in seconds, fast servers are not asked twice for every request
+hedgeMinDelay = 0.05
+
+
+class EventLoopThread:
+    """
+    Runs an asyncio event loop in a daemon thread. Coroutines are
+    submitted from the GUI thread or from a QgsTask and share the
+    connections of the AsyncHttpClient, which belong to this loop.
+    """
+
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.runLoop, name='simplewcs-asyncio', daemon=True)
+        self.thread.start()
+
+
+    def runLoop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+
+    def submit(self, coroutine):
+        """
+        :return: concurrent.futures.Future of the result
+        """
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+
+    def wait(self, coroutine, isCanceled=None):
+        """
+        Runs a coroutine and blocks the calling thread until it is done
+
+        :param isCanceled: polled while waiting, e.g. QgsTask.isCanceled,
+            the coroutine is canceled as soon as it returns True
+        :raise DownloadCanceled: if the coroutine was canceled
+        """
+
+        future = self.submit(coroutine)
+
+        while True:
+            try:
+                return future.result(timeout=0.1)
+            except concurrent.futures.TimeoutError:
+                if isCanceled is not None and isCanceled():
+                    future.cancel()
+                    raise DownloadCanceled()
+            except concurrent.futures.CancelledError:
+                raise DownloadCanceled()
+
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(1)
+
+
+class AsyncConnection:
+    """
+    Reader and writer of one connection
+    """
+
+
+    def __init__(self, reader, writer, proxied=False):
+        self.reader = reader
+        self.writer = writer
+        self.proxied = proxied
+
+
+    def isClosed(self):
+        return self.reader.at_eof() or self.writer.is_closing()
+
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncHttpClient:
+    """
+    HTTP/1.1 client on asyncio streams, the counterpart of HttpClient
+    for coroutines. Connections are pooled per host and at most poolSize
+    requests run against one host at a time, further requests wait and
+    are let in by the requestPriority of their caller.
+    Errors are raised as urllib's HTTPError and URLError.
+    """
+
+
+    def __init__(self, poolSize=4, timeout=60, metrics=None, rateLimit=0, retryPolicy=None, hedging=False, negotiator=None):
+        """
+        :param poolSize: max number of connections per host
+        :param rateLimit: max number of requests per second and host, 0 for no limit
+        :param timeout: timeout in seconds of connecting and of every read
+        :param metrics: Metrics shared with the callers, a new one by default
+        :param retryPolicy: RetryPolicy of the callers, the default one by default
+        :param hedging: whether requests marked for hedging are sent a second time when slow
+        :param negotiator: EncodingNegotiator of the GetCoverage requests, one without stored statistics by default
+        """
+
+        self.poolSize = poolSize
+        self.timeout = timeout
+        self.rateLimit = rateLimit
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.retryPolicy = retryPolicy or RetryPolicy()
+        self.hedging = hedging
+        self.negotiator = negotiator if negotiator is not None else EncodingNegotiator()
+        self.inflight = RequestRegistry()
+        self.pools = {}
+        self.limits = {}
+        # loop of the requests, known once the first limit was created
+        self.loop = None
+
+
+    async def request(self, url, headers=None, maxRedirects=5, measurement=None, hedge=False):
+        """
+        Sends a GET request and follows redirects
+
+        :param headers: additional request headers
+        :param measurement: Measurement which gets the network phases, status and size
+        :param hedge: True for small requests whose answer does not depend on how often
+            they are sent, e.g. DescribeCoverage, see getHedgeDelay
+        :return: AsyncResponse, the body has to be read or the response closed
+        """
+
+        headers = headers or {}
+
+        delay = self.getHedgeDelay(url, measurement) if hedge else None
+        if delay is None:
+            return await self.followRedirects(url, headers, maxRedirects, measurement)
+
+        return await sendHedged(lambda hedgeMeasurement: self.followRedirects(url, headers, maxRedirects, hedgeMeasurement), delay, measurement)
+
+
+    async def followRedirects(self, url, headers, maxRedirects, measurement):
+        for redirect in range(maxRedirects + 1):
+            response = await self.send(url, headers, measurement)
+
+            if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+                response.close()
+                url = urllib.parse.urljoin(url, response.getheader('Location'))
+                continue
+
+            if response.status < 200 or response.status >= 300:
+                # the exception report is read now, HTTPError is read without await
+                with response:
+                    body = await response.readUpTo(errorBodySize)
+                raise HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(body))
+
+            return response
+
+        raise URLError('too many redirects: ' + url)
+
+
+    async def send(self, url, headers, measurement=None):
+        """
+        One request on a pooled connection. A reused connection may
+        have been closed by the server in the meantime, the request is
+        then repeated once on a new connection.
+        """
+
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise URLError('unsupported scheme: ' + parts.scheme)
+
+        key = (parts.scheme, parts.hostname, parts.port)
+        target = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+
+        allHeaders = {'Host': parts.hostname + (':' + str(parts.port) if parts.port else ''), 'User-Agent': userAgent, 'Connection': 'keep-alive'}
+        allHeaders.update(headers)
+
+        limit = self.getLimit(key)
+        await limit.acquire(requestPriority.get())
+
+        try:
+            while True:
+                conn, reused = await self.getConnection(key, measurement)
+
+                head = 'GET ' + (url if conn.proxied else target) + ' HTTP/1.1\r\n'
+                head += ''.join(name + ': ' + str(value) + '\r\n' for name, value in allHeaders.items()) + '\r\n'
+
+                try:
+                    start = time.perf_counter()
+                    conn.writer.write(head.encode('latin-1'))
+                    await asyncio.wait_for(conn.writer.drain(), self.timeout)
+                    version, status, reason, responseHeaders = await asyncio.wait_for(readHead(conn.reader), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    conn.close()
+                    if reused:
+                        continue
+                    raise URLError(e)
+                except asyncio.TimeoutError:
+                    conn.close()
+                    raise URLError('timed out: ' + url)
+                except (OSError, ValueError, http.client.HTTPException) as e:
+                    conn.close()
+                    raise URLError(e)
+                except asyncio.CancelledError:
+                    # e.g. the slower of a hedged pair, the answer would be left on the connection
+                    conn.close()
+                    raise
+
+                if measurement is not None:
+                    measurement.addPhase('ttfb', time.perf_counter() - start)
+                    measurement.set(status=status)
+
+                return AsyncResponse(self, key, conn, limit, version, status, reason, responseHeaders, url, measurement)
+        except BaseException:
+            limit.release()
+            raise
+
+
+    async def getConnection(self, key, measurement):
+        """
+        :return: idle connection of the host or a new one, and whether it was reused
+        """
+
+        pool = self.pools.get(key)
+        while pool:
+            conn = pool.pop()
+            if not conn.isClosed():
+                return conn, True
+            conn.close()
+
+        return await self.openConnection(key, measurement), False
+
+
+    async def openConnection(self, key, measurement):
+        """
+        Connects to the host or the proxy. Without proxy the host name
+        is looked up first, so the DNS lookup is timed apart from the TCP
+        and TLS handshakes.
+        """
+
+        scheme, host, port = key
+        port = port or (443 if scheme == 'https' else 80)
+        context = ssl.create_default_context() if scheme == 'https' else None
+        loop = asyncio.get_running_loop()
+
+        proxies = urllib.request.getproxies()
+        proxy = proxies.get(scheme)
+        if proxy and urllib.request.proxy_bypass(host):
+            proxy = None
+
+        try:
+            if proxy:
+                proxyParts = urllib.parse.urlsplit(proxy if '://' in proxy else 'http://' + proxy)
+                proxyPort = proxyParts.port or 80
+
+                start = time.perf_counter()
+                if scheme == 'https':
+                    sock = await loop.run_in_executor(None, openTunnel, proxyParts.hostname, proxyPort, host, port, self.timeout)
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(sock=sock, ssl=context, server_hostname=host), self.timeout)
+                    conn = AsyncConnection(reader, writer)
+                else:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(proxyParts.hostname, proxyPort), self.timeout)
+                    conn = AsyncConnection(reader, writer, True)
+
+                if measurement is not None:
+                    measurement.addPhase('connect', time.perf_counter() - start)
+
+                return conn
+
+            start = time.perf_counter()
+            addresses = await asyncio.wait_for(loop.getaddrinfo(host, port, type=socket.SOCK_STREAM), self.timeout)
+            if measurement is not None:
+                measurement.addPhase('dns', time.perf_counter() - start)
+
+            start = time.perf_counter()
+            error = None
+            for family, type, proto, canonname, address in addresses:
+                try:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(address[0], address[1], ssl=context, server_hostname=host if context else None), self.timeout)
+                    break
+                except OSError as e:
+                    error = e
+            else:
+                raise error or OSError('no address of ' + host)
+
+            if measurement is not None:
+                measurement.addPhase('connect', time.perf_counter() - start)
+
+            return AsyncConnection(reader, writer)
+        except asyncio.TimeoutError:
+            raise URLError('timed out connecting to ' + host)
+        except OSError as e:
+            raise URLError(e)
+
+
+    def releaseConnection(self, key, conn):
+        """
+        Puts a connection back into the pool after its response was read completely
+        """
+
+        pool = self.pools.setdefault(key, [])
+        if len(pool) < self.poolSize:
+            pool.append(conn)
+        else:
+            conn.close()
+
+
+    def getHedgeDelay(self, url, measurement):
+        """
+        Time after which a request is sent a second time: the p95 of the time
+        to first byte of the earlier requests of the operation and host
+
+        :param measurement: Measurement of the request, names the operation
+        :return: seconds or None if the request is not hedged
+        """
+
+        if not self.hedging or measurement is None:
+            return None
+
+        host = urllib.parse.urlsplit(url).netloc
+        delay = self.metrics.getPercentileOf(measurement.record['operation'], host, 'ttfb', 95, hedgeMinCount)
+
+        return max(delay, hedgeMinDelay) if delay is not None else None
+
+
+    def getLimit(self, key):
+        """
+        :return: PriorityLimit of the running requests of a host
+        """
+
+        if key not in self.limits:
+            self.loop = asyncio.get_running_loop()
+            self.limits[key] = PriorityLimit(self.poolSize, self.rateLimit)
+
+        return self.limits[key]
+
+
+    async def close(self):
+        """
+        Closes all idle connections
+        """
+
+        for pool in self.pools.values():
+            for conn in pool:
+                conn.close()
+        self.pools = {}
+
+
+    def setPoolSize(self, poolSize):
+        """
+        Applies to the running and waiting requests as well
+        """
+
+        self.poolSize = poolSize
+        self.updateLimits()
+
+
+    def getPoolSize(self):
+        return self.poolSize
+
+
+    def setRateLimit(self, rateLimit):
+        """
+        Applies to the waiting requests as well
+        """
+
+        self.rateLimit = rateLimit
+        self.updateLimits()
+
+
+    def updateLimits(self):
+        """
+        Changes the limits of the hosts on the loop thread, which uses them
+        """
+
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.applyLimits)
+
+
+    def applyLimits(self):
+        for limit in self.limits.values():
+            limit.setSize(self.poolSize)
+            limit.setRate(self.rateLimit)
+
+
+    def getRateLimit(self):
+        return self.rateLimit
+
+
+    def setHedging(self, hedging):
+        self.hedging = hedging
+
+
+    def isHedging(self):
+        return self.hedging
+
+
+    def setTimeout(self, timeout):
+        self.timeout = timeout
+
+
+    def getTimeout(self):
+        return self.timeout
+
+
+class RequestRegistry:
+    """
+    Requests in flight by key, e.g. the normalized url. An identical
+    request started while the first one is running waits for the same
+    transfer and gets the same result instead of sending its own.
+    The transfer is canceled only when every caller waiting for it was.
+    """
+
+
+    def __init__(self):
+        self.requests = {}
+
+
+    def isRunning(self, key):
+        return key in self.requests
+
+
+    async def run(self, key, newCoroutine, progress=None):
+        """
+        :param newCoroutine: function returning the coroutine of the transfer,
+            called with the ProgressGroup of the callers if nothing runs for key yet
+        :param progress: Progress of the caller or None
+        :return: result of the transfer
+        """
+
+        entry = self.requests.get(key)
+        if entry is None:
+            entry = InFlight()
+            entry.task = asyncio.ensure_future(newCoroutine(entry.progress))
+            entry.task.add_done_callback(functools.partial(self.remove, key, entry))
+            self.requests[key] = entry
+
+        entry.waiters += 1
+        if progress is not None:
+            entry.progress.add(progress)
+
+        try:
+            return await asyncio.shield(entry.task)
+        finally:
+            entry.waiters -= 1
+            if progress is not None:
+                entry.progress.remove(progress)
+            if entry.waiters == 0 and not entry.task.done():
+                entry.task.cancel()
+
+
+    def remove(self, key, entry, task):
+        if self.requests.get(key) is entry:
+            del self.requests[key]
+
+        # the callers got the exception already or were canceled
+        if not task.cancelled():
+            task.exception()
+
+
+class InFlight:
+    """
+    Entry of the RequestRegistry
+    """
+
+
+    def __init__(self):
+        self.task = None
+        self.waiters = 0
+        self.progress = ProgressGroup()
+
+
+class AsyncResponse:
+    """
+    Response with coroutines to read the body. The connection goes back
+    into the pool as soon as the body has been read to the end.
+    Bodies with Content-Encoding gzip or deflate are inflated while they are read.
+    """
+
+
+    def __init__(self, client, key, conn, limit, version, status, reason, headers, url, measurement=None):
+        self.client = client
+        self.key = key
+        self.conn = conn
+        self.limit = limit
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.url = url
+        self.measurement = measurement
+        self.decoder = getDecoder(headers)
+        self.released = False
+        self.received = 0
+        self.start = time.perf_counter()
+
+        connection = (headers.get('Connection') or '').lower()
+        self.chunked = 'chunked' in (headers.get('Transfer-Encoding') or '').lower()
+        self.chunkLeft = 0
+
+        try:
+            self.remaining = None if self.chunked else int(headers.get('Content-Length'))
+        except (TypeError, ValueError):
+            self.remaining = None
+
+        # responses without body, e.g. 304 Not Modified
+        if status in (204, 304):
+            self.chunked = False
+            self.remaining = 0
+
+        self.willClose = 'close' in connection or (version == 'HTTP/1.0' and 'keep-alive' not in connection) or (self.remaining is None and not self.chunked)
+        self.done = self.remaining == 0
+        if self.done:
+            self.release()
+
+
+    async def read(self, amt=None):
+        """
+        :param amt: max number of bytes, after inflating if the body is compressed
+        """
+
+        if self.decoder is None:
+            return await self.readRaw(amt)
+
+        try:
+            if amt is None:
+                return self.decoder.decompress(await self.readRaw()) + self.flushDecoder()
+
+            # an empty chunk means the end of the body, so read on until something was inflated
+            while True:
+                if self.decoder.unconsumed_tail:
+                    data = self.decoder.decompress(self.decoder.unconsumed_tail, amt)
+                else:
+                    raw = await self.readRaw(encodedChunkSize)
+                    if not raw:
+                        return self.flushDecoder()
+                    data = self.decoder.decompress(raw, amt)
+
+                if data:
+                    return data
+        except zlib.error as e:
+            self.close()
+            raise URLError('invalid ' + self.getheader('Content-Encoding') + ' response: ' + str(e))
+
+
+    async def readUpTo(self, size):
+        """
+        Reads until size bytes or the end of the body
+        """
+
+        data = b''
+        while len(data) < size:
+            chunk = await self.read(size - len(data))
+            if not chunk:
+                break
+            data += chunk
+
+        return data
+
+
+    def flushDecoder(self):
+        """
+        Rest of the inflated body, later reads return the raw end of the body
+        """
+
+        data = self.decoder.flush()
+        self.decoder = None
+
+        return data
+
+
+    async def readRaw(self, amt=None):
+        """
+        Reads the body as it was sent
+        """
+
+        if self.done:
+            return b''
+
+        try:
+            data = await asyncio.wait_for(self.readBody(amt), self.client.timeout)
+        except asyncio.TimeoutError:
+            self.close()
+            raise URLError('timed out: ' + self.url)
+        except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+            self.close()
+            raise URLError(e)
+
+        self.received += len(data)
+
+        if self.done:
+            self.release()
+
+        return data
+
+
+    async def readBody(self, amt):
+        reader = self.conn.reader
+
+        if self.chunked:
+            return await self.readChunk(amt)
+
+        # no Content-Length, the body ends with the connection
+        if self.remaining is None:
+            data = await reader.read(-1 if amt is None else amt)
+            if not data or amt is None:
+                self.done = True
+            return data
+
+        if amt is None or amt > self.remaining:
+            amt = self.remaining
+
+        data = await reader.read(amt)
+        if not data:
+            raise asyncio.IncompleteReadError(b'', self.remaining)
+
+        self.remaining -= len(data)
+        self.done = self.remaining == 0
+
+        return data
+
+
+    async def readChunk(self, amt):
+        """
+        Transfer-Encoding chunked, returns at most one chunk if amt is given
+        """
+
+        reader = self.conn.reader
+        parts = []
+
+        while True:
+            if self.chunkLeft == 0:
+                line = await reader.readline()
+                size = int(line.split(b';')[0].strip(), 16)
+                if size == 0:
+                    # skip the trailer
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    self.done = True
+                    break
+                self.chunkLeft = size
+
+            size = self.chunkLeft if amt is None else min(amt, self.chunkLeft)
+            parts.append(await reader.readexactly(size))
+            self.chunkLeft -= size
+            if self.chunkLeft == 0:
+                await reader.readexactly(2)
+
+            if amt is not None:
+                break
+
+        return b''.join(parts)
+
+
+    def getcode(self):
+        return self.status
+
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+
+    def geturl(self):
+        return self.url
+
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        self.measureTransfer()
+
+        if self.willClose or not self.done:
+            self.conn.close()
+        else:
+            self.client.releaseConnection(self.key, self.conn)
+
+        self.limit.release()
+
+
+    def close(self):
+        """
+        Releases the connection, it is dropped if the body was not read completely
+        """
+
+        self.release()
+
+
+    def measureTransfer(self):
+        """
+        Adds the time and size of the body to the measurement, once
+        """
+
+        if self.measurement is not None:
+            self.measurement.addPhase('transfer', time.perf_counter() - self.start)
+            self.measurement.set(bytes=self.measurement.record['bytes'] + self.received)
+            self.measurement = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+async def readHead(reader):
+    """
+    Reads status line and headers, informational responses are skipped
+
+    :return: version, status, reason and headers as http.client.HTTPMessage
+    """
+
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise http.client.RemoteDisconnected('Remote end closed connection without response')
+
+        statusLine = line.decode('latin-1').split(None, 2)
+        if len(statusLine) < 2 or not statusLine[0].startswith('HTTP/'):
+            raise http.client.BadStatusLine(line)
+        version = statusLine[0]
+        status = int(statusLine[1])
+        reason = statusLine[2].strip() if len(statusLine) > 2 else ''
+
+        lines = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            lines.append(line)
+
+        if status >= 200:
+            return version, status, reason, http.client.parse_headers(io.BytesIO(b''.join(lines) + b'\r\n'))
+
+
+def openTunnel(proxyHost, proxyPort, host, port, timeout):
+    """
+    Opens a CONNECT tunnel through a proxy, blocking, run in an executor
+
+    :return: socket connected to host through the proxy
+    """
+
+    sock = socket.create_connection((proxyHost, proxyPort), timeout)
+    try:
+        sock.sendall(('CONNECT ' + host + ':' + str(port) + ' HTTP/1.1\r\nHost: ' + host + ':' + str(port) + '\r\n\r\n').encode('latin-1'))
+
+        head = b''
+        while b'\r\n\r\n' not in head:
+            data = sock.recv(4096)
+            if not data:
+                raise OSError('proxy closed the connection')
+            head += data
+
+        status = head.split(None, 2)[1]
+        if status != b'200':
+            raise OSError('proxy refused the tunnel: ' + head.split(b'\r\n')[0].decode('latin-1'))
+    except BaseException:
+        sock.close()
+        raise
+
+    sock.setblocking(False)
+
+    return sock
+
+
+class SummaryReader(CapabilitiesReader):
+    """
+    CapabilitiesReader which hands every coverage summary to a callback
+    """
+
+
+    def __init__(self, onSummary=None):
+        super().__init__()
+        self.onSummary = onSummary
+
+
+    def feed(self, data):
+        summaries = super().feed(data)
+        if self.onSummary is not None:
+            for summary in summaries:
+                self.onSummary(summary)
+
+        return summaries
+
+
+class DescriptionReader:
+    """
+    Incremental parser of a DescribeCoverage response
+    """
+
+
+    def __init__(self):
+        self.parser = xml.etree.ElementTree.XMLParser()
+
+
+    def feed(self, data):
+        self.parser.feed(data)
+
+
+    def close(self):
+        """
+        :return: Coverage
+        """
+
+        return Coverage(self.parser.close())
+
+
+class DescriptionsReader(DescriptionReader):
+    """
+    Incremental parser of a DescribeCoverage response for several coverage ids
+    """
+
+
+    def close(self):
+        """
+        :return: dict of coverage id and Coverage
+        """
+
+        return splitDescriptions(self.parser.close())
+
+
+class AsyncWcsClient:
+    """
+    Coroutine counterpart of WcsClient. Runs on an EventLoopThread,
+    so describes and downloads of several coverages overlap on one thread
+    and the dialog never waits for the network.
+    Errors are raised as urllib's HTTPError and URLError.
+    """
+
+
+    def __init__(self, url, version='2.0.1', httpClient=None, metadataCache=None):
+        """
+        :param url: base url of the WCS
+        :param version: WCS version used for GetCapabilities and GetCoverage
+        :param httpClient: shared AsyncHttpClient, a new one by default
+        :param metadataCache: MetadataCache or None to keep documents in memory only
+        """
+
+        self.url = url
+        self.version = version
+        self.httpClient = httpClient or AsyncHttpClient()
+        self.metadataCache = metadataCache
+        self.documents = {}
+        self.wcs = None
+
+
+    async def getCapabilities(self, onSummary=None):
+        """
+        :param onSummary: called on the loop thread with the dict of every
+            CoverageSummary while the document is parsed
+        :return: WCS
+        """
+
+        self.wcs = await self.requestMetadata(getCapabilitiesUrl(self.url, self.version), lambda: SummaryReader(onSummary), 'GetCapabilities')
+
+        return self.wcs
+
+
+    async def describeCoverage(self, covId):
+        """
+        :return: Coverage
+        """
+
+        wcs = await self.getWCS()
+
+        return await self.requestMetadata(getDescribeCoverageUrl(wcs, covId), DescriptionReader, 'DescribeCoverage')
+
+
+    async def describeCoverages(self, covIds):
+        """
+        Describes several coverages in one DescribeCoverage request, WCS 2.0
+        takes a comma separated list of ids. Coverages missing in the answer,
+        or all if the server refuses the list, are described one by one.
+        Coverages whose description fails are left out.
+
+        :return: dict of coverage id and Coverage
+        """
+
+        wcs = await self.getWCS()
+        coverages = {}
+
+        # a single id is requested like describeCoverage, so the cached document is shared
+        batches = [covIds[i:i + describeBatchSize] for i in range(0, len(covIds), describeBatchSize)]
+        batches = [batch for batch in batches if len(batch) > 1]
+        results = await asyncio.gather(*[self.requestMetadata(getDescribeCoverageUrl(wcs, ','.join(batch)), DescriptionsReader, 'DescribeCoverage') for batch in batches], return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.info('DescribeCoverage of several coverages failed, they are described one by one: ' + str(result))
+                continue
+            coverages.update(result)
+
+        missing = [covId for covId in covIds if covId not in coverages]
+        results = await asyncio.gather(*[self.describeCoverage(covId) for covId in missing], return_exceptions=True)
+        for covId, result in zip(missing, results):
+            if isinstance(result, BaseException):
+                logger.warning('DescribeCoverage of ' + covId + ' failed, it is left out: ' + str(result))
+                continue
+            coverages[covId] = result
+
+        return {covId: coverages[covId] for covId in covIds if covId in coverages}
+
+
+    async def getCoverageUrls(self, covId, coordinates, outputCrs, subsettingCrs, format, tiles=1, scaling=None, bands=None):
+        """
+        See WcsClient.getCoverageUrls
+        """
+
+        coverage = await self.describeCoverage(covId)
+
+        return buildCoverageUrls(await self.getWCS(), coverage, covId, self.version, coordinates, outputCrs, subsettingCrs, format, tiles, scaling, bands, self.httpClient.negotiator)
+
+
+    async def getCoverage(self, covId, coordinates, outputCrs, subsettingCrs, format, cache, progress, tiles=1, scaling=None, workers=4, bands=None):
+        """
+        Describes the coverage and downloads the extent,
+        as one file or as tiles mosaicked to a VRT
+
+        :param cache: TileCache
+        :param progress: Progress of the task
+        :param workers: max number of tiles downloaded at the same time
+        :param bands: names of the range fields to request, None for all
+        :return: file, or None if the VRT could not be built
+        """
+
+        urls = await self.getCoverageUrls(covId, coordinates, outputCrs, subsettingCrs, format, tiles, scaling, bands)
+
+        if len(urls) == 1:
+            return await getCachedFile(self.httpClient, urls[0], cache, progress)
+
+        return await getCachedMosaic(self.httpClient, urls, cache, progress, workers)
+
+
+    async def getMosaicUrls(self, windows, coordinates, outputCrs, subsettingCrs, format, scaling=None, bands=None):
+        """
+        Describes several coverages in one batch
+
+        :param windows: dict of coverage id and the part of the extent it covers as [xmin, ymin, xmax, ymax]
+        :param coordinates: whole extent, the canvas size of the scaling refers to it
+        :param bands: names of the range fields to request, None for all
+        :return: list of GetCoverage urls, one per coverage, coverages without the bands are left out
+        """
+
+        coverages = await self.describeCoverages(list(windows))
+        wcs = await self.getWCS()
+
+        if not coverages:
+            raise URLError('no coverage of the mosaic could be described')
+
+        # all bands of such a coverage would be sent, the mosaic would mix band counts
+        described = []
+        for covId, coverage in coverages.items():
+            missing = getMissingBands(coverage, bands) if wcs.supportsRangeSubsetting() else []
+            if missing:
+                logger.warning('Left out of the mosaic, coverage ' + covId + ' has no band ' + ', '.join(missing))
+                continue
+            described.append((covId, coverage))
+
+        if not described:
+            raise URLError('no coverage of the mosaic has the bands ' + ', '.join(bands))
+
+        return [
+            buildCoverageUrl(wcs, coverage, covId, self.version, windows[covId], coordinates, outputCrs, subsettingCrs, format, scaling, bands, self.httpClient.negotiator)
+            for covId, coverage in described
+        ]
+
+
+    async def getCoverages(self, windows, coordinates, outputCrs, subsettingCrs, format, cache, progress, scaling=None, workers=4, bands=None):
+        """
+        Describes several coverages in one batch and downloads
+        them at the same time, mosaicked to one VRT
+
+        :param windows: dict of coverage id and the part of the extent it covers as [xmin, ymin, xmax, ymax]
+        :param coordinates: whole extent, the canvas size of the scaling refers to it
+        :param cache: TileCache
+        :param progress: Progress of the task
+        :param workers: max number of coverages downloaded at the same time
+        :param bands: names of the range fields to request, None for all
+        :return: file, or None if the VRT could not be built
+        """
+
+        urls = await self.getMosaicUrls(windows, coordinates, outputCrs, subsettingCrs, format, scaling, bands)
+
+        if len(urls) == 1:
+            return await getCachedFile(self.httpClient, urls[0], cache, progress)
+
+        return await getCachedMosaic(self.httpClient, urls, cache, progress, workers)
+
+
+    def setVersion(self, version):
+        self.version = version
+
+
+    def getVersion(self):
+        return self.version
+
+
+    async def getWCS(self):
+        """
+        Capabilities of the service, requested on first use
+        """
+
+        if self.wcs is None:
+            await self.getCapabilities()
+
+        return self.wcs
+
+
+    async def requestXML(self, url, headers=None, measurement=None, hedge=False):
+        """
+        The response is requested compressed and inflated while it is read.
+
+        :param headers: additional request headers, e.g. validators of a cached document
+        :param hedge: whether a slow request is sent a second time
+        :return: response, an answer 304 Not Modified is returned as HTTPError
+        """
+
+        logger.info('Requested URL: ' + url)
+
+        allHeaders = {'Accept-Encoding': acceptEncoding}
+        allHeaders.update(headers or {})
+
+        try:
+            return await self.httpClient.request(url, allHeaders, measurement=measurement, hedge=hedge)
+        except HTTPError as e:
+            if e.code == 304:
+                return e
+            raise
+
+
+    async def requestMetadata(self, url, newReader, operation):
+        """
+        Returns the parsed GetCapabilities or DescribeCoverage document of an url
+        and records the request in the metrics of the AsyncHttpClient.
+
+        :param newReader: function returning a new reader with feed(data) and close() returning the document
+        :param operation: name of the request in the metrics
+        """
+
+        key = operation + ' ' + normalizeUrl(url)
+        if self.httpClient.inflight.isRunning(key):
+            return await joinRequest(self.httpClient, key, operation, url)
+
+        return await self.httpClient.inflight.run(key, lambda progress: self.measureMetadata(url, newReader, operation))
+
+
+    async def measureMetadata(self, url, newReader, operation):
+        measurement = self.httpClient.metrics.begin(operation, url)
+
+        # descriptions are small, the capabilities of a large service are not sent twice
+        hedge = operation == 'DescribeCoverage'
+
+        try:
+            obj = await self.httpClient.retryPolicy.run(lambda: self.fetchMetadata(url, newReader, measurement, hedge), measurement)
+        except BaseException as e:
+            measurement.finish(e)
+            raise
+
+        measurement.finish()
+
+        return obj
+
+
+    async def fetchMetadata(self, url, newReader, measurement, hedge=False):
+        """
+        Fresh documents come from the metadata cache, stale ones are
+        revalidated. Transferred documents are parsed while they are
+        written to the cache.
+
+        :param hedge: whether a slow request is sent a second time
+        """
+
+        cache = self.metadataCache
+
+        if cache is None:
+            if url in self.documents:
+                measurement.set(cache='hit')
+            else:
+                measurement.set(cache='miss')
+                with await self.requestXML(url, measurement=measurement, hedge=hedge) as xmlResponse:
+                    self.documents[url] = await readDocument(xmlResponse, newReader(), measurement)
+            return self.documents[url]
+
+        key = cache.getKey(url)
+        entry = cache.get(key)
+
+        if entry is not None and cache.isFresh(key):
+            obj = self.getCachedMetadata(key, newReader, measurement)
+            if obj is not None:
+                measurement.set(cache='hit')
+                return obj
+
+        xmlResponse = await self.requestXML(url, cache.getValidators(key), measurement, hedge)
+
+        if xmlResponse.getcode() == 304:
+            xmlResponse.close()
+            cache.refresh(key, xmlResponse.headers)
+            obj = self.getCachedMetadata(key, newReader, measurement)
+            if obj is not None:
+                logger.info('Not modified: ' + url)
+                measurement.set(cache='revalidated')
+                return obj
+
+            # the cached document is gone, it is requested again without validators
+            logger.info('Cached document missing, requested again: ' + url)
+            xmlResponse = await self.requestXML(url, measurement=measurement, hedge=hedge)
+            if xmlResponse.getcode() == 304:
+                xmlResponse.close()
+                raise URLError('Not Modified without validators: ' + url)
+
+        measurement.set(cache='miss')
+        file = cache.getPath(key)
+        with xmlResponse, open(file + '.part', 'wb') as f:
+            obj = await readDocument(xmlResponse, newReader(), measurement, f)
+        os.replace(file + '.part', file)
+        cache.put(key, url, file, xmlResponse.headers)
+        cache.setObject(key, obj)
+
+        return obj
+
+
+    def getCachedMetadata(self, key, newReader, measurement):
+        """
+        Parses a cached document only once per session
+
+        :return: parsed document, None if the entry is missing
+        """
+
+        cache = self.metadataCache
+
+        obj = cache.getObject(key)
+        if obj is None:
+            entry = cache.get(key)
+            if entry is None:
+                return None
+            reader = newReader()
+            try:
+                with open(entry['file'], 'rb') as f, measurement.phase('parse'):
+                    for data in iter(lambda: f.read(64 * 1024), b''):
+                        reader.feed(data)
+                    obj = reader.close()
+            except Exception:
+                cache.discard(key)
+                raise
+            cache.setObject(key, obj)
+
+        return obj
+
+
+async def readDocument(response, reader, measurement, file=None):
+    """
+    Feeds a response to a reader chunk by chunk
+
+    :param file: file object which gets a copy of the document, e.g. in the cache
+    :return: parsed document
+    """
+
+    while True:
+        data = await response.read(chunkSize)
+        if not data:
+            break
+        if file is not None:
+            file.write(data)
+        with measurement.phase('parse'):
+            reader.feed(data)
+
+    with measurement.phase('parse'):
+        return reader.close()
+
+
+async def fetchFile(client, url, file, progress, retryPolicy=None, measurement=None, throttle=None, hedge=False):
+    """
+    Coroutine version of download.fetchFile, with the same
+    partial files and journals, so either can resume the other.
+
+    :param client: AsyncHttpClient
+    :param retryPolicy: RetryPolicy, the one of the client by default
+    :param throttle: Throttle which limits the throughput, None for full speed
+    :param hedge: whether a slow request is sent a second time, for small files like tiles
+    :return: file
+    """
+
+    retryPolicy = retryPolicy or client.retryPolicy
+
+    return await retryPolicy.run(lambda: fetchPart(client, url, file, progress, measurement, throttle, hedge), measurement)
+
+
+async def fetchPart(client, url, file, progress, measurement=None, throttle=None, hedge=False):
+    """
+    One try of fetchFile, continues a partial download if possible
+    """
+
+    partial = PartialFile(file, url, progress)
+
+    try:
+        response = await client.request(url, partial.getHeaders(), measurement=measurement, hedge=hedge)
+    except HTTPError as e:
+        # the partial file does not fit the resource any more
+        if e.code == 416 and partial.offset:
+            partial.discard()
+            return await fetchPart(client, url, file, progress, measurement, throttle, hedge)
+        raise
+
+    with response:
+        partial.open(response)
+        try:
+            while True:
+                partial.checkCanceled()
+
+                chunk = await response.read(chunkSize)
+                if not chunk:
+                    break
+
+                partial.write(chunk)
+
+                if throttle is not None:
+                    await throttle.consume(len(chunk))
+
+            partial.complete()
+        except BaseException:
+            partial.abort()
+            raise
+
+    return partial.commit()
+
+
+class Throttle:
+    """
+    Limits the summed throughput of the downloads sharing it.
+    Every chunk books its share of time, a download waits
+    while the time of the chunks before is not over yet.
+    """
+
+
+    def __init__(self, rate):
+        """
+        :param rate: bytes per second
+        """
+
+        self.rate = rate
+        self.next = 0.0
+
+
+    async def consume(self, size):
+        now = asyncio.get_running_loop().time()
+        start = max(self.next, now)
+        self.next = start + size / self.rate
+
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+async def sendHedged(newRequest, delay, measurement):
+    """
+    Sends a request and, if it has no answer after delay seconds, the same
+    request again. The first answer is taken, the other request is canceled.
+    Fails only if both fail, with the error of the first.
+
+    :param newRequest: function returning a new request coroutine, called with the Measurement of the request
+    :param measurement: Measurement, records which of the two answered first
+    :return: AsyncResponse
+    """
+
+    start = time.perf_counter()
+    tasks = [asyncio.ensure_future(newRequest(measurement))]
+
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            logger.info('Hedged request after ' + str(round(delay, 3)) + ' s: ' + measurement.record['url'])
+            tasks.append(asyncio.ensure_future(newRequest(None)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if any(task.exception() is None for task in done):
+                    break
+    except BaseException:
+        for task in tasks:
+            dropRequest(task)
+        raise
+
+    winner = next((task for task in tasks if task.done() and task.exception() is None), tasks[0])
+    for task in tasks:
+        if task is not winner:
+            dropRequest(task)
+
+    response = winner.result()
+
+    if len(tasks) > 1:
+        measurement.set(hedged='first' if winner is tasks[0] else 'second')
+
+    # the measurement did not see the head of the duplicate
+    if winner is not tasks[0]:
+        measurement.addPhase('ttfb', time.perf_counter() - start)
+        measurement.set(status=response.status)
+        response.measurement = measurement
+
+    return response
+
+
+def dropRequest(task):
+    """
+    Cancels a request which lost the race, or closes its response
+    """
+
+    if task.done():
+        closeResponse(task)
+    else:
+        task.cancel()
+        task.add_done_callback(closeResponse)
+
+
+def closeResponse(task):
+    """
+    Drops the response of a request which lost the race
+    """
+
+    if task.cancelled() or task.exception() is not None:
+        return
+
+    response = task.result()
+    response.measurement = None
+    response.close()
+
+
+async def supportsRanges(httpClient, url):
+    """
+    Requests the first byte of a response, e.g. before a coverage is streamed
+
+    :param httpClient: AsyncHttpClient
+    :return: True if the server answered with 206 Partial Content
+    """
+
+    response = await httpClient.request(url, {'Range': 'bytes=0-0'})
+
+    # the connection is kept for the byte, a whole coverage is not read
+    if response.status == 206:
+        await response.read()
+        return True
+
+    response.close()
+
+    return False
+
+
+async def joinRequest(httpClient, key, operation, url, progress=None):
+    """
+    Waits for an identical request which is running already,
+    recorded with cache 'shared' in the metrics
+
+    :return: result of the running request
+    """
+
+    measurement = httpClient.metrics.begin(operation, url)
+    measurement.set(cache='shared')
+
+    try:
+        result = await httpClient.inflight.run(key, None, progress)
+    except BaseException as e:
+        measurement.finish(e)
+        raise
+
+    measurement.finish()
+
+    return result
+
+
+async def getCachedFile(httpClient, url, cache, progress, hedge=False):
+    """
+    Coroutine version of client.getCachedFile, identical
+    downloads running at the same time share one transfer
+
+    :param httpClient: AsyncHttpClient
+    :param cache: TileCache
+    :param hedge: whether a slow request is sent a second time
+    :return: file
+    """
+
+    # the index is written to disk, off the loop thread
+    loop = asyncio.get_running_loop()
+    file = await loop.run_in_executor(None, getFileFromCache, httpClient, url, cache, progress)
+    if file is not None:
+        return file
+
+    inflightKey = 'GetCoverage ' + cache.getKey(url)
+    if httpClient.inflight.isRunning(inflightKey):
+        logger.info('Shared URL: ' + url)
+        return await joinRequest(httpClient, inflightKey, 'GetCoverage', url, progress)
+
+    return await httpClient.inflight.run(inflightKey, lambda group: downloadFile(httpClient, url, cache, group, hedge), progress)
+
+
+async def downloadFile(httpClient, url, cache, progress, hedge=False):
+    """
+    Downloads a GetCoverage response into the cache
+
+    :param progress: Progress or ProgressGroup
+    """
+
+    measurement = beginDownload(httpClient, url)
+    try:
+        file = await fetchFile(httpClient, url, cache.getPath(cache.getKey(url)), progress, measurement=measurement, hedge=hedge)
+    except BaseException as e:
+        # the task may be canceled, so nothing is awaited here
+        recordDownload(httpClient, url, cache, None, measurement, e)
+        raise
+    await asyncio.get_running_loop().run_in_executor(None, recordDownload, httpClient, url, cache, file, measurement)
+
+    return file
+
+
+async def getCachedMosaic(httpClient, urls, cache, progress, workers):
+    """
+    Coroutine version of client.getCachedMosaic, the tiles are
+    downloaded at the same time on the loop thread
+
+    :param workers: max number of tiles downloaded at the same time
+    :return: vrt or None if GDAL failed
+    """
+
+    semaphore = asyncio.Semaphore(workers)
+
+    # tiles are small, a slow one is requested a second time
+    async def getTile(url):
+        async with semaphore:
+            return await getCachedFile(httpClient, url, cache, progress, hedge=True)
+
+    tiles = [asyncio.ensure_future(getTile(url)) for url in urls]
+    try:
+        files = await asyncio.gather(*tiles)
+    except BaseException:
+        for tile in tiles:
+            tile.cancel()
+        raise
+
+    # GDAL and the index run in a worker thread
+    key = cache.getMosaicKey([cache.getKey(url) for url in urls])
+    loop = asyncio.get_running_loop()
+
+    return await httpClient.inflight.run('BuildVrt ' + key, lambda group: loop.run_in_executor(None, buildCachedVrt, files, cache, key))
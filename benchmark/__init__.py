@@ -0,0 +1,11 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Benchmarks against a local stand-in WCS, run from the plugins directory:
+        python -m simplewcs2.benchmark --output results.json
+"""
@@ -0,0 +1,469 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import argparse, io, json, os.path, platform, statistics, sys, tempfile, time, xml.etree.ElementTree
+
+from ..wcs import WCS
+from ..coverage import Coverage
+from ..client import WcsClient, getCachedFile
+from ..cache import TileCache
+from ..catalog import ServerCatalog
+from ..encoding import EncodingNegotiator, getEncodingLabel, readTiffInfo
+from ..asyncclient import EventLoopThread, AsyncHttpClient, AsyncWcsClient
+from ..download import Progress, fetchFile
+from ..httpclient import HttpClient
+from ..streaming import getVsiCurlPath
+from .payloads import makeCapabilities, makeDescription
+from .server import StandInServer
+
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(prog='simplewcs2.benchmark', description='Benchmarks the plugin against a local stand-in WCS')
+    parser.add_argument('--coverages', default='100,1000,10000', help='catalog sizes of the capabilities, default 100,1000,10000')
+    parser.add_argument('--payloads', default='0.25,1,16', help='GeoTIFF sizes in MB, default 0.25,1,16')
+    parser.add_argument('--latency', type=float, default=0.02, help='server latency in seconds for GetCoverage, default 0.02')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of every benchmark, default 5')
+    parser.add_argument('--output', help='json file, default stdout')
+
+    return parser.parse_args(argv)
+
+
+def getStats(seconds):
+    """
+    :param seconds: durations of the runs
+    :return: dict of min, median, mean, p95 and max in seconds
+    """
+
+    ordered = sorted(seconds)
+
+    return {
+        'runs': len(ordered),
+        'min': ordered[0],
+        'median': statistics.median(ordered),
+        'mean': statistics.mean(ordered),
+        'p95': ordered[min(int(round(0.95 * (len(ordered) - 1))), len(ordered) - 1)],
+        'max': ordered[-1]
+    }
+
+
+def measure(function, repeat):
+    """
+    :return: durations of repeat calls of function in seconds
+    """
+
+    seconds = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+
+    return seconds
+
+
+def parseCapabilities(document):
+    return WCS(io.BytesIO(document))
+
+
+def benchmarkCapabilities(catalogs, repeat):
+    """
+    Parsing of GetCapabilities documents with both crs extension namespaces
+    """
+
+    results = []
+    for coverages in catalogs:
+        for nonstandardCrs in (False, True):
+            document = makeCapabilities('http://127.0.0.1/wcs?', coverages, nonstandardCrs)
+
+            wcs = parseCapabilities(document)
+            if len(wcs.covIds) != coverages or not wcs.getCRS():
+                raise RuntimeError('Capabilities with ' + str(coverages) + ' coverages were not parsed completely')
+
+            result = getStats(measure(lambda: parseCapabilities(document), repeat))
+            result.update({'coverages': coverages, 'nonstandardCrs': nonstandardCrs, 'bytes': len(document)})
+            results.append(result)
+
+    return results
+
+
+def benchmarkCatalog(catalogs, repeat, directory):
+    """
+    Capabilities of a saved connection read from the server catalog
+    compared to parsing the GetCapabilities document
+    """
+
+    catalog = ServerCatalog(os.path.join(directory, 'catalog.sqlite'))
+    results = []
+
+    for coverages in catalogs:
+        url = 'http://127.0.0.1/wcs?coverages=' + str(coverages)
+        document = makeCapabilities('http://127.0.0.1/wcs?', coverages)
+        catalog.put(url, '2.0.1', parseCapabilities(document))
+
+        if len(catalog.get(url)['wcs'].getCoverageIds()) != coverages:
+            raise RuntimeError('Catalog with ' + str(coverages) + ' coverages was not read completely')
+
+        for source, load in (('parse', lambda: parseCapabilities(document)), ('catalog', lambda: catalog.get(url))):
+            result = getStats(measure(load, repeat))
+            result.update({'coverages': coverages, 'source': source})
+            results.append(result)
+
+    catalog.close()
+
+    return results
+
+
+def benchmarkDescribeCoverage(repeat):
+    """
+    Parsing of DescribeCoverage documents
+    """
+
+    document = makeDescription('coverage_0')
+    parse = lambda: Coverage(xml.etree.ElementTree.parse(io.BytesIO(document)).getroot())
+
+    result = getStats(measure(parse, repeat * 100))
+    result['bytes'] = len(document)
+
+    return [result]
+
+
+def benchmarkCoverageIndex(catalogs, repeat):
+    """
+    Building the spatial index of the coverage summaries and querying a view of about 5 x 5 coverages
+    """
+
+    results = []
+    for coverages in catalogs:
+        wcs = parseCapabilities(makeCapabilities('http://127.0.0.1/wcs?', coverages, False))
+        bbox = [11.3, 51.4, 11.345, 51.445]
+
+        def build():
+            wcs.setBoundingBoxes(wcs.getBoundingBoxes())
+            wcs.getCoverageIndex()
+
+        result = getStats(measure(build, repeat))
+        result.update({'coverages': coverages, 'operation': 'build'})
+        results.append(result)
+
+        found = len(wcs.getCoverageIdsInExtent(bbox))
+        result = getStats(measure(lambda: wcs.getCoverageIdsInExtent(bbox), repeat * 100))
+        result.update({'coverages': coverages, 'operation': 'query', 'found': found})
+        results.append(result)
+
+    return results
+
+
+def benchmarkCapabilitiesTransfer(server, coverages, repeat):
+    """
+    GetCapabilities over HTTP with and without gzip, bytes are counted on the wire
+    """
+
+    server.setCatalog(coverages)
+    results = []
+
+    for compress in (False, True):
+        server.setCompress(compress)
+        httpClient = HttpClient()
+
+        def getCapabilities():
+            WcsClient(server.getUrl(), httpClient=httpClient).getCapabilities()
+
+        getCapabilities()
+        sent = server.bytesSent
+        result = getStats(measure(getCapabilities, repeat))
+        result.update({'coverages': coverages, 'compressed': compress, 'bytes': (server.bytesSent - sent) // repeat})
+        results.append(result)
+
+        httpClient.close()
+
+    server.setCompress(True)
+
+    return results
+
+
+def benchmarkDescribeConcurrency(server, count, repeat):
+    """
+    DescribeCoverage of several coverages, one after the other
+    with the blocking client and in batches with the asyncio client
+    """
+
+    covIds = ['coverage_' + str(i) for i in range(count)]
+    results = []
+
+    httpClient = HttpClient()
+    wcsClient = WcsClient(server.getUrl(), httpClient=httpClient)
+    wcsClient.getCapabilities()
+
+    def describeBlocking():
+        wcsClient.documents = {}
+        for covId in covIds:
+            wcsClient.describeCoverage(covId)
+
+    result = getStats(measure(describeBlocking, repeat))
+    result['client'] = 'blocking'
+    results.append(result)
+    httpClient.close()
+
+    loopThread = EventLoopThread()
+    asyncClient = AsyncHttpClient()
+    asyncWcsClient = AsyncWcsClient(server.getUrl(), httpClient=asyncClient)
+    loopThread.wait(asyncWcsClient.getCapabilities())
+
+    def describeAsync():
+        asyncWcsClient.documents = {}
+        loopThread.wait(asyncWcsClient.describeCoverages(covIds))
+
+    result = getStats(measure(describeAsync, repeat))
+    result['client'] = 'asyncio batch'
+    results.append(result)
+    loopThread.wait(asyncClient.close())
+    loopThread.stop()
+
+    for result in results:
+        result.update({'coverages': count, 'latency': server.latency})
+
+    return results
+
+
+def benchmarkGetCoverage(server, repeat, directory):
+    """
+    Capabilities, DescribeCoverage and GetCoverage of one extent.
+    Cold runs use a new client and connections, warm runs keep both.
+    """
+
+    url = server.getUrl()
+    bbox = [300000, 5700000, 301000, 5701000]
+    results = []
+
+    def getCoverage(wcsClient):
+        getCoverageUrl = wcsClient.getCoverageUrls('coverage_0', bbox, 'EPSG:25833', 'EPSG:25833', 'image/tiff')[0]
+        fetchFile(wcsClient.httpClient, getCoverageUrl, os.path.join(directory, 'coverage.tif'), Progress())
+
+    def cold():
+        httpClient = HttpClient()
+        try:
+            getCoverage(WcsClient(url, httpClient=httpClient))
+        finally:
+            httpClient.close()
+
+    result = getStats(measure(cold, repeat))
+    result['mode'] = 'cold'
+    results.append(result)
+
+    httpClient = HttpClient()
+    wcsClient = WcsClient(url, httpClient=httpClient)
+    getCoverage(wcsClient)
+
+    result = getStats(measure(lambda: getCoverage(wcsClient), repeat))
+    result['mode'] = 'warm'
+    results.append(result)
+
+    httpClient.close()
+
+    for result in results:
+        result.update({'latency': server.latency, 'bytes': len(server.payload)})
+
+    return results
+
+
+def benchmarkThroughput(server, sizes, repeat, directory):
+    """
+    Download of GeoTIFFs of different sizes over one kept alive connection
+    """
+
+    httpClient = HttpClient()
+    url = server.getUrl() + 'REQUEST=GetCoverage&SERVICE=WCS&VERSION=2.0.1&COVERAGEID=coverage_0'
+    file = os.path.join(directory, 'throughput.tif')
+    results = []
+
+    for size in sizes:
+        server.setPayloadSize(int(size * 1024 * 1024))
+        fetchFile(httpClient, url, file, Progress())
+
+        result = getStats(measure(lambda: fetchFile(httpClient, url, file, Progress()), repeat))
+        result['bytes'] = len(server.payload)
+        result['MBps'] = len(server.payload) / 1024 / 1024 / result['median']
+        results.append(result)
+
+    httpClient.close()
+
+    return results
+
+
+def benchmarkRangeSubset(server, size, repeat, directory):
+    """
+    GetCoverage of all four bands of a coverage compared to
+    three and one band requested with RANGESUBSET
+    """
+
+    server.setPayloadSize(int(size * 1024 * 1024), bands=4)
+
+    httpClient = HttpClient()
+    wcsClient = WcsClient(server.getUrl(), httpClient=httpClient)
+    bbox = [300000, 5700000, 301000, 5701000]
+    file = os.path.join(directory, 'bands.tif')
+    results = []
+
+    for bands in (None, ['red', 'green', 'blue'], ['nir']):
+        url = wcsClient.getCoverageUrls('coverage_0', bbox, 'EPSG:25833', 'EPSG:25833', 'image/tiff', bands=bands)[0]
+        fetchFile(httpClient, url, file, Progress())
+
+        result = getStats(measure(lambda: fetchFile(httpClient, url, file, Progress()), repeat))
+        result.update({'bands': 4 if bands is None else len(bands), 'bytes': os.path.getsize(file)})
+        results.append(result)
+
+    httpClient.close()
+
+    return results
+
+
+def benchmarkEncoding(server, size, requests, directory):
+    """
+    GetCoverage of distinct extents without encoding parameters compared
+    to the encoding chosen by the negotiator, which tries the compressions
+    the server offers and settles on the one with the smallest responses
+    """
+
+    server.setEncoding(True)
+    server.setPayloadSize(int(size * 1024 * 1024), bands=4)
+    results = []
+
+    for mode in ('off', 'automatic'):
+        httpClient = HttpClient(negotiator=EncodingNegotiator(mode=mode))
+        wcsClient = WcsClient(server.getUrl(), httpClient=httpClient)
+        cache = TileCache(os.path.join(directory, 'encoding-' + mode), 1024 * 1024 * 1024)
+        encodings = []
+        sizes = []
+
+        for i in range(requests):
+            bbox = [300000 + i * 1000, 5700000, 301000 + i * 1000, 5701000]
+            url = wcsClient.getCoverageUrls('coverage_0', bbox, 'EPSG:25833', 'EPSG:25833', 'image/tiff')[0]
+            file = getCachedFile(httpClient, url, cache, Progress())
+            encodings.append(getEncodingLabel(url))
+            sizes.append(os.path.getsize(file))
+
+        info = readTiffInfo(file)
+        results.append({
+            'mode': mode,
+            'encodings': encodings,
+            'bytes': sizes,
+            'totalBytes': sum(sizes),
+            'bytesPerPixel': sizes[-1] / (info['width'] * info['height'])
+        })
+
+        httpClient.close()
+
+    server.setEncoding(False)
+
+    return results
+
+
+def benchmarkStreaming(server, size, repeat):
+    """
+    Reading a 256 x 256 window of a GetCoverage response through /vsicurl/
+    compared to the whole response, bytes are counted on the wire.
+    Needs the GDAL python bindings, skipped without them.
+    """
+
+    try:
+        from osgeo import gdal
+    except ImportError:
+        return []
+
+    server.setPayloadSize(int(size * 1024 * 1024))
+    path = getVsiCurlPath(server.getUrl() + 'REQUEST=GetCoverage&SERVICE=WCS&VERSION=2.0.1&COVERAGEID=coverage_0')
+
+    def readWindow():
+        gdal.VSICurlClearCache()
+        dataset = gdal.Open(path)
+        if dataset is None or dataset.GetRasterBand(1).ReadRaster(0, 0, 256, 256) is None:
+            raise RuntimeError('Could not read ' + path)
+
+    sent = server.bytesSent
+    result = getStats(measure(readWindow, repeat))
+    result.update({'bytes': (server.bytesSent - sent) // repeat, 'payload': len(server.payload)})
+
+    return [result]
+
+
+def getPluginVersion():
+    with open(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'metadata.txt')) as f:
+        for line in f:
+            if line.startswith('version='):
+                return line.split('=', 1)[1].strip()
+
+    return None
+
+
+def main(argv=None):
+    args = parseArguments(argv)
+
+    catalogs = [int(value) for value in args.coverages.split(',')]
+    sizes = [float(value) for value in args.payloads.split(',')]
+
+    results = {
+        'plugin': getPluginVersion(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': args.repeat
+    }
+
+    print('Capabilities parsing', file=sys.stderr)
+    results['capabilities'] = benchmarkCapabilities(catalogs, args.repeat)
+
+    print('Coverage index', file=sys.stderr)
+    results['coverageIndex'] = benchmarkCoverageIndex(catalogs, args.repeat)
+
+    print('Server catalog', file=sys.stderr)
+    with tempfile.TemporaryDirectory() as directory:
+        results['catalog'] = benchmarkCatalog(catalogs, args.repeat, directory)
+
+    print('Coverage parsing', file=sys.stderr)
+    results['describeCoverage'] = benchmarkDescribeCoverage(args.repeat)
+
+    server = StandInServer(coverages=catalogs[0], latency=args.latency).start()
+    try:
+        print('Capabilities transfer', file=sys.stderr)
+        results['capabilitiesTransfer'] = benchmarkCapabilitiesTransfer(server, catalogs[-1], args.repeat)
+        server.setCatalog(catalogs[0])
+
+        print('DescribeCoverage concurrency', file=sys.stderr)
+        results['describeConcurrency'] = benchmarkDescribeConcurrency(server, 16, args.repeat)
+
+        with tempfile.TemporaryDirectory() as directory:
+            print('GetCoverage latency', file=sys.stderr)
+            results['getCoverage'] = benchmarkGetCoverage(server, args.repeat, directory)
+
+            print('Download throughput', file=sys.stderr)
+            server.setLatency(0.0)
+            results['throughput'] = benchmarkThroughput(server, sizes, args.repeat, directory)
+
+            print('Range subsetting', file=sys.stderr)
+            results['rangeSubset'] = benchmarkRangeSubset(server, sizes[-1], args.repeat, directory)
+
+            print('GeoTIFF encoding', file=sys.stderr)
+            results['encoding'] = benchmarkEncoding(server, sizes[1] if len(sizes) > 1 else sizes[0], max(args.repeat, 6), directory)
+
+        print('Streaming', file=sys.stderr)
+        results['streaming'] = benchmarkStreaming(server, sizes[-1], args.repeat)
+    finally:
+        server.stop()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+
+    return 0
+
+
+sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+
+        Synthetic GetCapabilities, DescribeCoverage and GeoTIFF documents
+"""
+
+import random, struct, zlib
+
+
+def makeCapabilities(url, coverages, nonstandardCrs=False, geotiff=False):
+    """
+    GetCapabilities document with a number of coverages laid out in a grid over Brandenburg
+
+    :param url: href of the operations
+    :param coverages: number of CoverageSummary elements
+    :param nonstandardCrs: use the alternative crs extension namespace
+    :param geotiff: list the GeoTIFF encoding parameters the stand-in server applies
+    :return: bytes
+    """
+
+    if nonstandardCrs:
+        crsExtension = ('<wcs:Extension>'
+            '<crsn:crsSupported>http://www.opengis.net/def/crs/EPSG/0/25833</crsn:crsSupported>'
+            '<crsn:crsSupported>http://www.opengis.net/def/crs/EPSG/0/4326</crsn:crsSupported>'
+            '</wcs:Extension>')
+    else:
+        crsExtension = ('<wcs:Extension><crs:CrsMetadata>'
+            '<crs:crsSupported>http://www.opengis.net/def/crs/EPSG/0/25833</crs:crsSupported>'
+            '<crs:crsSupported>http://www.opengis.net/def/crs/EPSG/0/4326</crs:crsSupported>'
+            '</crs:CrsMetadata></wcs:Extension>')
+
+    geotiffExtension = ''
+    if geotiff:
+        geotiffExtension = ('<wcs:Extension><geotiff:parameters xmlns:geotiff="http://www.opengis.net/gmlcov/geotiff/1.0">'
+            '<geotiff:compression>None Deflate</geotiff:compression>'
+            '<geotiff:predictor>None Horizontal</geotiff:predictor>'
+            '</geotiff:parameters></wcs:Extension>')
+
+    operations = ''.join('<ows:Operation name="' + name + '"><ows:DCP><ows:HTTP><ows:Get xlink:href="' + url + '"/></ows:HTTP></ows:DCP></ows:Operation>' for name in ('GetCapabilities', 'DescribeCoverage', 'GetCoverage'))
+
+    summaries = []
+    columns = max(int(coverages ** 0.5), 1)
+    for i in range(coverages):
+        lon = 11.3 + (i % columns) * 0.01
+        lat = 51.4 + (i // columns) * 0.01
+        summaries.append('<wcs:CoverageSummary><ows:Title>Tile ' + str(i) + '</ows:Title>'
+            '<ows:WGS84BoundingBox><ows:LowerCorner>' + format(lon, '.5f') + ' ' + format(lat, '.5f') + '</ows:LowerCorner>'
+            '<ows:UpperCorner>' + format(lon + 0.01, '.5f') + ' ' + format(lat + 0.01, '.5f') + '</ows:UpperCorner></ows:WGS84BoundingBox>'
+            '<wcs:CoverageId>coverage_' + str(i) + '</wcs:CoverageId>'
+            '<wcs:CoverageSubtype>RectifiedGridCoverage</wcs:CoverageSubtype></wcs:CoverageSummary>')
+
+    document = ('<?xml version="1.0" encoding="UTF-8"?>'
+        '<wcs:Capabilities xmlns:wcs="http://www.opengis.net/wcs/2.0" xmlns:ows="http://www.opengis.net/ows/2.0"'
+        ' xmlns:xlink="http://www.w3.org/1999/xlink" xmlns:crs="http://www.opengis.net/wcs/crs/1.0"'
+        ' xmlns:crsn="http://www.opengis.net/wcs/service-extension/crs/1.0" version="2.0.1">'
+        '<ows:ServiceIdentification><ows:Title>Stand-in WCS</ows:Title><ows:ServiceType>OGC WCS</ows:ServiceType>'
+        '<ows:ServiceTypeVersion>2.0.1</ows:ServiceTypeVersion><ows:ServiceTypeVersion>2.0.0</ows:ServiceTypeVersion>'
+        '<ows:Profile>http://www.opengis.net/spec/WCS/2.0/conf/core</ows:Profile>'
+        '<ows:Profile>http://www.opengis.net/spec/WCS_service-extension_scaling/1.0/conf/scaling</ows:Profile>'
+        '<ows:Profile>http://www.opengis.net/spec/WCS_service-extension_range-subsetting/1.0/conf/record-subsetting</ows:Profile>'
+        '<ows:Profile>http://www.opengis.net/spec/GMLCOV_geotiff-coverages/1.0/conf/geotiff-coverage</ows:Profile>'
+        '<ows:Fees>none</ows:Fees><ows:AccessConstraints>none</ows:AccessConstraints></ows:ServiceIdentification>'
+        '<ows:ServiceProvider><ows:ProviderName>Benchmark</ows:ProviderName></ows:ServiceProvider>'
+        '<ows:OperationsMetadata>' + operations + '</ows:OperationsMetadata>'
+        '<wcs:ServiceMetadata><wcs:formatSupported>image/tiff</wcs:formatSupported>'
+        '<wcs:formatSupported>image/png</wcs:formatSupported>' + crsExtension + geotiffExtension + '</wcs:ServiceMetadata>'
+        '<wcs:Contents>' + ''.join(summaries) + '</wcs:Contents></wcs:Capabilities>')
+
+    return document.encode()
+
+
+def makeDescription(covId, bands=('red', 'green', 'blue', 'nir')):
+    """
+    DescribeCoverage document of a coverage in EPSG:25833,
+    of several coverages for a comma separated list of ids
+
+    :return: bytes
+    """
+
+    fields = ''.join('<swe:field name="' + band + '"><swe:Quantity><swe:constraint><swe:AllowedValues>'
+        '<swe:interval>0 255</swe:interval></swe:AllowedValues></swe:constraint></swe:Quantity></swe:field>' for band in bands)
+
+    document = ('<?xml version="1.0" encoding="UTF-8"?>'
+        '<wcs:CoverageDescriptions xmlns:wcs="http://www.opengis.net/wcs/2.0" xmlns:gml="http://www.opengis.net/gml/3.2"'
+        ' xmlns:gmlcov="http://www.opengis.net/gmlcov/1.0" xmlns:swe="http://www.opengis.net/swe/2.0">'
+        + ''.join('<wcs:CoverageDescription gml:id="' + id + '">'
+        '<gml:boundedBy><gml:Envelope srsName="http://www.opengis.net/def/crs/EPSG/0/25833" axisLabels="x y" uomLabels="m m" srsDimension="2">'
+        '<gml:lowerCorner>300000 5700000</gml:lowerCorner><gml:upperCorner>500000 5950000</gml:upperCorner></gml:Envelope></gml:boundedBy>'
+        '<wcs:CoverageId>' + id + '</wcs:CoverageId>'
+        '<gmlcov:rangeType><swe:DataRecord>' + fields + '</swe:DataRecord></gmlcov:rangeType>'
+        '</wcs:CoverageDescription>' for id in covId.split(','))
+        + '</wcs:CoverageDescriptions>')
+
+    return document.encode()
+
+
+def makeGeoTiff(width, height, bands=3, origin=(300000.0, 5950000.0), resolution=1.0, epsg=25833, noise=0, compression=None, predictor=None):
+    """
+    8 bit GeoTIFF in one strip, the pixels form a gradient
+
+    :param noise: range of random values added to every pixel, 0 for a smooth gradient
+    :param compression: None or 'Deflate'
+    :param predictor: None or 'Horizontal', applied before Deflate
+    :return: bytes
+    """
+
+    row = bytes((x * 255 // max(width - 1, 1)) for x in range(width) for band in range(bands))
+    if noise:
+        # the same texture on every call, so the sizes of the encodings can be compared
+        generator = random.Random(0)
+        rows = [bytes(min(value + generator.randrange(noise), 255) for value in row) for y in range(height)]
+    else:
+        rows = [row] * height
+
+    deflate = compression is not None and compression.lower() == 'deflate'
+    horizontal = deflate and predictor is not None and predictor.lower() == 'horizontal'
+    if horizontal:
+        rows = [row[:bands] + bytes((row[i] - row[i - bands]) & 255 for i in range(bands, len(row))) for row in rows]
+
+    pixels = b''.join(rows)
+    if deflate:
+        pixels = zlib.compress(pixels)
+
+    # tag, type, values; types: 3 SHORT, 4 LONG, 12 DOUBLE
+    extraSamples = bands - 3 if bands >= 3 else bands - 1
+    tags = [
+        (256, 4, [width]),
+        (257, 4, [height]),
+        (258, 3, [8] * bands),
+        (259, 3, [8 if deflate else 1]),
+        (262, 3, [2 if bands >= 3 else 1]),
+        (273, 4, [8]),
+        (277, 3, [bands]),
+        (278, 4, [height]),
+        (279, 4, [len(pixels)]),
+        (284, 3, [1]),
+    ]
+    if horizontal:
+        tags.append((317, 3, [2]))
+    if extraSamples:
+        tags.append((338, 3, [0] * extraSamples))
+    tags += [
+        (33550, 12, [resolution, resolution, 0.0]),
+        (33922, 12, [0.0, 0.0, 0.0, origin[0], origin[1], 0.0]),
+        (34735, 3, [1, 1, 0, 3, 1024, 0, 1, 1, 1025, 0, 1, 1, 3072, 0, 1, epsg]),
+    ]
+
+    formats = {3: 'H', 4: 'I', 12: 'd'}
+
+    # values longer than 4 bytes are stored between pixels and directory
+    padding = b'\x00' * (len(pixels) % 2)
+    data = b''
+    dataOffset = 8 + len(pixels) + len(padding)
+    entries = []
+    for tag, type, values in tags:
+        packed = struct.pack('<' + formats[type] * len(values), *values)
+        if len(packed) <= 4:
+            entries.append(struct.pack('<HHI', tag, type, len(values)) + packed.ljust(4, b'\x00'))
+        else:
+            entries.append(struct.pack('<HHII', tag, type, len(values), dataOffset + len(data)))
+            data += packed
+            if len(data) % 2:
+                data += b'\x00'
+
+    ifdOffset = dataOffset + len(data)
+    header = b'II*\x00' + struct.pack('<I', ifdOffset)
+    directory = struct.pack('<H', len(entries)) + b''.join(entries) + struct.pack('<I', 0)
+
+    return header + pixels + padding + data + directory
@@ -0,0 +1,211 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+
+        Local stand-in WCS for the benchmarks
+"""
+
+import gzip, http.server, re, sys, threading, time, urllib.parse
+
+from .payloads import makeCapabilities, makeDescription, makeGeoTiff
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # headers and body are written separately, delayed ACKs would add 40 ms
+    disable_nagle_algorithm = True
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+
+        query = urllib.parse.urlsplit(self.path).query
+        params = dict((key.upper(), value) for key, value in urllib.parse.parse_qsl(query))
+        request = params.get('REQUEST', '')
+
+        time.sleep(server.latency)
+
+        compress = server.compress and 'gzip' in (self.headers.get('Accept-Encoding') or '')
+
+        if request == 'GetCapabilities':
+            self.sendBody(server.getCapabilities(compress), 'application/xml', compressed=compress)
+        elif request == 'DescribeCoverage':
+            description = makeDescription(params.get('COVERAGEID', 'coverage'))
+            self.sendBody(gzip.compress(description) if compress else description, 'application/xml', compressed=compress)
+        elif request == 'GetCoverage':
+            bands = params.get('RANGESUBSET')
+            payload = server.getPayload(len(bands.split(',')) if bands else None, params.get('GEOTIFF:COMPRESSION'), params.get('GEOTIFF:PREDICTOR'))
+            self.sendBody(payload, 'image/tiff', ranges=True)
+        else:
+            self.sendBody(b'<ows:ExceptionReport xmlns:ows="http://www.opengis.net/ows/2.0"/>', 'application/xml', 400)
+
+
+    def sendBody(self, body, contentType, status=200, ranges=False, compressed=False):
+        """
+        Sends the body, parts of it if a Range was requested
+        """
+
+        start, end = 0, len(body) - 1
+
+        range = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range') or '')
+        if ranges and range and int(range.group(1)) < len(body):
+            start = int(range.group(1))
+            if range.group(2):
+                end = min(int(range.group(2)), end)
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', '"' + str(id(body)) + '"')
+        if compressed:
+            self.send_header('Content-Encoding', 'gzip')
+        if ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', 'bytes ' + str(start) + '-' + str(end) + '/' + str(len(body)))
+        self.end_headers()
+
+        self.wfile.write(memoryview(body)[start:end + 1])
+        self.server.bytesSent += end - start + 1
+
+
+class StandInServer(http.server.ThreadingHTTPServer):
+    """
+    Serves synthetic GetCapabilities, DescribeCoverage and GeoTIFF GetCoverage
+    responses on localhost, with an optional latency before every answer
+    """
+
+    daemon_threads = True
+
+
+    def __init__(self, coverages=100, nonstandardCrs=False, payloadSize=1024 * 1024, latency=0.0, compress=True):
+        """
+        :param coverages: number of coverages in the capabilities
+        :param nonstandardCrs: use the alternative crs extension namespace
+        :param payloadSize: approximate size of the GeoTIFF in bytes
+        :param latency: seconds to wait before every answer
+        :param compress: gzip xml responses if the client accepts it
+        """
+
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+
+        self.latency = latency
+        self.compress = compress
+        self.requests = 0
+        self.bytesSent = 0
+        self.capabilities = None
+        self.compressedCapabilities = None
+        self.encoding = False
+        self.setCatalog(coverages, nonstandardCrs)
+        self.setPayloadSize(payloadSize)
+
+
+    def getUrl(self):
+        return 'http://127.0.0.1:' + str(self.server_port) + '/wcs?'
+
+
+    def setCatalog(self, coverages, nonstandardCrs=False):
+        self.coverages = coverages
+        self.nonstandardCrs = nonstandardCrs
+        self.capabilities = None
+        self.compressedCapabilities = None
+
+
+    def getCapabilities(self, compressed=False):
+        if self.capabilities is None:
+            self.capabilities = makeCapabilities(self.getUrl(), self.coverages, self.nonstandardCrs, self.encoding)
+
+        if compressed:
+            if self.compressedCapabilities is None:
+                self.compressedCapabilities = gzip.compress(self.capabilities)
+            return self.compressedCapabilities
+
+        return self.capabilities
+
+
+    def setPayloadSize(self, payloadSize, bands=3):
+        side = max(int((payloadSize / bands) ** 0.5), 1)
+        self.payload = makeGeoTiff(side, side, bands)
+        self.payloadSide = side
+        self.payloadBands = bands
+        self.subsets = {}
+
+
+    def getPayload(self, bands=None, compression=None, predictor=None):
+        """
+        :param bands: number of bands requested with RANGESUBSET, all by default
+        :param compression: GEOTIFF:COMPRESSION, only applied if encoding is enabled
+        :param predictor: GEOTIFF:PREDICTOR, only applied if encoding is enabled
+        :return: GeoTIFF of the size set with setPayloadSize
+        """
+
+        if not self.encoding:
+            compression, predictor = None, None
+        elif compression is None:
+            compression = 'None'
+
+        if bands is None and compression is None:
+            return self.payload
+
+        key = (bands, compression, predictor)
+        if key not in self.subsets:
+            # encoded payloads get a texture, a plain gradient would compress to almost nothing
+            self.subsets[key] = makeGeoTiff(self.payloadSide, self.payloadSide, bands or self.payloadBands, noise=16 if self.encoding else 0, compression=compression, predictor=predictor)
+
+        return self.subsets[key]
+
+
+    def setEncoding(self, encoding):
+        """
+        :param encoding: advertise and apply the GeoTIFF compressions None and Deflate and the horizontal predictor
+        """
+
+        self.encoding = encoding
+        self.capabilities = None
+        self.compressedCapabilities = None
+        self.subsets = {}
+
+
+    def setLatency(self, latency):
+        self.latency = latency
+
+
+    def setCompress(self, compress):
+        self.compress = compress
+
+
+    def handle_error(self, request, client_address):
+        """
+        Clients drop connections on purpose, e.g. after a range probe
+        """
+
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+    def start(self):
+        """
+        Serves in a background thread
+        """
+
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+        return self
+
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,397 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import hashlib, json, os, os.path, re, threading, time, urllib.parse
+
+
+def normalizeUrl(url):
+    """
+    Returns a canonical form of a request url: lower case scheme and host,
+    upper case parameter names and parameters in sorted order.
+    Two urls asking for the same data result in the same string, so a
+    lossless GeoTIFF encoding is left out, unlike a lossy one.
+    """
+
+    parts = urllib.parse.urlsplit(url)
+    params = [(key.upper(), value) for key, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)]
+    params.sort()
+
+    compression = dict(params).get('GEOTIFF:COMPRESSION', '')
+    if compression.lower() != 'jpeg':
+        params = [(key, value) for key, value in params if key not in ('GEOTIFF:COMPRESSION', 'GEOTIFF:PREDICTOR')]
+
+    base = parts.scheme.lower() + '://' + parts.netloc.lower() + parts.path
+
+    return base + '?' + urllib.parse.urlencode(params)
+
+
+class Cache:
+    """
+    Base of the caches: a directory of files and a persisted index
+    """
+
+
+    def __init__(self, directory):
+        """
+        :param directory: cache directory, created if missing
+        """
+
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.indexPath = os.path.join(self.directory, 'index.json')
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.index = {}
+        try:
+            with open(self.indexPath) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+
+    def getKey(self, url):
+        """
+        Cache key of a request, independent of parameter order and case
+        """
+
+        return hashlib.sha1(normalizeUrl(url).encode()).hexdigest()
+
+
+    def writeIndex(self):
+        """
+        Writes the index atomically, so it survives a crash of QGIS
+        """
+
+        tmp = self.indexPath + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.indexPath)
+
+
+class TileCache(Cache):
+    """
+    Persistent on-disk cache for GetCoverage responses.
+    Entries are evicted least recently used first as soon as
+    the cache grows beyond its quota.
+    """
+
+
+    def __init__(self, directory, quota):
+        """
+        :param directory: cache directory, created if missing
+        :param quota: max size of the cache in bytes
+        """
+
+        super().__init__(directory)
+        self.quota = quota
+
+        self.removePartials()
+
+
+    def removePartials(self, maxAge=7 * 24 * 3600):
+        """
+        Removes interrupted downloads which were not resumed for a while
+        """
+
+        for name in os.listdir(self.directory):
+            if name.endswith('.part') or name.endswith('.journal'):
+                path = os.path.join(self.directory, name)
+                try:
+                    if os.path.getmtime(path) < time.time() - maxAge:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+
+    def getMosaicKey(self, keys):
+        """
+        Cache key of a mosaic built from the entries 'keys'
+        """
+
+        return hashlib.sha1(''.join(keys).encode()).hexdigest()
+
+
+    def getDerivedKey(self, key, *options):
+        """
+        Cache key of a file derived from the entry 'key', e.g. its COG conversion
+        """
+
+        return hashlib.sha1((key + ':' + ':'.join(options)).encode()).hexdigest()
+
+
+    def getPath(self, key, suffix='.tif'):
+        """
+        Location of the file of an entry, whether it exists or not
+        """
+
+        return os.path.join(self.directory, key + suffix)
+
+
+    def get(self, key):
+        """
+        :return: path of the cached file or None
+        """
+
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+
+            if not os.path.exists(entry['file']):
+                del self.index[key]
+                self.writeIndex()
+                return None
+
+            entry['access'] = time.time()
+            self.writeIndex()
+
+            return entry['file']
+
+
+    def put(self, key, file):
+        """
+        Registers a file which was written to getPath(key)
+        and evicts old entries if the quota is exceeded
+        """
+
+        with self.lock:
+            self.index[key] = {'file': file, 'size': os.path.getsize(file), 'access': time.time()}
+            self.evict(keep=key)
+            self.writeIndex()
+
+
+    def evict(self, keep=None):
+        """
+        Removes least recently used entries until the cache fits into its quota.
+        The entry 'keep' is never removed.
+        """
+
+        size = sum(entry['size'] for entry in self.index.values())
+
+        for key in sorted(self.index, key=lambda key: self.index[key]['access']):
+            if size <= self.quota:
+                break
+            if key == keep:
+                continue
+
+            entry = self.index[key]
+            try:
+                os.remove(entry['file'])
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # file is probably still opened by a layer
+                continue
+
+            size -= entry['size']
+            del self.index[key]
+
+
+    def clear(self):
+        """
+        Removes all entries
+        """
+
+        with self.lock:
+            quota = self.quota
+            self.quota = 0
+            self.evict()
+            self.quota = quota
+            self.writeIndex()
+
+
+    def getSize(self):
+        with self.lock:
+            return sum(entry['size'] for entry in self.index.values())
+
+
+    def setQuota(self, quota):
+        with self.lock:
+            self.quota = quota
+            self.evict()
+            self.writeIndex()
+
+
+    def getQuota(self):
+        return self.quota
+
+
+
+class MetadataCache(Cache):
+    """
+    Cache for GetCapabilities and DescribeCoverage documents.
+    The xml is persisted together with its HTTP validators (ETag, Last-Modified),
+    parsed documents are kept in memory.
+    """
+
+
+    def __init__(self, directory, ttl):
+        """
+        :param directory: cache directory, created if missing
+        :param ttl: seconds an entry is fresh if the server sends no max-age
+        """
+
+        super().__init__(directory)
+        self.ttl = ttl
+        self.objects = {}
+
+
+    def getPath(self, key):
+        return os.path.join(self.directory, key + '.xml')
+
+
+    def get(self, key):
+        """
+        :return: entry with file, validators and expiry or None
+        """
+
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is not None and not os.path.exists(entry['file']):
+                self.remove(key)
+                self.writeIndex()
+                return None
+
+            return entry
+
+
+    def isFresh(self, key):
+        """
+        Fresh entries can be used without asking the server
+        """
+
+        entry = self.index.get(key)
+
+        return entry is not None and entry['expires'] > time.time()
+
+
+    def getValidators(self, key):
+        """
+        :return: headers for a conditional request of the entry
+        """
+
+        entry = self.index.get(key)
+        headers = {}
+
+        if entry is None:
+            return headers
+
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['lastModified']:
+            headers['If-Modified-Since'] = entry['lastModified']
+
+        return headers
+
+
+    def put(self, key, url, file, headers):
+        """
+        Registers a document which was written to getPath(key)
+
+        :param headers: response headers
+        """
+
+        with self.lock:
+            self.index[key] = {
+                'url': url,
+                'file': file,
+                'etag': headers.get('ETag'),
+                'lastModified': headers.get('Last-Modified'),
+                'expires': self.getExpiry(headers)
+            }
+            self.objects.pop(key, None)
+            self.writeIndex()
+
+
+    def refresh(self, key, headers):
+        """
+        Marks an entry as fresh again after the server answered 304 Not Modified,
+        an entry removed in the meantime is left out
+        """
+
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return
+            entry['expires'] = self.getExpiry(headers)
+            if headers.get('ETag'):
+                entry['etag'] = headers.get('ETag')
+            self.writeIndex()
+
+
+    def remove(self, key):
+        """
+        Drops an entry, the caller has to hold the lock
+        """
+
+        entry = self.index.pop(key, None)
+        self.objects.pop(key, None)
+
+        if entry is not None:
+            try:
+                os.remove(entry['file'])
+            except OSError:
+                pass
+
+
+    def discard(self, key):
+        """
+        Drops an entry, e.g. a document which could not be parsed
+        """
+
+        with self.lock:
+            self.remove(key)
+            self.writeIndex()
+
+
+    def getExpiry(self, headers):
+        """
+        Expiry from Cache-Control max-age, falls back to the default ttl
+        """
+
+        cacheControl = headers.get('Cache-Control') or ''
+
+        if 'no-cache' in cacheControl or 'no-store' in cacheControl:
+            return time.time()
+
+        maxAge = re.search(r'max-age=(\d+)', cacheControl)
+        if maxAge:
+            return time.time() + int(maxAge.group(1))
+
+        return time.time() + self.ttl
+
+
+    def getObject(self, key):
+        return self.objects.get(key)
+
+
+    def setObject(self, key, obj):
+        self.objects[key] = obj
+
+
+    def clear(self):
+        """
+        Removes all entries
+        """
+
+        with self.lock:
+            for key in list(self.index):
+                self.remove(key)
+            self.writeIndex()
+
+
+    def setTtl(self, ttl):
+        self.ttl = ttl
+
+
+    def getTtl(self):
+        return self.ttl
@@ -0,0 +1,203 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import json, logging, os, os.path, sqlite3, threading, time, zlib
+
+from .wcs import WCS
+
+logger = logging.getLogger('simplewcs')
+
+# raised whenever the stored form of the capabilities changes, older entries are dropped
+catalogVersion = 1
+
+
+def dumpCapabilities(wcs):
+    """
+    Compact form of parsed capabilities: deflated json
+
+    :param wcs: WCS
+    :return: bytes
+    """
+
+    bboxes = wcs.getBoundingBoxes()
+    document = {
+        'describeCoverageUrl': wcs.getDescribeCoverageUrl(),
+        'getCoverageUrl': wcs.getGetCoverageUrl(),
+        'title': wcs.getTitle(),
+        'provider': wcs.getProvider(),
+        'fees': wcs.getFees(),
+        'constraints': wcs.getConstraints(),
+        'versions': wcs.getVersions(),
+        'profiles': wcs.getProfiles(),
+        'crs': wcs.getCRS(),
+        'formats': wcs.getFormats(),
+        'geotiffParameters': wcs.getGeotiffParameters(),
+        'coverages': [[covId, bboxes.get(covId)] for covId in wcs.getCoverageIds()]
+    }
+
+    return zlib.compress(json.dumps(document, separators=(',', ':')).encode())
+
+
+def loadCapabilities(data):
+    """
+    :param data: bytes from dumpCapabilities
+    :return: WCS, its coverage index is built on first use
+    """
+
+    document = json.loads(zlib.decompress(data))
+
+    wcs = WCS()
+    wcs.setDescribeCoverageUrl(document['describeCoverageUrl'])
+    wcs.setGetCoverageUrl(document['getCoverageUrl'])
+    wcs.setTitle(document['title'])
+    wcs.setProvider(document['provider'])
+    wcs.setFees(document['fees'])
+    wcs.setConstraints(document['constraints'])
+    wcs.setVersions(document['versions'])
+    wcs.setProfiles(document['profiles'])
+    wcs.setCRS(document['crs'])
+    wcs.setFormats(document['formats'])
+    wcs.setGeotiffParameters(document['geotiffParameters'])
+    wcs.setCoverageIds([covId for covId, bbox in document['coverages']])
+    wcs.setBoundingBoxes({covId: bbox for covId, bbox in document['coverages']})
+
+    return wcs
+
+
+class ServerCatalog:
+    """
+    Saved connections: the WCS the user has opened, each with its parsed
+    capabilities, so the dialog shows a server at once and only refreshes
+    it in the background. Kept in one SQLite file, safe to use from
+    several threads.
+    """
+
+
+    def __init__(self, path):
+        """
+        :param path: SQLite file, created if missing
+        """
+
+        self.path = path
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        try:
+            self.db = self.connect(path)
+        except sqlite3.OperationalError as e:
+            # e.g. locked by another QGIS or not writable, the file is kept and the catalog lives in memory this session
+            logger.warning('Could not open server catalog ' + path + ', saved connections are not available: ' + str(e))
+            self.db = self.connect(':memory:')
+        except sqlite3.DatabaseError as e:
+            # the saved connections can be rebuilt, a damaged file is started anew
+            logger.warning('Could not open server catalog ' + path + ': ' + str(e))
+            os.remove(path)
+            self.db = self.connect(path)
+
+
+    def connect(self, path):
+        db = sqlite3.connect(path, check_same_thread=False)
+
+        try:
+            with db:
+                if db.execute('PRAGMA user_version').fetchone()[0] != catalogVersion:
+                    db.execute('DROP TABLE IF EXISTS servers')
+                    db.execute('PRAGMA user_version = ' + str(catalogVersion))
+                db.execute(
+                    'CREATE TABLE IF NOT EXISTS servers ('
+                    'url TEXT PRIMARY KEY, version TEXT, title TEXT, coverages INTEGER, '
+                    'used REAL, refreshed REAL, capabilities BLOB)'
+                )
+        except sqlite3.DatabaseError:
+            db.close()
+            raise
+
+        return db
+
+
+    def put(self, url, version, wcs):
+        """
+        Saves or updates the connection with freshly requested capabilities
+
+        :param version: WCS version chosen by the user
+        :param wcs: WCS
+        """
+
+        data = dumpCapabilities(wcs)
+        now = time.time()
+
+        with self.lock, self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO servers (url, version, title, coverages, used, refreshed, capabilities) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, version, wcs.getTitle() or '', len(wcs.getCoverageIds()), now, now, data)
+            )
+
+
+    def get(self, url):
+        """
+        :return: dict of url, version, refreshed and wcs, None if the connection is not saved or unreadable
+        """
+
+        with self.lock:
+            row = self.db.execute('SELECT version, refreshed, capabilities FROM servers WHERE url = ?', (url,)).fetchone()
+
+        if row is None:
+            return None
+
+        try:
+            wcs = loadCapabilities(row[2])
+        except (ValueError, KeyError, TypeError, zlib.error) as e:
+            logger.warning('Could not read saved capabilities of ' + url + ': ' + str(e))
+            self.remove(url)
+            return None
+
+        return {'url': url, 'version': row[0], 'refreshed': row[1], 'wcs': wcs}
+
+
+    def touch(self, url):
+        """
+        Marks a connection as used now, the list is sorted by last use
+        """
+
+        with self.lock, self.db:
+            self.db.execute('UPDATE servers SET used = ? WHERE url = ?', (time.time(), url))
+
+
+    def remove(self, url):
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM servers WHERE url = ?', (url,))
+
+
+    def getServers(self):
+        """
+        :return: list of dicts of url, version, title, coverages and refreshed, the last used first
+        """
+
+        with self.lock:
+            rows = self.db.execute('SELECT url, version, title, coverages, refreshed FROM servers ORDER BY used DESC').fetchall()
+
+        return [{'url': row[0], 'version': row[1], 'title': row[2], 'coverages': row[3], 'refreshed': row[4]} for row in rows]
+
+
+    def getLastUsed(self):
+        """
+        :return: url of the last used connection or None
+        """
+
+        servers = self.getServers()
+
+        return servers[0]['url'] if servers else None
+
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,211 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+
+        Batch download without QGIS, run from the plugins directory:
+        python -m simplewcs2 URL --coverage ID --bbox XMIN,YMIN,XMAX,YMAX --crs EPSG:25833 --out DIR
+"""
+
+import argparse, concurrent.futures, csv, json, logging, mimetypes, os, os.path, re, sys, time
+from urllib.error import HTTPError, URLError
+
+from .client import WcsClient
+from .cache import MetadataCache
+from .download import Progress, fetchFile
+from .encoding import EncodingNegotiator, encodingModes
+from .httpclient import HttpClient
+from .metrics import Metrics
+from .retry import RetryPolicy
+from .tiling import gridExtent
+
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(prog='simplewcs2', description='Downloads coverages of a WCS 2.X without QGIS')
+    parser.add_argument('url', help='base url of the WCS')
+    parser.add_argument('--coverage', action='append', default=[], help='coverage id, can be repeated')
+    parser.add_argument('--bbox', action='append', default=[], help='xmin,ymin,xmax,ymax in --crs, can be repeated')
+    parser.add_argument('--jobs', help='csv file with lines coverageId,xmin,ymin,xmax,ymax[,crs], the crs is --crs if left out')
+    parser.add_argument('--grid', type=float, help='split every bbox into cells of this size in map units')
+    parser.add_argument('--crs', help='crs of the bboxes, sent as SUBSETTINGCRS, required with --bbox')
+    parser.add_argument('--output-crs', help='OUTPUTCRS, the crs of the bbox by default')
+    parser.add_argument('--format', default='image/tiff', help='FORMAT, default image/tiff')
+    parser.add_argument('--version', default='2.0.1', dest='wcsVersion', help='WCS version, default 2.0.1')
+    parser.add_argument('--resolution', type=float, help='ground resolution in map units per pixel (Scaling extension)')
+    parser.add_argument('--scale-factor', type=float, help='scale factor (Scaling extension)')
+    parser.add_argument('--bands', help='comma separated names of the bands to download, all by default (Range Subsetting extension)')
+    parser.add_argument('--encoding', choices=encodingModes, default='automatic', help='GeoTIFF compression sent to servers of the GeoTIFF profile, lossless never uses JPEG, default automatic')
+    parser.add_argument('--concurrency', type=int, default=4, help='parallel downloads, default 4')
+    parser.add_argument('--timeout', type=int, default=60, help='timeout in seconds, default 60')
+    parser.add_argument('--retries', type=int, default=3, help='retries of connection errors and transient answers like 503, default 3')
+    parser.add_argument('--out', default='.', help='output directory, default current directory')
+    parser.add_argument('--manifest', help='manifest file, default OUT/manifest.json')
+    parser.add_argument('--metrics', help='file for the timings of every request, csv if it ends with .csv, json otherwise')
+    parser.add_argument('--cache-dir', help='directory to keep capabilities and coverage descriptions')
+    parser.add_argument('--overwrite', action='store_true', help='download files which already exist')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+
+    args = parser.parse_args(argv)
+
+    if not args.jobs and not (args.coverage and args.bbox):
+        parser.error('either --jobs or --coverage and --bbox are required')
+    if args.bbox and not args.crs:
+        parser.error('--bbox requires --crs')
+
+    return args
+
+
+def readJobs(args):
+    """
+    :return: list of (coverage id, [xmin, ymin, xmax, ymax], crs)
+    :raises ValueError: if a line of the jobs file has neither a crs nor is --crs given
+    """
+
+    jobs = []
+
+    if args.jobs:
+        with open(args.jobs, newline='') as f:
+            for number, row in enumerate(csv.reader(f), 1):
+                if not row or row[0].startswith('#'):
+                    continue
+                crs = row[5].strip() if len(row) > 5 and row[5].strip() else args.crs
+                if not crs:
+                    raise ValueError(args.jobs + ' line ' + str(number) + ': no crs, add it as sixth value or use --crs')
+                jobs.append((row[0].strip(), [float(value) for value in row[1:5]], crs))
+
+    for covId in args.coverage:
+        for bbox in args.bbox:
+            jobs.append((covId, [float(value) for value in bbox.split(',')], args.crs))
+
+    if args.grid:
+        jobs = [(covId, cell, crs) for covId, bbox, crs in jobs for cell in gridExtent(bbox, args.grid)]
+
+    return jobs
+
+
+def getScaling(args):
+    if args.resolution:
+        return ('resolution', args.resolution)
+    if args.scale_factor:
+        return ('factor', args.scale_factor)
+
+    return None
+
+
+def getFileName(covId, bbox, format):
+    extension = mimetypes.guess_extension(format.split(';')[0]) or '.tif'
+    name = covId + '_' + '_'.join(str(value) for value in bbox)
+
+    return re.sub(r'[^\w.-]', '_', name) + extension
+
+
+def runJob(wcsClient, args, covId, bbox, crs):
+    """
+    Downloads one coverage extent
+
+    :param crs: crs of the bbox
+    :return: manifest entry
+    """
+
+    entry = {'coverage': covId, 'bbox': bbox, 'crs': crs, 'url': None, 'file': None, 'status': None, 'bytes': 0, 'seconds': 0, 'error': None}
+    start = time.time()
+
+    try:
+        url = wcsClient.getCoverageUrls(covId, bbox, args.output_crs or crs, crs, args.format, scaling=getScaling(args), bands=args.bands.split(',') if args.bands else None)[0]
+        entry['url'] = url
+
+        file = os.path.join(args.out, getFileName(covId, bbox, args.format))
+        entry['file'] = file
+
+        measurement = wcsClient.httpClient.metrics.begin('GetCoverage', url)
+        if os.path.exists(file) and not args.overwrite:
+            entry['status'] = 'skipped'
+            measurement.set(cache='hit', bytes=os.path.getsize(file))
+            measurement.finish()
+        else:
+            try:
+                fetchFile(wcsClient.httpClient, url, file, Progress(), measurement=measurement)
+            except BaseException as e:
+                wcsClient.httpClient.negotiator.recordError(url, e)
+                measurement.finish(e)
+                raise
+            measurement.finish()
+            wcsClient.httpClient.negotiator.record(url, file)
+            entry['status'] = 'ok'
+
+        entry['bytes'] = os.path.getsize(file)
+    except HTTPError as e:
+        entry['status'] = 'error'
+        entry['error'] = str(e) + ' ' + e.read().decode(errors='replace')
+    except (URLError, OSError, ValueError) as e:
+        entry['status'] = 'error'
+        entry['error'] = str(e)
+
+    entry['seconds'] = round(time.time() - start, 3)
+
+    return entry
+
+
+def main(argv=None):
+    args = parseArguments(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(message)s')
+
+    os.makedirs(args.out, exist_ok=True)
+
+    try:
+        jobs = readJobs(args)
+    except (OSError, ValueError) as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    # keep every request of the run, including the DescribeCoverage of every job
+    metrics = Metrics(2 * len(jobs) + 10)
+    metadataCache = MetadataCache(args.cache_dir, 24 * 3600) if args.cache_dir else None
+    # sizes seen per server are kept with the metadata, later runs start with the best encoding
+    negotiator = EncodingNegotiator(os.path.join(args.cache_dir, 'encodings.json') if args.cache_dir else None, args.encoding)
+    httpClient = HttpClient(args.concurrency, args.timeout, metrics, RetryPolicy(args.retries + 1), negotiator)
+    wcsClient = WcsClient(args.url, args.wcsVersion, httpClient, metadataCache)
+
+    start = time.time()
+
+    try:
+        wcsClient.getCapabilities()
+    except (HTTPError, URLError) as e:
+        print('GetCapabilities failed: ' + str(e), file=sys.stderr)
+        return 1
+
+    entries = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [executor.submit(runJob, wcsClient, args, covId, bbox, crs) for covId, bbox, crs in jobs]
+        for future in concurrent.futures.as_completed(futures):
+            entry = future.result()
+            entries.append(entry)
+            print(str(len(entries)) + '/' + str(len(jobs)) + ' ' + entry['status'] + ' ' + entry['coverage'] + ' ' + str(entry['seconds']) + ' s' + (' ' + entry['error'] if entry['error'] else ''), file=sys.stderr)
+
+    manifest = {
+        'service': args.url,
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(start)),
+        'seconds': round(time.time() - start, 3),
+        'bytes': sum(entry['bytes'] for entry in entries),
+        'failed': sum(1 for entry in entries if entry['status'] == 'error'),
+        'jobs': entries
+    }
+
+    with open(args.manifest or os.path.join(args.out, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if args.metrics:
+        metrics.export(args.metrics)
+
+    for line in metrics.getSummaryLines() + negotiator.getSummaryLines():
+        logging.getLogger('simplewcs').info(line)
+
+    httpClient.close()
+
+    return 1 if manifest['failed'] else 0
@@ -0,0 +1,475 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import concurrent.futures, logging, os, os.path, shutil, urllib.parse, xml.etree.ElementTree
+from urllib.error import HTTPError, URLError
+
+from .wcs import WCS
+from .coverage import Coverage
+from .httpclient import HttpClient, acceptEncoding
+from .download import fetchFile
+from .scaling import getScaleSize, getScaleFactor, getCanvasPixels, getResolutionPixels
+from .tiling import splitExtent, buildVrt
+
+logger = logging.getLogger('simplewcs')
+
+
+def checkUrlSyntax(url):
+    if '?' in url:
+        if url.endswith('?'):
+            newUrl = url
+        elif url.endswith('&'):
+            newUrl = url
+        else:
+            newUrl = url + '&'
+    else:
+        newUrl = url + '?'
+
+    return newUrl
+
+
+def getCapabilitiesUrl(url, version):
+    params = {"REQUEST": "GetCapabilities", "SERVICE": "WCS", "Version": version}
+    querystring = urllib.parse.urlencode(params)
+
+    return checkUrlSyntax(url) + querystring
+
+
+def getDescribeCoverageUrl(wcs, covId):
+    params = {"REQUEST": "DescribeCoverage", "SERVICE": "WCS", "VERSION": "2.0.1", "COVERAGEID": covId}
+    querystring = urllib.parse.urlencode(params)
+
+    return checkUrlSyntax(wcs.getDescribeCoverageUrl()) + querystring
+
+
+def parseDescription(file):
+    """
+    :return: Coverage of a DescribeCoverage response
+    """
+
+    return Coverage(xml.etree.ElementTree.parse(file).getroot())
+
+
+def buildCoverageUrls(wcs, coverage, covId, version, coordinates, outputCrs, subsettingCrs, format, tiles=1, scaling=None, bands=None, negotiator=None):
+    """
+    GetCoverage urls of an extent, see WcsClient.getCoverageUrls
+
+    :param wcs: WCS
+    :param coverage: Coverage
+    :return: list of urls
+    """
+
+    return [
+        buildCoverageUrl(wcs, coverage, covId, version, window, coordinates, outputCrs, subsettingCrs, format, scaling, bands, negotiator)
+        for window in splitExtent(coordinates, tiles, tiles)
+    ]
+
+
+def buildCoverageUrl(wcs, coverage, covId, version, window, coordinates, outputCrs, subsettingCrs, format, scaling=None, bands=None, negotiator=None):
+    """
+    GetCoverage url of one window of an extent
+
+    :param window: [xmin, ymin, xmax, ymax] inside coordinates
+    :param coordinates: whole extent, the canvas size of the scaling refers to it
+    :param bands: names of the range fields to request, None for all
+    :param negotiator: EncodingNegotiator choosing the GeoTIFF encoding, None for the default of the server
+    :return: url
+    """
+
+    labels = coverage.getAxisLabels()
+    label0 = labels[0]
+    label1 = labels[1]
+
+    url = checkUrlSyntax(wcs.getGetCoverageUrl())
+
+    subset0 = label0 + '(' + str(window[0]) + ',' + str(window[2]) + ')'
+    subset1 = label1 + '(' + str(window[1]) + ',' + str(window[3]) + ')'
+
+    params = [('REQUEST', 'GetCoverage'), ('SERVICE', 'WCS'), ('VERSION', version), ('COVERAGEID', covId), ('OUTPUTCRS', outputCrs), ('SUBSETTINGCRS', subsettingCrs), ('FORMAT', format), ('SUBSET', subset0), ('SUBSET', subset1)]
+    params += getScalingParams(wcs, labels, window, coordinates, scaling)
+    params += getRangeSubsetParams(wcs, coverage, bands)
+    if negotiator is not None:
+        params += negotiator.getParams(wcs, coverage, bands, format, url + urllib.parse.urlencode(params))
+
+    querystring = urllib.parse.urlencode(params)
+
+    return url + querystring
+
+
+def getScalingParams(wcs, labels, window, coordinates, scaling):
+    """
+    Scaling parameters of one SUBSET window, if the WCS supports scaling
+    """
+
+    if scaling is None or not wcs.supportsScaling():
+        return []
+
+    if scaling[0] == 'size':
+        width, height = getCanvasPixels(window, coordinates, scaling[1], scaling[2])
+    elif scaling[0] == 'resolution':
+        width, height = getResolutionPixels(window, scaling[1])
+    else:
+        return [getScaleFactor(scaling[1])]
+
+    return [getScaleSize(labels, width, height)]
+
+
+def getRangeSubsetParams(wcs, coverage, bands):
+    """
+    RANGESUBSET parameter of the chosen bands, if the WCS supports range subsetting.
+    Nothing is sent if all bands of the coverage are chosen.
+
+    :param bands: list of range field names or None
+    :raises URLError: if the coverage does not have one of the bands
+    """
+
+    if not bands or not wcs.supportsRangeSubsetting():
+        return []
+
+    missing = getMissingBands(coverage, bands)
+    if missing:
+        raise URLError('coverage has no band ' + ', '.join(missing) + ', its bands are ' + ', '.join(coverage.getRange()))
+
+    fields = coverage.getRange()
+    selected = [band for band in bands if band in fields]
+    if selected == fields:
+        return []
+
+    return [('RANGESUBSET', ','.join(selected))]
+
+
+def getMissingBands(coverage, bands):
+    """
+    :param bands: list of range field names or None
+    :return: names of the bands the coverage does not have
+    """
+
+    fields = coverage.getRange()
+
+    return [band for band in bands or [] if band not in fields]
+
+
+class WcsClient:
+    """
+    Builds and sends the requests to one WCS, without any Qt state,
+    so it can be used by the plugin and from the command line.
+    Errors are raised as urllib's HTTPError and URLError.
+    """
+
+
+    def __init__(self, url, version='2.0.1', httpClient=None, metadataCache=None):
+        """
+        :param url: base url of the WCS
+        :param version: WCS version used for GetCapabilities and GetCoverage
+        :param httpClient: shared HttpClient, a new one by default
+        :param metadataCache: MetadataCache or None to keep documents in memory only
+        """
+
+        self.url = url
+        self.version = version
+        self.httpClient = httpClient or HttpClient()
+        self.metadataCache = metadataCache
+        self.documents = {}
+        self.wcs = None
+
+
+    def getCapabilities(self, parse=WCS):
+        """
+        :param parse: function creating the WCS object from a xml file
+        :return: WCS
+        """
+
+        self.wcs = self.requestMetadata(getCapabilitiesUrl(self.url, self.version), parse, 'GetCapabilities')
+
+        return self.wcs
+
+
+    def describeCoverage(self, covId):
+        """
+        :return: Coverage
+        """
+
+        return self.requestMetadata(getDescribeCoverageUrl(self.getWCS(), covId), parseDescription, 'DescribeCoverage')
+
+
+    def getCoverageUrls(self, covId, coordinates, outputCrs, subsettingCrs, format, tiles=1, scaling=None, bands=None):
+        """
+        Builds the GetCoverage urls for an extent.
+        The extent is split into tiles x tiles SUBSET windows.
+
+        :param coordinates: [xmin, ymin, xmax, ymax] in subsettingCrs
+        :param tiles: number of windows per side, 1 requests the whole extent
+        :param scaling: None for native resolution or one of
+            ('size', width, height) pixels of the whole extent,
+            ('resolution', resolution) in units of subsettingCrs per pixel,
+            ('factor', factor)
+        :param bands: names of the range fields to request, None for all
+        :return: list of urls
+        """
+
+        coverage = self.describeCoverage(covId)
+
+        return buildCoverageUrls(self.getWCS(), coverage, covId, self.version, coordinates, outputCrs, subsettingCrs, format, tiles, scaling, bands, self.httpClient.negotiator)
+
+
+    def setVersion(self, version):
+        self.version = version
+
+
+    def getVersion(self):
+        return self.version
+
+
+    def getWCS(self):
+        """
+        Capabilities of the service, requested on first use
+        """
+
+        if self.wcs is None:
+            self.getCapabilities()
+
+        return self.wcs
+
+
+    def requestXML(self, url, headers=None, measurement=None):
+        """
+        The response is requested compressed and inflated while it is read.
+
+        :param headers: additional request headers, e.g. validators of a cached document
+        :param measurement: Measurement of the request or None
+        :return: response, an answer 304 Not Modified is returned as well
+        """
+
+        logger.info('Requested URL: ' + url)
+
+        allHeaders = {'Accept-Encoding': acceptEncoding}
+        allHeaders.update(headers or {})
+
+        try:
+            return self.httpClient.request(url, allHeaders, measurement=measurement)
+        except HTTPError as e:
+            if e.code == 304:
+                return e
+            raise
+
+
+    def requestMetadata(self, url, parse, operation):
+        """
+        Returns the parsed GetCapabilities or DescribeCoverage document of an url
+        and records the request in the metrics of the HttpClient.
+
+        :param parse: function creating the WCS or Coverage object from a xml file
+        :param operation: name of the request in the metrics
+        :return: parsed document
+        """
+
+        measurement = self.httpClient.metrics.begin(operation, url)
+
+        try:
+            obj = self.httpClient.retryPolicy.call(lambda: self.fetchMetadata(url, parse, measurement), measurement)
+        except BaseException as e:
+            measurement.finish(e)
+            raise
+
+        measurement.finish()
+
+        return obj
+
+
+    def fetchMetadata(self, url, parse, measurement):
+        """
+        Fresh documents come from the metadata cache, stale ones are
+        revalidated and only transferred again if they have changed.
+        """
+
+        cache = self.metadataCache
+
+        if cache is None:
+            if url in self.documents:
+                measurement.set(cache='hit')
+            else:
+                measurement.set(cache='miss')
+                with self.requestXML(url, measurement=measurement) as xmlResponse, measurement.phase('parse'):
+                    self.documents[url] = parse(xmlResponse)
+            return self.documents[url]
+
+        key = cache.getKey(url)
+        entry = cache.get(key)
+
+        if entry is not None and cache.isFresh(key):
+            obj = self.getCachedMetadata(key, parse, measurement)
+            if obj is not None:
+                measurement.set(cache='hit')
+                return obj
+
+        xmlResponse = self.requestXML(url, cache.getValidators(key), measurement)
+
+        if xmlResponse.getcode() == 304:
+            xmlResponse.close()
+            cache.refresh(key, xmlResponse.headers)
+            obj = self.getCachedMetadata(key, parse, measurement)
+            if obj is not None:
+                logger.info('Not modified: ' + url)
+                measurement.set(cache='revalidated')
+                return obj
+
+            # the cached document is gone, it is requested again without validators
+            logger.info('Cached document missing, requested again: ' + url)
+            xmlResponse = self.requestXML(url, measurement=measurement)
+            if xmlResponse.getcode() == 304:
+                xmlResponse.close()
+                raise URLError('Not Modified without validators: ' + url)
+
+        measurement.set(cache='miss')
+        file = cache.getPath(key)
+        with xmlResponse, open(file + '.part', 'wb') as f:
+            shutil.copyfileobj(xmlResponse, f)
+        os.replace(file + '.part', file)
+        cache.put(key, url, file, xmlResponse.headers)
+
+        return self.getCachedMetadata(key, parse, measurement)
+
+
+    def getCachedMetadata(self, key, parse, measurement):
+        """
+        Parses a cached document only once per session
+
+        :return: parsed document, None if the entry is missing
+        """
+
+        cache = self.metadataCache
+
+        obj = cache.getObject(key)
+        if obj is None:
+            entry = cache.get(key)
+            if entry is None:
+                return None
+            try:
+                with open(entry['file'], 'rb') as f, measurement.phase('parse'):
+                    obj = parse(f)
+            except Exception:
+                cache.discard(key)
+                raise
+            cache.setObject(key, obj)
+
+        return obj
+
+
+def getCachedFile(httpClient, url, cache, progress):
+    """
+    Looks up the response of a GetCoverage url in the cache
+    and downloads it only on a cache miss
+
+    :param cache: TileCache
+    :return: file
+    """
+
+    file = getFileFromCache(httpClient, url, cache, progress)
+    if file is not None:
+        return file
+
+    measurement = beginDownload(httpClient, url)
+    try:
+        file = fetchFile(httpClient, url, cache.getPath(cache.getKey(url)), progress, measurement=measurement)
+    except BaseException as e:
+        recordDownload(httpClient, url, cache, None, measurement, e)
+        raise
+    recordDownload(httpClient, url, cache, file, measurement)
+
+    return file
+
+
+def getFileFromCache(httpClient, url, cache, progress):
+    """
+    Cache lookup of getCachedFile and its coroutine version,
+    blocking as it updates the index
+
+    :return: file or None on a cache miss
+    """
+
+    file = cache.get(cache.getKey(url))
+    if file is None:
+        return None
+
+    logger.info('Cached URL: ' + url)
+    measurement = httpClient.metrics.begin('GetCoverage', url)
+    measurement.set(cache='hit', bytes=os.path.getsize(file))
+    measurement.finish()
+    progress.finish(url)
+
+    return file
+
+
+def beginDownload(httpClient, url):
+    """
+    :return: Measurement of a GetCoverage download on a cache miss
+    """
+
+    logger.info('Requested URL: ' + url)
+    measurement = httpClient.metrics.begin('GetCoverage', url)
+    measurement.set(cache='miss')
+
+    return measurement
+
+
+def recordDownload(httpClient, url, cache, file, measurement, error=None):
+    """
+    Finishes the measurement of a download, puts the file into the cache and
+    adds it to the encoding statistics, blocking as both are written to disk
+
+    :param error: exception of a failed download, None if it succeeded
+    """
+
+    if error is not None:
+        httpClient.negotiator.recordError(url, error)
+        measurement.finish(error)
+        return
+
+    measurement.finish()
+    cache.put(cache.getKey(url), file)
+    httpClient.negotiator.record(url, file)
+
+
+def getCachedMosaic(httpClient, urls, cache, progress, workers):
+    """
+    Downloads the tiles of a coverage at the same time
+    and puts them together as one VRT
+
+    :param urls: GetCoverage url of every tile
+    :param workers: max number of parallel downloads
+    :return: vrt or None if GDAL failed
+    """
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        files = list(executor.map(lambda url: getCachedFile(httpClient, url, cache, progress), urls))
+
+    return buildCachedVrt(files, cache, cache.getMosaicKey([cache.getKey(url) for url in urls]))
+
+
+def buildCachedVrt(files, cache, key):
+    """
+    Looks up the VRT of a mosaic in the cache and builds it on a miss
+
+    :param key: mosaic key of the tiles
+    :return: vrt or None if GDAL failed
+    """
+
+    vrt = cache.get(key)
+    if vrt is not None:
+        return vrt
+
+    vrt = buildVrt(files, cache.getPath(key, '.vrt'))
+    if vrt is None:
+        logger.warning('Could not build VRT from ' + str(len(files)) + ' tiles')
+        return None
+    cache.put(key, vrt)
+
+    return vrt
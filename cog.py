@@ -0,0 +1,138 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import logging, os, os.path
+
+from .download import DownloadCanceled
+
+logger = logging.getLogger('simplewcs')
+
+# options offered in the dialog, in the order of the combo boxes
+cogCompressions = ['DEFLATE', 'LZW', 'ZSTD', 'JPEG', 'NONE']
+cogResamplings = ['AVERAGE', 'NEAREST', 'BILINEAR', 'CUBIC', 'MODE']
+
+# lossless compressions which profit from a horizontal predictor
+predictorCompressions = ['DEFLATE', 'LZW', 'ZSTD']
+
+
+def convertToCog(source, path, compression='DEFLATE', resampling='AVERAGE', blockSize=512, isCanceled=None):
+    """
+    Rewrites a raster as Cloud Optimized GeoTIFF: internally tiled,
+    compressed and with overviews down to the size of one block.
+    Uses the COG driver of GDAL 3.1 and newer, a tiled GeoTIFF with
+    internal overviews otherwise.
+
+    :param source: raster file, e.g. a downloaded GeoTIFF or a VRT mosaic
+    :param path: path of the COG, written only if the conversion succeeded
+    :param compression: one of cogCompressions
+    :param resampling: one of cogResamplings, used for the overviews
+    :param isCanceled: function, the conversion stops as soon as it returns True
+    :return: path or None if GDAL failed
+    """
+
+    # GDAL is only needed for the conversion, the command line works without
+    from osgeo import gdal
+
+    def onProgress(complete, message, data):
+        return 0 if isCanceled is not None and isCanceled() else 1
+
+    tmp = path + '.part'
+
+    creationOptions = ['COMPRESS=' + compression, 'BIGTIFF=IF_SAFER', 'NUM_THREADS=ALL_CPUS']
+    if compression in predictorCompressions:
+        creationOptions.append('PREDICTOR=YES' if gdal.GetDriverByName('COG') is not None else 'PREDICTOR=2')
+
+    try:
+        if gdal.GetDriverByName('COG') is not None:
+            creationOptions += ['BLOCKSIZE=' + str(blockSize), 'RESAMPLING=' + resampling, 'OVERVIEWS=IGNORE_EXISTING']
+            dataset = gdal.Translate(tmp, source, format='COG', creationOptions=creationOptions, callback=onProgress)
+        else:
+            creationOptions += ['TILED=YES', 'BLOCKXSIZE=' + str(blockSize), 'BLOCKYSIZE=' + str(blockSize)]
+            dataset = gdal.Translate(tmp, source, format='GTiff', creationOptions=creationOptions, callback=onProgress)
+            if dataset is not None:
+                levels = getOverviewLevels(dataset.RasterXSize, dataset.RasterYSize, blockSize)
+                if levels and dataset.BuildOverviews(resampling, levels, callback=onProgress) != 0:
+                    dataset = None
+    except RuntimeError as e:
+        logger.warning('Could not convert ' + source + ' to COG: ' + str(e))
+        dataset = None
+
+    if dataset is None:
+        removeFile(tmp)
+        if isCanceled is not None and isCanceled():
+            raise DownloadCanceled()
+        return None
+
+    # dereferencing the dataset writes the file to disk
+    dataset = None
+    os.replace(tmp, path)
+
+    return path
+
+
+def getOverviewLevels(width, height, blockSize):
+    """
+    Decimation factors 2, 4, 8, ... until the smallest overview fits into one block
+    """
+
+    levels = []
+    factor = 2
+    while max(width, height) / (factor / 2) > blockSize:
+        levels.append(factor)
+        factor *= 2
+
+    return levels
+
+
+def getCachedCog(file, cache, compression, resampling, metrics, url, isCanceled=None):
+    """
+    COG of a cached coverage or mosaic, converted once per
+    compression and resampling and kept in the cache as well
+
+    :param file: path of an entry of cache
+    :param cache: TileCache
+    :param metrics: Metrics which gets the duration of the conversion
+    :param url: url of the coverage or service for the metrics
+    :return: path of the COG, or file if the conversion failed
+    """
+
+    sourceKey = os.path.splitext(os.path.basename(file))[0]
+    key = cache.getDerivedKey(sourceKey, 'cog', compression, resampling)
+
+    cog = cache.get(key)
+    if cog is not None:
+        return cog
+
+    measurement = metrics.begin('ConvertCog', url)
+    try:
+        with measurement.phase('convert'):
+            cog = convertToCog(file, cache.getPath(key), compression, resampling, isCanceled=isCanceled)
+    except BaseException as e:
+        measurement.finish(e)
+        raise
+
+    if cog is None:
+        logger.warning('Could not convert ' + file + ' to COG, the layer uses the file as downloaded')
+        measurement.finish('conversion failed')
+        return file
+
+    measurement.set(bytes=os.path.getsize(cog))
+    measurement.finish()
+    cache.put(key, cog)
+
+    return cog
+
+
+def removeFile(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
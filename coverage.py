@@ -24,10 +24,12 @@ class Coverage:
         self.axisLabels = self.axisLabels.split(" ")
 
         self.range = []
+        self.intervals = {}
         contents = self.coverage.find(wcs + 'CoverageDescription')
         for field in contents.findall('.//' + gmlcov + 'rangeType/' + swe + 'DataRecord/' + swe + 'field'):
             name = field.get('name')
             self.range.append(name)
+            self.intervals[name] = getInterval(field.find('.//' + swe + 'interval'))
 
 
     def getAxisLabels(self):
@@ -44,3 +46,55 @@ class Coverage:
 
     def setRange(self, range):
         self.range = range
+
+
+    def getIntervals(self):
+        """
+        :return: dict of range field name and its allowed values as (min, max), None if not given
+        """
+
+        return self.intervals
+
+
+def splitDescriptions(root):
+    """
+    Coverages of a DescribeCoverage response for several coverage ids,
+    descriptions which can not be read are left out
+
+    :param root: wcs:CoverageDescriptions
+    :return: dict of coverage id and Coverage
+    """
+
+    wcs = '{http://www.opengis.net/wcs/2.0}'
+    gml = '{http://www.opengis.net/gml/3.2}'
+
+    coverages = {}
+    for description in root.findall(wcs + 'CoverageDescription'):
+        covId = description.findtext(wcs + 'CoverageId') or description.get(gml + 'id')
+
+        # Coverage reads the first description of a document
+        document = xml.etree.ElementTree.Element(root.tag)
+        document.append(description)
+        try:
+            coverages[covId] = Coverage(document)
+        except (AttributeError, KeyError):
+            continue
+
+    return coverages
+
+
+def getInterval(elem):
+    """
+    :param elem: swe:interval or None
+    :return: (min, max) or None if missing or invalid
+    """
+
+    if elem is None or elem.text is None:
+        return None
+
+    try:
+        values = [float(value) for value in elem.text.split()]
+    except ValueError:
+        return None
+
+    return (values[0], values[1]) if len(values) == 2 else None
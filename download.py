@@ -0,0 +1,389 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import json, os, os.path, re, threading, time
+from urllib.error import HTTPError, URLError
+
+chunkSize = 256 * 1024
+
+
+class DownloadCanceled(Exception):
+    """
+    Raised within one chunk after the task was canceled
+    """
+
+
+class Progress:
+    """
+    Bytes received and expected of one or more parallel downloads.
+    Reports the overall progress to the QgsTask and tells the
+    downloads when the task was canceled.
+    """
+
+
+    def __init__(self, task=None, downloads=1):
+        """
+        :param task: QgsTask or None
+        :param downloads: number of files which will be downloaded
+        """
+
+        self.task = task
+        self.downloads = downloads
+        self.lock = threading.Lock()
+        self.received = {}
+        self.expected = {}
+        self.done = set()
+        self.start = time.time()
+
+
+    def setTask(self, task):
+        self.task = task
+
+
+    def begin(self, url, expected):
+        """
+        :param expected: Content-Length or None if unknown
+        """
+
+        with self.lock:
+            self.received[url] = 0
+            self.expected[url] = expected
+
+
+    def update(self, url, size):
+        with self.lock:
+            self.received[url] += size
+        self.report()
+
+
+    def finish(self, url):
+        with self.lock:
+            self.done.add(url)
+        self.report()
+
+
+    def isCanceled(self):
+        return self.task is not None and self.task.isCanceled()
+
+
+    def report(self):
+        if self.task is not None:
+            self.task.setProgress(self.getPercent())
+
+
+    def getPercent(self):
+        """
+        Mean of the progress of every download, downloads without
+        Content-Length only count once they are finished
+        """
+
+        with self.lock:
+            total = 0.0
+            for url in self.received:
+                if url in self.done:
+                    total += 1
+                elif self.expected[url]:
+                    total += min(self.received[url] / self.expected[url], 1)
+            total += len(self.done - set(self.received))
+
+        return 100 * total / max(self.downloads, 1)
+
+
+    def getReceived(self):
+        with self.lock:
+            return sum(self.received.values())
+
+
+    def getExpected(self):
+        """
+        :return: sum of Content-Lengths or None if one is unknown
+        """
+
+        with self.lock:
+            if len(self.expected) < self.downloads or None in self.expected.values():
+                return None
+            return sum(self.expected.values())
+
+
+    def getThroughput(self):
+        """
+        :return: bytes per second since the start
+        """
+
+        return self.getReceived() / max(time.time() - self.start, 0.001)
+
+
+class ProgressGroup:
+    """
+    Progress of a download shared by several callers, e.g. identical
+    requests of two tasks. Reports to the Progress of every caller and
+    counts as canceled only when all of them were canceled.
+    """
+
+
+    def __init__(self):
+        self.members = []
+        self.url = None
+        self.expected = None
+        self.received = 0
+        self.finished = False
+
+
+    def add(self, progress):
+        """
+        A caller joining later gets the bytes received so far
+        """
+
+        self.members.append(progress)
+
+        if self.url is not None:
+            progress.begin(self.url, self.expected)
+            progress.update(self.url, self.received)
+            if self.finished:
+                progress.finish(self.url)
+
+
+    def remove(self, progress):
+        self.members.remove(progress)
+
+
+    def begin(self, url, expected):
+        self.url = url
+        self.expected = expected
+        self.received = 0
+        for progress in self.members:
+            progress.begin(url, expected)
+
+
+    def update(self, url, size):
+        self.received += size
+        for progress in self.members:
+            progress.update(url, size)
+
+
+    def finish(self, url):
+        self.finished = True
+        for progress in self.members:
+            progress.finish(url)
+
+
+    def isCanceled(self):
+        return bool(self.members) and all(progress.isCanceled() for progress in self.members)
+
+
+def fetchFile(client, url, file, progress, retryPolicy=None, measurement=None):
+    """
+    Streams a response in chunks to a file.
+    The data is written to file + '.part' and renamed when complete.
+    A journal next to the partial file keeps url and validator, so an
+    interrupted transfer is resumed with a Range request, within this
+    call on transient errors or by a later call, e.g. in the next session.
+
+    :param client: HttpClient
+    :param progress: Progress of the task
+    :param retryPolicy: RetryPolicy, the one of the client by default
+    :param measurement: Measurement of the download or None
+    :return: file
+    """
+
+    retryPolicy = retryPolicy or client.retryPolicy
+
+    return retryPolicy.call(lambda: fetchPart(client, url, file, progress, measurement), measurement)
+
+
+def fetchPart(client, url, file, progress, measurement=None):
+    """
+    One try of fetchFile, continues a partial download if possible
+    """
+
+    partial = PartialFile(file, url, progress)
+
+    try:
+        response = client.request(url, partial.getHeaders(), measurement=measurement)
+    except HTTPError as e:
+        # the partial file does not fit the resource any more
+        if e.code == 416 and partial.offset:
+            e.close()
+            partial.discard()
+            return fetchPart(client, url, file, progress, measurement)
+        raise
+
+    with response:
+        partial.open(response)
+        try:
+            while True:
+                partial.checkCanceled()
+
+                chunk = response.read(chunkSize)
+                if not chunk:
+                    break
+
+                partial.write(chunk)
+
+            partial.complete()
+        except BaseException:
+            partial.abort()
+            raise
+
+    return partial.commit()
+
+
+class PartialFile:
+    """
+    Partial file and journal of one try of a resumable download, the
+    bookkeeping shared by fetchPart and its coroutine version in asyncclient
+    """
+
+
+    def __init__(self, file, url, progress):
+        """
+        :param file: final location of the download
+        :param progress: Progress or ProgressGroup
+        """
+
+        self.file = file
+        self.url = url
+        self.progress = progress
+        self.part = file + '.part'
+        self.journal = file + '.journal'
+        self.f = None
+        self.validator = None
+        self.length = None
+
+        self.offset = 0
+        self.resumeValidator = None
+        entry = readJournal(self.journal)
+        if entry and entry['url'] == url and entry['validator'] and os.path.exists(self.part):
+            self.offset = os.path.getsize(self.part)
+            self.resumeValidator = entry['validator']
+
+
+    def getHeaders(self):
+        """
+        :return: Range and If-Range headers to continue the partial file, empty if there is none
+        """
+
+        if not self.offset:
+            return {}
+
+        return {'Range': 'bytes=' + str(self.offset) + '-', 'If-Range': self.resumeValidator}
+
+
+    def discard(self):
+        removePartial(self.file)
+        self.offset = 0
+
+
+    def open(self, response):
+        """
+        Starts writing the body of the response, behind the partial
+        file if the server sent the missing range
+        """
+
+        # servers without Range support answer with the full content
+        if response.status != 206 or getRangeStart(response) != self.offset:
+            self.offset = 0
+
+        self.validator = getValidator(response)
+        length = response.getheader('Content-Length')
+        self.length = self.offset + int(length) if length else None
+        self.progress.begin(self.url, self.length)
+        self.progress.update(self.url, self.offset)
+
+        self.f = open(self.part, 'ab' if self.offset else 'wb')
+        self.f.truncate(self.offset)
+        writeJournal(self.journal, self.url, self.validator, self.offset)
+
+
+    def checkCanceled(self):
+        if self.progress.isCanceled():
+            raise DownloadCanceled(self.url)
+
+
+    def write(self, chunk):
+        self.f.write(chunk)
+        self.progress.update(self.url, len(chunk))
+
+
+    def complete(self):
+        # the connection was closed before the end of the content
+        if self.length is not None and self.f.tell() != self.length:
+            raise URLError('incomplete response: ' + self.url)
+
+        self.f.close()
+
+
+    def abort(self):
+        """
+        Keeps what was received for a later try, if the server sent a validator
+        """
+
+        if self.f is None:
+            return
+
+        if self.validator:
+            self.f.flush()
+            writeJournal(self.journal, self.url, self.validator, self.f.tell())
+            self.f.close()
+        else:
+            self.f.close()
+            removePartial(self.file)
+
+
+    def commit(self):
+        """
+        Moves the complete download to its final location
+
+        :return: file
+        """
+
+        os.replace(self.part, self.file)
+        os.remove(self.journal)
+        self.progress.finish(self.url)
+
+        return self.file
+
+
+def getValidator(response):
+    """
+    Validator for If-Range, weak ETags are not allowed there
+    """
+
+    etag = response.getheader('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+
+    return response.getheader('Last-Modified')
+
+
+def getRangeStart(response):
+    contentRange = re.match(r'bytes (\d+)-', response.getheader('Content-Range') or '')
+
+    return int(contentRange.group(1)) if contentRange else None
+
+
+def readJournal(journal):
+    try:
+        with open(journal) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def writeJournal(journal, url, validator, received):
+    with open(journal, 'w') as f:
+        json.dump({'url': url, 'validator': validator, 'received': received}, f)
+
+
+def removePartial(file):
+    for path in (file + '.part', file + '.journal'):
+        if os.path.exists(path):
+            os.remove(path)
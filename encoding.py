@@ -0,0 +1,397 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import json, logging, os, os.path, struct, threading, urllib.parse
+from urllib.error import HTTPError
+
+logger = logging.getLogger('simplewcs')
+
+# values of the GeoTIFF encoding extension, assumed if a WCS advertises the profile without listing them
+geotiffCompressions = ['None', 'PackBits', 'LZW', 'Deflate', 'JPEG']
+geotiffPredictors = ['None', 'Horizontal', 'FloatingPoint']
+
+# expected size relative to the uncompressed pixels until a server has answered often enough
+compressionPriors = {'JPEG': 0.15, 'Deflate': 0.55, 'LZW': 0.65, 'PackBits': 0.9, 'None': 1.0}
+predictorPriors = {'Horizontal': 0.8, 'FloatingPoint': 0.75}
+
+# lossless compressions which profit from a predictor
+predictorCompressions = ['Deflate', 'LZW']
+
+encodingModes = ['automatic', 'lossless', 'off']
+
+# answers to parameters a server does not understand
+rejectedStatuses = [400, 501]
+
+
+def getTiffFormats(formats):
+    """
+    Formats of a WCS which deliver GeoTIFF, the ones marked
+    as GeoTIFF and the plain image/tiff first
+
+    :param formats: formatSupported of the capabilities
+    """
+
+    tiffs = [format for format in formats if 'tiff' in format.lower()]
+
+    return sorted(tiffs, key=lambda format: 0 if 'geotiff' in format.lower() else 1 if format.lower() == 'image/tiff' else 2)
+
+
+def getDataKind(coverage, bands=None):
+    """
+    Kind of the pixels of a coverage, read from the intervals of its range fields
+
+    :param bands: names of the requested range fields, None for all
+    :return: 'byte' for 8 bit imagery, 'float' or 'data' for other values
+    """
+
+    intervals = coverage.getIntervals()
+    fields = [band for band in bands if band in intervals] if bands else coverage.getRange()
+    fields = fields or coverage.getRange()
+    known = [intervals[field] for field in fields if intervals.get(field) is not None]
+
+    if not known or len(known) < len(fields):
+        return 'data'
+    if any(low != int(low) or high != int(high) for low, high in known):
+        return 'float'
+    if all(low >= 0 and high <= 255 for low, high in known):
+        return 'byte'
+
+    return 'data'
+
+
+def readTiffInfo(file):
+    """
+    Size and sample layout of the first image of a TIFF or BigTIFF
+
+    :return: dict of width, height, samples, bits and kind, None if file is no TIFF
+    """
+
+    try:
+        with open(file, 'rb') as f:
+            header = f.read(16)
+            if header[:2] == b'II':
+                order = '<'
+            elif header[:2] == b'MM':
+                order = '>'
+            else:
+                return None
+
+            version = struct.unpack(order + 'H', header[2:4])[0]
+            if version == 42:
+                countFormat, entryFormat, entrySize, offset = 'H', 'HHI4s', 12, struct.unpack(order + 'I', header[4:8])[0]
+            elif version == 43:
+                countFormat, entryFormat, entrySize, offset = 'Q', 'HHQ8s', 20, struct.unpack(order + 'Q', header[8:16])[0]
+            else:
+                return None
+
+            f.seek(offset)
+            countSize = struct.calcsize(countFormat)
+            count = struct.unpack(order + countFormat, f.read(countSize))[0]
+            directory = f.read(count * entrySize)
+
+            # SHORT and LONG values, the first one is enough for all tags read here
+            tags = {}
+            for i in range(len(directory) // entrySize):
+                tag, type, n, value = struct.unpack(order + entryFormat, directory[i * entrySize:(i + 1) * entrySize])
+                if type not in (3, 4):
+                    continue
+                valueFormat = 'H' if type == 3 else 'I'
+                if n * struct.calcsize(valueFormat) > len(value):
+                    # values which do not fit into the entry are stored at an offset
+                    f.seek(struct.unpack(order + ('I' if version == 42 else 'Q'), value)[0])
+                    value = f.read(4)
+                tags[tag] = struct.unpack(order + valueFormat, value[:struct.calcsize(valueFormat)])[0]
+    except (OSError, struct.error):
+        return None
+
+    if 256 not in tags or 257 not in tags:
+        return None
+
+    bits = tags.get(258, 1)
+    if tags.get(339) == 3:
+        kind = 'float'
+    elif bits == 8:
+        kind = 'byte'
+    else:
+        kind = 'data'
+
+    return {'width': tags[256], 'height': tags[257], 'samples': tags.get(277, 1), 'bits': bits, 'kind': kind}
+
+
+def getPrior(compression, predictor=None):
+    """
+    Expected size of an encoding relative to the uncompressed pixels,
+    names are compared ignoring case
+    """
+
+    priors = {name.lower(): value for name, value in compressionPriors.items()}
+    gains = {name.lower(): value for name, value in predictorPriors.items()}
+
+    return priors.get(compression.lower(), 1.0) * gains.get((predictor or '').lower(), 1.0)
+
+
+def getRequestKey(url):
+    """
+    :return: host, coverage and band subset of a GetCoverage url, which decide the kind of the pixels
+    """
+
+    parts = urllib.parse.urlsplit(url)
+    params = {key.upper(): value for key, value in urllib.parse.parse_qsl(parts.query)}
+
+    return (parts.netloc.lower(), params.get('COVERAGEID', ''), params.get('RANGESUBSET', ''))
+
+
+def getEncodingLabel(url):
+    """
+    :return: compression and predictor of a GetCoverage url, e.g. 'Deflate/Horizontal'
+    """
+
+    params = {key.upper(): value for key, value in urllib.parse.parse_qsl(urllib.parse.urlsplit(url).query)}
+    compression = params.get('GEOTIFF:COMPRESSION', 'None')
+    predictor = params.get('GEOTIFF:PREDICTOR')
+
+    return compression + '/' + predictor if predictor and predictor.lower() != 'none' else compression
+
+
+class EncodingNegotiator:
+    """
+    Chooses the GeoTIFF encoding of GetCoverage requests with the smallest
+    transfer: the compressions and predictors a WCS offers are ranked by the
+    size of the responses seen from that server for the same kind of data,
+    by an estimate while there are too few. JPEG is only chosen for 8 bit
+    imagery with one or three bands. The statistics are kept in a json file.
+    """
+
+
+    def __init__(self, path=None, mode='automatic', minCount=2):
+        """
+        :param path: json file of the statistics, None to keep them in memory only
+        :param mode: one of encodingModes, 'lossless' never chooses JPEG, 'off' sends no encoding parameters
+        :param minCount: number of responses after which the measured size replaces the estimate
+        """
+
+        self.path = path
+        self.mode = mode
+        self.minCount = minCount
+        self.lock = threading.Lock()
+
+        # kind of the pixels per getRequestKey, as read from the responses
+        self.kinds = {}
+
+        self.stats = {}
+        if path is not None:
+            try:
+                with open(path) as f:
+                    self.stats = json.load(f)
+            except (OSError, ValueError):
+                self.stats = {}
+
+
+    def getParams(self, wcs, coverage, bands, format, url):
+        """
+        Encoding parameters of a GetCoverage url
+
+        :param wcs: WCS
+        :param coverage: Coverage
+        :param bands: names of the requested range fields, None for all
+        :param format: requested format, only GeoTIFF is encoded
+        :param url: the GetCoverage url without the encoding parameters
+        :return: list of (name, value)
+        """
+
+        if self.mode == 'off' or 'tiff' not in format.lower() or not wcs.supportsGeotiffEncoding():
+            return []
+
+        encoding = self.choose(wcs, coverage, url, bands)
+        if encoding is None or encoding[0].lower() == 'none':
+            return []
+
+        compression, predictor = encoding
+        params = [('GEOTIFF:COMPRESSION', compression)]
+        if predictor is not None:
+            params.append(('GEOTIFF:PREDICTOR', predictor))
+
+        return params
+
+
+    def choose(self, wcs, coverage, url, bands=None):
+        """
+        :param url: the GetCoverage url without the encoding parameters
+        :return: (compression, predictor or None) with the smallest expected size, None if nothing is offered
+        """
+
+        requestKey = getRequestKey(url)
+        host = requestKey[0]
+
+        # the statistics are filed under the kind of the responses, the description is only a guess
+        with self.lock:
+            kind = self.kinds.get(requestKey)
+        kind = kind or getDataKind(coverage, bands)
+        samples = len([band for band in bands or [] if band in coverage.getRange()]) or len(coverage.getRange())
+
+        candidates = self.getCandidates(wcs, kind, samples)
+        estimates = [(self.getEstimate(host, kind, encoding), i, encoding) for i, encoding in enumerate(candidates)]
+        estimates = [estimate for estimate in estimates if estimate[0] is not None]
+
+        return min(estimates)[2] if estimates else None
+
+
+    def getCandidates(self, wcs, kind, samples):
+        """
+        Encodings offered by the WCS which suit the kind of data
+
+        :return: list of (compression, predictor or None)
+        """
+
+        parameters = wcs.getGeotiffParameters()
+
+        # values are sent in the spelling of the server
+        compressions = {value.lower(): value for value in parameters.get('compression') or geotiffCompressions}
+        predictors = {value.lower(): value for value in parameters.get('predictor') or geotiffPredictors}
+
+        candidates = []
+        for compression in compressionPriors:
+            if compression.lower() not in compressions:
+                continue
+            if compression == 'JPEG' and (self.mode != 'automatic' or kind != 'byte' or samples not in (1, 3)):
+                continue
+            value = compressions[compression.lower()]
+            if compression in predictorCompressions:
+                if 'floatingpoint' in predictors and kind == 'float':
+                    candidates.append((value, predictors['floatingpoint']))
+                if 'horizontal' in predictors:
+                    candidates.append((value, predictors['horizontal']))
+            candidates.append((value, None))
+
+        return candidates
+
+
+    def getEstimate(self, host, kind, encoding):
+        """
+        :return: expected size relative to the uncompressed pixels, None if the server rejected the encoding
+        """
+
+        compression, predictor = encoding
+        label = compression + '/' + predictor if predictor else compression
+
+        with self.lock:
+            entry = self.stats.get(host, {}).get(kind, {}).get(label)
+
+        if entry is not None:
+            if entry['failures'] >= 2 and entry['count'] == 0:
+                return None
+            if entry['count'] >= self.minCount and entry['raw']:
+                return entry['bytes'] / entry['raw']
+
+        return getPrior(compression, predictor)
+
+
+    def record(self, url, file):
+        """
+        Adds the size of a downloaded GetCoverage response to the statistics of its server
+        """
+
+        info = readTiffInfo(file)
+        if info is None:
+            return
+
+        pixels = info['width'] * info['height']
+        size = os.path.getsize(file)
+        entry = self.getEntry(url, info['kind'])
+
+        with self.lock:
+            self.kinds[getRequestKey(url)] = info['kind']
+            entry['count'] += 1
+            entry['bytes'] += size
+            entry['pixels'] += pixels
+            entry['raw'] += pixels * info['samples'] * info['bits'] // 8
+
+        logger.info('Received ' + str(round(size / max(pixels, 1), 3)) + ' bytes per pixel as ' + getEncodingLabel(url) + ': ' + url)
+        self.write()
+
+
+    def recordError(self, url, e):
+        """
+        Counts a rejected request with encoding parameters, an encoding
+        which failed twice and never succeeded is not chosen any more
+
+        :param e: error of the request
+        """
+
+        if not isinstance(e, HTTPError) or e.code not in rejectedStatuses or getEncodingLabel(url).lower() == 'none':
+            return
+
+        # the kind is unknown without a response, the failure counts for all of them
+        for kind in ('byte', 'float', 'data'):
+            entry = self.getEntry(url, kind)
+            with self.lock:
+                entry['failures'] += 1
+
+        self.write()
+
+
+    def getEntry(self, url, kind):
+        host = urllib.parse.urlsplit(url).netloc.lower()
+        label = getEncodingLabel(url)
+
+        with self.lock:
+            return self.stats.setdefault(host, {}).setdefault(kind, {}).setdefault(label, {'count': 0, 'bytes': 0, 'pixels': 0, 'raw': 0, 'failures': 0})
+
+
+    def write(self):
+        """
+        Writes the statistics atomically
+        """
+
+        if self.path is None:
+            return
+
+        with self.lock:
+            tmp = self.path + '.tmp'
+            try:
+                with open(tmp, 'w') as f:
+                    json.dump(self.stats, f)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logger.warning('Could not write encoding statistics: ' + str(e))
+
+
+    def getSummaryLines(self):
+        """
+        :return: one readable line per server, kind of data and encoding
+        """
+
+        lines = []
+        with self.lock:
+            for host, kinds in sorted(self.stats.items()):
+                for kind, labels in sorted(kinds.items()):
+                    for label, entry in sorted(labels.items()):
+                        if not entry['count']:
+                            continue
+                        lines.append(host + ' ' + kind + ' ' + label + ': ' + str(entry['count']) + ' responses, '
+                            + str(round(entry['bytes'] / max(entry['pixels'], 1), 3)) + ' bytes/pixel, '
+                            + str(round(100 * entry['bytes'] / max(entry['raw'], 1))) + '% of uncompressed')
+
+        return lines
+
+
+    def clear(self):
+        with self.lock:
+            self.stats = {}
+        self.write()
+
+
+    def setMode(self, mode):
+        self.mode = mode
+
+
+    def getMode(self):
+        return self.mode
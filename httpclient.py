@@ -0,0 +1,475 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import http.client, io, socket, threading, time, urllib.parse, urllib.request, zlib
+from urllib.error import HTTPError, URLError
+
+from .metrics import Metrics
+from .retry import RetryPolicy
+from .encoding import EncodingNegotiator
+
+userAgent = 'QGIS Simple WCS 2'
+
+# sent with the xml requests, coverages are not compressed again
+acceptEncoding = 'gzip, deflate'
+encodedChunkSize = 64 * 1024
+
+# exception reports of the server are read up to this size
+errorBodySize = 64 * 1024
+
+
+class HttpClient:
+    """
+    HTTP client with persistent connections, pooled per host.
+    One instance is shared by the dialog and the background tasks,
+    so subsequent requests to a server skip the TCP and TLS handshake.
+    Errors are raised as urllib's HTTPError and URLError.
+    """
+
+
+    def __init__(self, poolSize=4, timeout=60, metrics=None, retryPolicy=None, negotiator=None):
+        """
+        :param poolSize: max number of idle connections kept per host
+        :param timeout: connect and read timeout in seconds
+        :param metrics: Metrics shared with the callers, a new one by default
+        :param retryPolicy: RetryPolicy of the callers, the default one by default
+        :param negotiator: EncodingNegotiator of the GetCoverage requests, one without stored statistics by default
+        """
+
+        self.poolSize = poolSize
+        self.timeout = timeout
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.retryPolicy = retryPolicy or RetryPolicy()
+        self.negotiator = negotiator if negotiator is not None else EncodingNegotiator()
+        self.pools = {}
+        self.lock = threading.Lock()
+
+
+    def request(self, url, headers=None, maxRedirects=5, measurement=None):
+        """
+        Sends a GET request and follows redirects
+
+        :param headers: additional request headers
+        :param measurement: Measurement which gets the network phases, status and size
+        :return: HttpResponse, the body has to be read or the response closed
+        """
+
+        for redirect in range(maxRedirects + 1):
+            response = self.send(url, headers, measurement)
+
+            if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+                response.close()
+                url = urllib.parse.urljoin(url, response.getheader('Location'))
+                continue
+
+            if response.status < 200 or response.status >= 300:
+                # the exception report is read now, so the connection goes back to the pool or is closed
+                with response:
+                    body = response.readUpTo(errorBodySize)
+                raise HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(body))
+
+            return response
+
+        raise URLError('too many redirects: ' + url)
+
+
+    def send(self, url, headers, measurement=None):
+        """
+        One request on a pooled connection. A reused connection may
+        have been closed by the server in the meantime, the request is
+        then repeated once on a new connection.
+        """
+
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise URLError('unsupported scheme: ' + parts.scheme)
+
+        key = (parts.scheme, parts.hostname, parts.port)
+        target = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+
+        allHeaders = {'User-Agent': userAgent}
+        allHeaders.update(headers or {})
+
+        while True:
+            conn, reused = self.getConnection(key)
+            if conn.simplewcsProxied:
+                target = url
+
+            try:
+                if not reused:
+                    self.connect(conn, measurement)
+
+                start = time.perf_counter()
+                conn.request('GET', target, headers=allHeaders)
+                response = conn.getresponse()
+                if measurement is not None:
+                    measurement.addPhase('ttfb', time.perf_counter() - start)
+                    measurement.set(status=response.status)
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                conn.close()
+                if reused:
+                    continue
+                raise URLError(e)
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                raise URLError(e)
+
+            return HttpResponse(self, key, conn, response, url, measurement)
+
+
+    def connect(self, conn, measurement):
+        """
+        Opens a new connection. The host name is looked up first,
+        so the DNS lookup is timed apart from the TCP and TLS handshakes,
+        then the connection is made to the resolved address without
+        looking the host up again.
+        """
+
+        if measurement is None:
+            conn.connect()
+            return
+
+        with measurement.phase('dns'):
+            addresses = socket.getaddrinfo(conn.host, conn.port, 0, socket.SOCK_STREAM)
+
+        with measurement.phase('connect'):
+            sock = openSocket(addresses, conn.timeout, conn.source_address)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn.sock = sock
+
+            if conn._tunnel_host:
+                conn._tunnel()
+
+            if isinstance(conn, http.client.HTTPSConnection):
+                serverHostname = conn._tunnel_host or conn.host
+                conn.sock = conn._context.wrap_socket(sock, server_hostname=serverHostname)
+
+
+    def getConnection(self, key):
+        """
+        :return: idle connection of the host or a new one, and whether it was reused
+        """
+
+        with self.lock:
+            pool = self.pools.get(key)
+            if pool:
+                return pool.pop(), True
+
+        return self.newConnection(key), False
+
+
+    def newConnection(self, key):
+        scheme, host, port = key
+
+        proxies = urllib.request.getproxies()
+        proxy = proxies.get(scheme)
+        if proxy and urllib.request.proxy_bypass(host):
+            proxy = None
+
+        connectionClass = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+
+        if proxy:
+            proxyParts = urllib.parse.urlsplit(proxy if '://' in proxy else 'http://' + proxy)
+            if scheme == 'https':
+                conn = http.client.HTTPSConnection(proxyParts.hostname, proxyParts.port, timeout=self.timeout)
+                conn.set_tunnel(host, port)
+                conn.simplewcsProxied = False
+            else:
+                conn = http.client.HTTPConnection(proxyParts.hostname, proxyParts.port, timeout=self.timeout)
+                conn.simplewcsProxied = True
+        else:
+            conn = connectionClass(host, port, timeout=self.timeout)
+            conn.simplewcsProxied = False
+
+        return conn
+
+
+    def releaseConnection(self, key, conn):
+        """
+        Puts a connection back into the pool after its response was read completely
+        """
+
+        with self.lock:
+            pool = self.pools.setdefault(key, [])
+            if len(pool) < self.poolSize:
+                pool.append(conn)
+                return
+
+        conn.close()
+
+
+    def close(self):
+        """
+        Closes all idle connections
+        """
+
+        with self.lock:
+            for pool in self.pools.values():
+                for conn in pool:
+                    conn.close()
+            self.pools = {}
+
+
+    def setPoolSize(self, poolSize):
+        self.poolSize = poolSize
+
+
+    def getPoolSize(self):
+        return self.poolSize
+
+
+    def setTimeout(self, timeout):
+        self.timeout = timeout
+
+
+    def getTimeout(self):
+        return self.timeout
+
+
+class HttpResponse:
+    """
+    File-like response. The connection goes back into the pool
+    as soon as the body has been read to the end.
+    Bodies with Content-Encoding gzip or deflate are inflated
+    while they are read, never more than one chunk at a time.
+    """
+
+
+    def __init__(self, client, key, conn, response, url, measurement=None):
+        self.client = client
+        self.key = key
+        self.conn = conn
+        self.response = response
+        self.url = url
+        self.measurement = measurement
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self.released = False
+        self.received = 0
+        self.start = time.perf_counter()
+
+        self.decoder = getDecoder(response.headers)
+
+        # responses without body, e.g. 304 Not Modified
+        if response.length == 0:
+            self.readRaw()
+
+
+    def read(self, amt=None):
+        """
+        :param amt: max number of bytes, after inflating if the body is compressed
+        """
+
+        if self.decoder is None:
+            return self.readRaw(amt)
+
+        try:
+            if amt is None:
+                return self.decoder.decompress(self.readRaw()) + self.flushDecoder()
+
+            # an empty chunk means the end of the body, so read on until something was inflated
+            while True:
+                if self.decoder.unconsumed_tail:
+                    data = self.decoder.decompress(self.decoder.unconsumed_tail, amt)
+                else:
+                    raw = self.readRaw(encodedChunkSize)
+                    if not raw:
+                        return self.flushDecoder()
+                    data = self.decoder.decompress(raw, amt)
+
+                if data:
+                    return data
+        except zlib.error as e:
+            self.close()
+            raise URLError('invalid ' + self.getheader('Content-Encoding') + ' response: ' + str(e))
+
+
+    def readUpTo(self, size):
+        """
+        Reads until size bytes or the end of the body
+        """
+
+        data = b''
+        while len(data) < size:
+            chunk = self.read(size - len(data))
+            if not chunk:
+                break
+            data += chunk
+
+        return data
+
+
+    def flushDecoder(self):
+        """
+        Rest of the inflated body, later reads return the raw end of the body
+        """
+
+        data = self.decoder.flush()
+        self.decoder = None
+
+        return data
+
+
+    def readRaw(self, amt=None):
+        """
+        Reads the body as it was sent
+        """
+
+        try:
+            data = self.response.read(amt)
+        except (OSError, http.client.HTTPException) as e:
+            self.close()
+            raise URLError(e)
+
+        self.received += len(data)
+
+        if self.response.isclosed():
+            self.release()
+
+        return data
+
+
+    def getcode(self):
+        return self.status
+
+
+    def getheader(self, name, default=None):
+        return self.response.getheader(name, default)
+
+
+    def geturl(self):
+        return self.url
+
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        self.measureTransfer()
+
+        if self.response.will_close:
+            self.conn.close()
+        else:
+            self.client.releaseConnection(self.key, self.conn)
+
+
+    def close(self):
+        """
+        Releases the connection, it is dropped if the body was not read completely
+        """
+
+        if not self.response.isclosed():
+            self.response.close()
+            self.conn.close()
+            self.released = True
+            self.measureTransfer()
+
+        self.release()
+
+
+    def measureTransfer(self):
+        """
+        Adds the time and size of the body to the measurement, once
+        """
+
+        if self.measurement is not None:
+            self.measurement.addPhase('transfer', time.perf_counter() - self.start)
+            self.measurement.set(bytes=self.measurement.record['bytes'] + self.received)
+            self.measurement = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def openSocket(addresses, timeout, sourceAddress=None):
+    """
+    Connects to the first reachable of the addresses returned by getaddrinfo
+
+    :param timeout: socket timeout, the default timeout if it is the global default
+    :return: connected socket
+    """
+
+    error = None
+    for family, type, proto, canonname, address in addresses:
+        sock = None
+        try:
+            sock = socket.socket(family, type, proto)
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if sourceAddress:
+                sock.bind(sourceAddress)
+            sock.connect(address)
+            return sock
+        except OSError as e:
+            error = e
+            if sock is not None:
+                sock.close()
+
+    raise error or OSError('getaddrinfo returned no address')
+
+
+def getDecoder(headers):
+    """
+    :return: zlib decompressobj or DeflateDecoder for a Content-Encoding gzip or deflate, None otherwise
+    """
+
+    # 32 + 15 detects the gzip or zlib header
+    encoding = (headers.get('Content-Encoding') or '').strip().lower()
+    if encoding in ('gzip', 'x-gzip'):
+        return zlib.decompressobj(32 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        return DeflateDecoder()
+
+    return None
+
+
+class DeflateDecoder:
+    """
+    Inflates a Content-Encoding deflate. It is meant to be zlib wrapped,
+    but some servers send raw deflate, which is tried if the first chunk
+    has no zlib header. Used like a zlib decompressobj.
+    """
+
+
+    def __init__(self):
+        self.decoder = zlib.decompressobj()
+        self.started = False
+
+
+    def decompress(self, data, max_length=0):
+        if self.started:
+            return self.decoder.decompress(data, max_length)
+
+        try:
+            result = self.decoder.decompress(data, max_length)
+        except zlib.error:
+            self.decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+            result = self.decoder.decompress(data, max_length)
+
+        # the header is checked once two bytes were seen
+        self.started = len(data) >= 2 or bool(result)
+
+        return result
+
+
+    @property
+    def unconsumed_tail(self):
+        return self.decoder.unconsumed_tail
+
+
+    def flush(self):
+        return self.decoder.flush()
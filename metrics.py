@@ -0,0 +1,233 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import collections, contextlib, csv, json, math, threading, time, urllib.parse
+
+# phases of an operation in seconds, in the order they happen
+metricPhases = ['dns', 'connect', 'ttfb', 'transfer', 'parse', 'convert', 'load']
+metricFields = ['time', 'operation', 'host', 'coverage', 'status', 'cache', 'bytes', 'retries', 'hedged', 'total'] + metricPhases + ['error', 'url']
+
+
+class Measurement:
+    """
+    Timings and sizes of one operation, e.g. a GetCoverage request.
+    Handed down to the HttpClient, which adds the network phases.
+    """
+
+
+    def __init__(self, metrics, operation, url, coverage=None):
+        parts = urllib.parse.urlsplit(url)
+        params = dict((key.upper(), value) for key, value in urllib.parse.parse_qsl(parts.query))
+
+        self.metrics = metrics
+        self.start = time.perf_counter()
+        self.finished = False
+        self.record = {
+            'time': time.time(),
+            'operation': operation,
+            'host': parts.netloc,
+            'coverage': coverage or params.get('COVERAGEID'),
+            'status': None,
+            'cache': None,
+            'bytes': 0,
+            'retries': 0,
+            'hedged': None,
+            'total': None,
+            'error': None,
+            'url': url
+        }
+
+
+    def set(self, **fields):
+        self.record.update(fields)
+
+
+    def addPhase(self, phase, seconds):
+        self.record[phase] = self.record.get(phase, 0) + seconds
+
+
+    @contextlib.contextmanager
+    def phase(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.addPhase(phase, time.perf_counter() - start)
+
+
+    def finish(self, error=None):
+        """
+        Puts the record into the ring buffer, only the first call counts
+
+        :param error: exception or message if the operation failed
+        """
+
+        if self.finished:
+            return
+        self.finished = True
+
+        if isinstance(error, BaseException):
+            self.record['error'] = type(error).__name__ + (': ' + str(error) if str(error) else '')
+        elif error is not None:
+            self.record['error'] = str(error)
+        self.record['total'] = time.perf_counter() - self.start
+        self.metrics.add(self.record)
+
+
+class Metrics:
+    """
+    Ring buffer of the latest operations, shared by the dialog and the
+    background tasks. Summarized per operation and host, exported as JSON or CSV.
+    """
+
+
+    def __init__(self, size=1000):
+        """
+        :param size: max number of records kept, older ones are dropped
+        """
+
+        self.records = collections.deque(maxlen=size)
+        self.lock = threading.Lock()
+
+
+    def begin(self, operation, url, coverage=None):
+        """
+        :param operation: e.g. GetCapabilities, DescribeCoverage, GetCoverage or LoadLayer
+        :param coverage: coverage id, taken from the url by default
+        :return: Measurement, finish() puts it into the buffer
+        """
+
+        return Measurement(self, operation, url, coverage)
+
+
+    def add(self, record):
+        with self.lock:
+            self.records.append(record)
+
+
+    def getRecords(self):
+        with self.lock:
+            return list(self.records)
+
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+
+    def summarize(self):
+        """
+        :return: list of dicts with count, errors, cache hits, retries, hedged
+            requests, bytes and p50 and p95 of the total seconds per operation and host
+        """
+
+        groups = collections.OrderedDict()
+        for record in self.getRecords():
+            groups.setdefault((record['operation'], record['host']), []).append(record)
+
+        summary = []
+        for (operation, host), records in groups.items():
+            totals = sorted(record['total'] for record in records)
+            summary.append({
+                'operation': operation,
+                'host': host,
+                'count': len(records),
+                'errors': sum(1 for record in records if record['error']),
+                'cacheHits': sum(1 for record in records if record['cache'] == 'hit'),
+                'retries': sum(record['retries'] for record in records),
+                'hedged': sum(1 for record in records if record['hedged']),
+                'bytes': sum(record['bytes'] for record in records),
+                'p50': getPercentile(totals, 50),
+                'p95': getPercentile(totals, 95)
+            })
+
+        return summary
+
+
+    def getPercentileOf(self, operation, host, field, percent, minCount=1):
+        """
+        Percentile of a timing of the successful records of an operation and host,
+        e.g. the p95 of the time to first byte
+
+        :param field: 'total' or one of metricPhases
+        :param minCount: min number of records with the field
+        :return: seconds or None if there are fewer records
+        """
+
+        values = sorted(
+            record[field] for record in self.getRecords()
+            if record['operation'] == operation and record['host'] == host and not record['error'] and record.get(field) is not None
+        )
+
+        if len(values) < minCount:
+            return None
+
+        return getPercentile(values, percent)
+
+
+    def getSummaryLines(self):
+        """
+        :return: one readable line per operation and host
+        """
+
+        return [
+            entry['operation'] + ' ' + entry['host'] + ': ' + str(entry['count']) + ' requests, '
+            + str(entry['errors']) + ' errors, ' + str(entry['cacheHits']) + ' cache hits, '
+            + str(entry['retries']) + ' retries, ' + str(entry['hedged']) + ' hedged, '
+            + str(round(entry['bytes'] / (1024 * 1024), 1)) + ' MB, '
+            + 'p50 ' + str(round(entry['p50'], 3)) + ' s, p95 ' + str(round(entry['p95'], 3)) + ' s'
+            for entry in self.summarize()
+        ]
+
+
+    def exportJson(self, path):
+        with open(path, 'w') as f:
+            json.dump({'summary': self.summarize(), 'records': self.getRecords()}, f, indent=2)
+
+
+    def exportCsv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, metricFields, restval='')
+            writer.writeheader()
+            writer.writerows(self.getRecords())
+
+
+    def export(self, path):
+        """
+        CSV if the file name ends with .csv, JSON otherwise
+        """
+
+        if path.lower().endswith('.csv'):
+            self.exportCsv(path)
+        else:
+            self.exportJson(path)
+
+
+    def setSize(self, size):
+        with self.lock:
+            self.records = collections.deque(self.records, maxlen=size)
+
+
+    def getSize(self):
+        return self.records.maxlen
+
+
+def getPercentile(ordered, percent):
+    """
+    Nearest rank percentile of a sorted list
+    """
+
+    if not ordered:
+        return None
+
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+
+    return ordered[rank - 1]
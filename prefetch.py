@@ -0,0 +1,176 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import asyncio, logging
+
+from urllib.error import HTTPError, URLError
+
+from .asyncclient import Throttle, fetchFile
+from .download import Progress
+from .client import recordDownload
+from .scheduler import backgroundPriority, requestPriority
+
+logger = logging.getLogger('simplewcs')
+
+
+class Prefetcher:
+    """
+    Downloads the extents the user will probably look at next into the
+    tile cache, in the background on the event loop. At most 'workers'
+    files are fetched at a time, optionally with limited bandwidth.
+    Requests of the user come first: they cancel the running prefetch,
+    partial files are resumed by whoever requests them next, and queued
+    jobs are let in before prefetches at the per host limits.
+    """
+
+
+    def __init__(self, loopThread, cache, workers=2, bandwidth=0):
+        """
+        :param loopThread: EventLoopThread of the AsyncWcsClient
+        :param cache: TileCache which gets the files
+        :param workers: max number of files fetched at the same time
+        :param bandwidth: max summed throughput in bytes per second, 0 for no limit
+        """
+
+        self.loopThread = loopThread
+        self.cache = cache
+        self.workers = workers
+        self.bandwidth = bandwidth
+        self.future = None
+
+
+    def start(self, wcsClient, covId, extents, outputCrs, subsettingCrs, format, tiles=1, scaling=None, bands=None):
+        """
+        Cancels the running prefetch and fetches the extents in the given order
+
+        :param wcsClient: AsyncWcsClient
+        :param extents: list of [xmin, ymin, xmax, ymax], the most probable first
+        :param tiles: number of tiles per side, as the user requests them
+        :param bands: names of the range fields, as the user requests them
+        """
+
+        self.cancel()
+        self.future = self.loopThread.submit(self.prefetch(wcsClient, covId, extents, outputCrs, subsettingCrs, format, tiles, scaling, bands))
+
+
+    def cancel(self):
+        """
+        Stops fetching, e.g. before a request of the user
+        """
+
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+
+
+    async def prefetch(self, wcsClient, covId, extents, outputCrs, subsettingCrs, format, tiles, scaling, bands):
+        # the task runs in its own context, requests of the user overtake the waiting prefetches
+        requestPriority.set(backgroundPriority)
+
+        semaphore = asyncio.Semaphore(self.workers)
+        throttle = Throttle(self.bandwidth) if self.bandwidth else None
+
+        async def fetch(url):
+            async with semaphore:
+                await prefetchFile(wcsClient.httpClient, url, self.cache, throttle)
+
+        # errors are logged only, a prefetch never fails the user's work
+        urls = []
+        try:
+            for extent in extents:
+                urls += await wcsClient.getCoverageUrls(covId, extent, outputCrs, subsettingCrs, format, tiles, scaling, bands)
+        except (HTTPError, URLError) as e:
+            logger.info('Prefetch of ' + covId + ' failed: ' + str(e))
+            return
+
+        results = await asyncio.gather(*[fetch(url) for url in urls], return_exceptions=True)
+        for url, result in zip(urls, results):
+            if isinstance(result, Exception):
+                logger.info('Prefetch failed: ' + url + ': ' + str(result))
+
+        logger.info('Prefetch of ' + covId + ' finished, ' + str(len(urls)) + ' files')
+
+
+    def setWorkers(self, workers):
+        self.workers = workers
+
+
+    def getWorkers(self):
+        return self.workers
+
+
+    def setBandwidth(self, bandwidth):
+        self.bandwidth = bandwidth
+
+
+    def getBandwidth(self):
+        return self.bandwidth
+
+
+async def prefetchFile(httpClient, url, cache, throttle=None):
+    """
+    Fetches a GetCoverage response into the cache unless it is there already.
+    The transfer is registered like the requests of the user, so an identical
+    request joins it instead of downloading the file a second time.
+
+    :param httpClient: AsyncHttpClient
+    :param cache: TileCache
+    :param throttle: Throttle shared by the prefetch downloads
+    """
+
+    key = cache.getKey(url)
+    loop = asyncio.get_running_loop()
+    if await loop.run_in_executor(None, cache.get, key) is not None:
+        return
+
+    # the user requested the file already
+    inflightKey = 'GetCoverage ' + key
+    if httpClient.inflight.isRunning(inflightKey):
+        return
+
+    progress = Progress()
+
+    async def download(group):
+        measurement = httpClient.metrics.begin('Prefetch', url)
+        measurement.set(cache='miss')
+        try:
+            file = await fetchFile(httpClient, url, cache.getPath(key), group, measurement=measurement, throttle=PrefetchThrottle(throttle, group, progress) if throttle else None)
+        except BaseException as e:
+            recordDownload(httpClient, url, cache, None, measurement, e)
+            raise
+        await loop.run_in_executor(None, recordDownload, httpClient, url, cache, file, measurement)
+
+        return file
+
+    await httpClient.inflight.run(inflightKey, download, progress)
+
+
+class PrefetchThrottle:
+    """
+    Limits the throughput of a prefetch only as long as nobody else waits
+    for it, a request of the user joining the transfer gets full speed
+    """
+
+
+    def __init__(self, throttle, group, progress):
+        """
+        :param group: ProgressGroup of the transfer
+        :param progress: Progress of the prefetch
+        """
+
+        self.throttle = throttle
+        self.group = group
+        self.progress = progress
+
+
+    async def consume(self, size):
+        if self.group.members == [self.progress]:
+            await self.throttle.consume(size)
@@ -0,0 +1,166 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import asyncio, email.utils, logging, random, time
+
+from urllib.error import HTTPError, URLError
+
+logger = logging.getLogger('simplewcs')
+
+# answers of an overloaded or restarting server, worth a later try
+transientStatuses = [408, 425, 429, 500, 502, 503, 504]
+
+# URLErrors raised before anything was sent, another try ends the same way
+permanentReasons = ('unsupported scheme', 'too many redirects')
+
+
+class RetryPolicy:
+    """
+    Decides whether a failed request is sent again and how long to wait
+    before. Connection errors, timeouts and transient status codes are
+    retried, the delay doubles with every attempt and is drawn at random
+    below that bound, so clients which failed together do not come back
+    together. A Retry-After of the server is followed.
+    """
+
+
+    def __init__(self, attempts=4, baseDelay=0.5, maxDelay=30, statuses=transientStatuses):
+        """
+        :param attempts: max number of tries, 1 to never retry
+        :param baseDelay: bound of the first delay in seconds
+        :param maxDelay: upper bound of every delay in seconds, also of Retry-After
+        :param statuses: HTTP status codes retried
+        """
+
+        self.attempts = attempts
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+        self.statuses = statuses
+
+
+    def isTransient(self, e):
+        """
+        :param e: HTTPError or URLError
+        """
+
+        if isinstance(e, HTTPError):
+            return e.code in self.statuses
+
+        return not (isinstance(e.reason, str) and e.reason.startswith(permanentReasons))
+
+
+    def getDelay(self, attempt, e=None):
+        """
+        :param attempt: number of the failed attempt, starting with 0
+        :param e: error of the attempt, its Retry-After header is followed
+        :return: seconds to wait before the next attempt
+        """
+
+        retryAfter = getRetryAfter(e) if isinstance(e, HTTPError) else None
+        if retryAfter is not None:
+            return min(retryAfter, self.maxDelay)
+
+        return random.uniform(0, min(self.maxDelay, self.baseDelay * 2 ** attempt))
+
+
+    def shouldRetry(self, attempt, e):
+        return attempt < self.attempts - 1 and self.isTransient(e)
+
+
+    def call(self, function, measurement=None):
+        """
+        Calls function() until it succeeds, blocking while waiting
+
+        :param measurement: Measurement which gets the number of retries
+        :return: result of function
+        """
+
+        attempt = 0
+        while True:
+            try:
+                return function()
+            except (HTTPError, URLError) as e:
+                if not self.shouldRetry(attempt, e):
+                    raise
+                time.sleep(self.onRetry(attempt, e, measurement))
+            attempt += 1
+
+
+    async def run(self, newCoroutine, measurement=None):
+        """
+        Awaits newCoroutine() until it succeeds
+
+        :param newCoroutine: function returning a new coroutine for every attempt
+        :param measurement: Measurement which gets the number of retries
+        :return: result of the coroutine
+        """
+
+        attempt = 0
+        while True:
+            try:
+                return await newCoroutine()
+            except (HTTPError, URLError) as e:
+                if not self.shouldRetry(attempt, e):
+                    raise
+                await asyncio.sleep(self.onRetry(attempt, e, measurement))
+            attempt += 1
+
+
+    def onRetry(self, attempt, e, measurement):
+        """
+        :return: delay before the next attempt
+        """
+
+        delay = self.getDelay(attempt, e)
+
+        if measurement is not None:
+            measurement.set(retries=attempt + 1)
+            logger.info('Retry in ' + str(round(delay, 1)) + ' s after ' + str(e) + ': ' + measurement.record['url'])
+        else:
+            logger.info('Retry in ' + str(round(delay, 1)) + ' s after ' + str(e))
+
+        return delay
+
+
+    def setAttempts(self, attempts):
+        self.attempts = attempts
+
+
+    def getAttempts(self):
+        return self.attempts
+
+
+    def setBaseDelay(self, baseDelay):
+        self.baseDelay = baseDelay
+
+
+    def getBaseDelay(self):
+        return self.baseDelay
+
+
+def getRetryAfter(e):
+    """
+    :param e: HTTPError
+    :return: seconds of the Retry-After header, given as seconds or as date, or None
+    """
+
+    value = e.headers.get('Retry-After') if e.headers is not None else None
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,58 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+# modes offered in the dialog, in the order of cbScaling
+scalingModes = ['Native resolution', 'Canvas size', 'Ground resolution', 'Scale factor']
+
+
+def getScaleSize(labels, width, height):
+    """
+    SCALESIZE parameter of the WCS 2.0 Scaling extension
+
+    :param labels: axis labels of the coverage
+    :param width: pixels along the first axis
+    :param height: pixels along the second axis
+    """
+
+    return ('SCALESIZE', labels[0] + '(' + str(width) + '),' + labels[1] + '(' + str(height) + ')')
+
+
+def getScaleFactor(factor):
+    """
+    SCALEFACTOR parameter, the same factor for all axes
+    """
+
+    return ('SCALEFACTOR', str(factor))
+
+
+def getCanvasPixels(window, extent, width, height):
+    """
+    Pixels of a window if the whole extent is shown with width x height pixels
+
+    :param window: [xmin, ymin, xmax, ymax] inside extent
+    :param extent: [xmin, ymin, xmax, ymax]
+    """
+
+    columns = round(width * (window[2] - window[0]) / (extent[2] - extent[0]))
+    rows = round(height * (window[3] - window[1]) / (extent[3] - extent[1]))
+
+    return max(columns, 1), max(rows, 1)
+
+
+def getResolutionPixels(window, resolution):
+    """
+    Pixels of a window at a ground resolution in map units per pixel
+    """
+
+    columns = round((window[2] - window[0]) / resolution)
+    rows = round((window[3] - window[1]) / resolution)
+
+    return max(columns, 1), max(rows, 1)
@@ -0,0 +1,338 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import asyncio, concurrent.futures, contextvars, heapq, itertools, threading, time
+
+from .download import DownloadCanceled
+
+# lower values come first
+visiblePriority = 0
+userPriority = 1
+backgroundPriority = 2
+
+priorityNames = {visiblePriority: 'visible', userPriority: 'user', backgroundPriority: 'background'}
+
+# priority of the requests of the running job, read by the per host limits of the AsyncHttpClient
+requestPriority = contextvars.ContextVar('requestPriority', default=userPriority)
+
+
+class PriorityLimit:
+    """
+    Admission of coroutines to a limited resource, e.g. the connections
+    to a host: at most 'size' at the same time and at most 'rate' starts
+    per second. Waiting coroutines are let in by priority, then in the
+    order they arrived. Runs on one event loop.
+    """
+
+
+    def __init__(self, size, rate=0):
+        """
+        :param size: max number of holders at the same time
+        :param rate: max number of acquisitions per second, 0 for no limit
+        """
+
+        self.size = size
+        self.rate = rate
+        self.active = 0
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.next = 0.0
+
+
+    async def acquire(self, priority=None):
+        """
+        :param priority: lower values first, requestPriority of the caller by default
+        """
+
+        if priority is None:
+            priority = requestPriority.get()
+
+        if self.active < self.size and not self.waiting:
+            self.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self.waiting, (priority, next(self.sequence), future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                # canceled right after it was let in
+                if future.done() and not future.cancelled():
+                    self.release()
+                raise
+
+        if self.rate:
+            now = asyncio.get_running_loop().time()
+            start = max(self.next, now)
+            self.next = start + 1 / self.rate
+            if start > now:
+                try:
+                    await asyncio.sleep(start - now)
+                except asyncio.CancelledError:
+                    self.release()
+                    raise
+
+
+    def release(self):
+        """
+        Lets in the next waiting coroutine, canceled ones are skipped
+        """
+
+        self.active -= 1
+
+        while self.waiting and self.active < self.size:
+            priority, sequence, future = heapq.heappop(self.waiting)
+            if not future.done():
+                self.active += 1
+                future.set_result(None)
+
+
+    def setSize(self, size):
+        """
+        Waiting coroutines are let in at once if the limit grows
+        """
+
+        self.size = size
+        self.active += 1
+        self.release()
+
+
+    def getSize(self):
+        return self.size
+
+
+    def setRate(self, rate):
+        self.rate = rate
+
+
+    def getRate(self):
+        return self.rate
+
+
+    def getWaiting(self):
+        return sum(1 for priority, sequence, future in self.waiting if not future.done())
+
+
+def runWithPriority(task, priority, function, *args):
+    """
+    Calls function(task, *args) in the calling thread, the requests
+    it sends on the event loop are admitted with the priority
+    """
+
+    # worker threads are reused, the priority must not stick to the next task
+    token = requestPriority.set(priority)
+    try:
+        return function(task, *args)
+    finally:
+        requestPriority.reset(token)
+
+
+class Job:
+    """
+    One queued GetCoverage. Passed to the task function and its Progress
+    in place of a QgsTask, they only ask whether it was canceled and
+    report the progress.
+    """
+
+    ids = itertools.count(1)
+
+
+    def __init__(self, name, host, priority, function, args, progress):
+        """
+        :param function: function(job, *args) run in a worker thread, returns None on errors
+        :param progress: Progress of the downloads of the job, reports to the job
+        """
+
+        self.id = next(Job.ids)
+        self.name = name
+        self.host = host
+        self.priority = priority
+        self.function = function
+        self.args = args
+        self.progress = progress
+        self.progress.setTask(self)
+        self.percent = 0
+        self.state = 'queued'
+        self.canceled = False
+        self.future = None
+        self.result = None
+        self.exception = None
+        self.created = time.time()
+        self.started = None
+        self.ended = None
+
+
+    def isCanceled(self):
+        return self.canceled
+
+
+    def cancel(self):
+        """
+        A queued job is dropped, a running one stops at its next chunk
+        """
+
+        self.canceled = True
+        if self.state == 'queued' and self.future is not None:
+            self.future.cancel()
+
+
+    def isDone(self):
+        return self.state in ('finished', 'failed', 'canceled')
+
+
+    def setProgress(self, percent):
+        self.percent = percent
+
+
+    def getPercent(self):
+        return 100 if self.state == 'finished' else self.percent
+
+
+    def getDescription(self):
+        """
+        :return: one readable line for the queue list
+        """
+
+        text = '#' + str(self.id) + ' ' + self.name + ' (' + self.host + ', ' + priorityNames.get(self.priority, str(self.priority)) + '): ' + self.state
+        if self.state == 'running':
+            text += ' ' + str(int(self.getPercent())) + '%'
+
+        return text
+
+
+class Scheduler:
+    """
+    Queue of GetCoverage jobs of any coverage and server. At most maxJobs
+    run at the same time, visible and user requested jobs before background
+    ones. The requests of the jobs keep their priority at the per host
+    limits of the AsyncHttpClient, so a background job never holds up a
+    visible one for longer than its running requests.
+    """
+
+
+    def __init__(self, loopThread, maxJobs=2, onFinished=None):
+        """
+        :param loopThread: EventLoopThread
+        :param onFinished: called on the loop thread with every finished, failed or canceled Job
+        """
+
+        self.loopThread = loopThread
+        self.slots = PriorityLimit(maxJobs)
+        self.onFinished = onFinished
+        self.jobs = []
+        self.lock = threading.Lock()
+
+        # jobs block their thread until they are done, the default executor of the loop stays free for DNS lookups and GDAL
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=maxJobs, thread_name_prefix='simplewcs-job')
+
+
+    def submit(self, name, host, priority, function, args, progress):
+        """
+        Queues a job
+
+        :return: Job
+        """
+
+        job = Job(name, host, priority, function, args, progress)
+        with self.lock:
+            self.jobs.append(job)
+        job.future = self.loopThread.submit(self.run(job))
+
+        return job
+
+
+    async def run(self, job):
+        loop = asyncio.get_running_loop()
+
+        try:
+            await self.slots.acquire(job.priority)
+        except asyncio.CancelledError:
+            # the result handlers tell a cancel of the user from an error by the exception
+            job.exception = DownloadCanceled(job.name)
+            self.finish(job, 'canceled')
+            raise
+
+        job.state = 'running'
+        job.started = time.time()
+        try:
+            # the task functions block until their coroutines are done, so they run in worker threads
+            job.result = await loop.run_in_executor(self.executor, runWithPriority, job, job.priority, job.function, *job.args)
+        except asyncio.CancelledError:
+            job.exception = DownloadCanceled(job.name)
+            self.finish(job, 'canceled')
+            raise
+        except Exception as e:
+            job.exception = e
+            self.finish(job, 'canceled' if job.canceled else 'failed')
+        else:
+            self.finish(job, 'failed' if job.result is None else 'finished')
+        finally:
+            self.slots.release()
+
+
+    def finish(self, job, state):
+        job.state = state
+        job.ended = time.time()
+
+        if self.onFinished is not None:
+            self.onFinished(job)
+
+
+    def getJobs(self):
+        with self.lock:
+            return list(self.jobs)
+
+
+    def getJob(self, jobId):
+        for job in self.getJobs():
+            if job.id == jobId:
+                return job
+
+        return None
+
+
+    def cancelAll(self):
+        for job in self.getJobs():
+            if not job.isDone():
+                job.cancel()
+
+
+    def shutdown(self):
+        """
+        Cancels all jobs and lets the worker threads end once their jobs noticed
+        """
+
+        self.cancelAll()
+        self.executor.shutdown(wait=False)
+
+
+    def clearDone(self):
+        """
+        Removes finished, failed and canceled jobs from the list
+        """
+
+        with self.lock:
+            self.jobs = [job for job in self.jobs if not job.isDone()]
+
+
+    def setMaxJobs(self, maxJobs):
+        """
+        The running jobs finish in the threads of the old executor
+        """
+
+        executor = self.executor
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=maxJobs, thread_name_prefix='simplewcs-job')
+        executor.shutdown(wait=False)
+
+        self.loopThread.loop.call_soon_threadsafe(self.slots.setSize, maxJobs)
+
+
+    def getMaxJobs(self):
+        return self.slots.getSize()
@@ -17,15 +17,45 @@ from .simplewcs_dialog import SimpleWCSDialog
 from .resources import *
 from .wcs import *
 from .coverage import *
-from qgis.core import QgsApplication, QgsMessageLog, QgsRasterLayer, QgsProject, QgsLayerTreeLayer, Qgis, QgsTask, QgsRectangle, QgsDataSourceUri, QgsCoordinateReferenceSystem
+from .tiling import *
+from .cache import *
+from .httpclient import *
+from .download import *
+from .scaling import *
+from .client import *
+from .metrics import *
+from .spatialindex import *
+from .cog import *
+from .streaming import *
+from .asyncclient import EventLoopThread, AsyncHttpClient, AsyncWcsClient, supportsRanges
+from .prefetch import Prefetcher
+from .retry import RetryPolicy
+from .encoding import EncodingNegotiator, encodingModes, getTiffFormats
+from .catalog import ServerCatalog, dumpCapabilities
+from .scheduler import Scheduler, visiblePriority, userPriority, backgroundPriority, runWithPriority
+from qgis.core import QgsApplication, QgsMessageLog, QgsRasterLayer, QgsProject, QgsLayerTreeLayer, Qgis, QgsTask, QgsRectangle, QgsDataSourceUri, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsCsException, QgsDataProvider
 from urllib.error import HTTPError, URLError
 from urllib.request import Request
 from urllib.parse import urlparse
 
-import os.path, urllib
+import functools, logging, os.path, queue, urllib
 
 logheader = 'Simple WCS 2'
 
+# upper limit of coverages requested at once for one mosaic
+maxMosaicCoverages = 100
+
+
+class QgsLogHandler(logging.Handler):
+    """
+    Forwards the log of the Qt-free modules to the QGIS message log
+    """
+
+
+    def emit(self, record):
+        level = Qgis.Warning if record.levelno >= logging.WARNING else Qgis.Info
+        QgsMessageLog.logMessage(self.format(record), logheader, level)
+
 class SimpleWCS:
 
 
@@ -56,8 +86,56 @@ class SimpleWCS:
         self.menu = self.tr(u'&Simple WCS 2')
         self.firstStart = None
         self.wcs = ''
+        self.wcsClient = None
         self.acceptedVersions = ['2.1.0', '2.0.1', '2.0.0']
 
+        self.logHandler = QgsLogHandler()
+        logger.addHandler(self.logHandler)
+        logger.setLevel(logging.INFO)
+
+        cacheDir = os.path.join(QgsApplication.qgisSettingsDirPath(), 'simplewcs', 'cache')
+        cacheSize = QSettings().value('simplewcs/cacheSize', 1024, type=int)
+        self.cache = TileCache(cacheDir, cacheSize * 1024 * 1024)
+
+        metadataDir = os.path.join(QgsApplication.qgisSettingsDirPath(), 'simplewcs', 'metadata')
+        metadataTtl = QSettings().value('simplewcs/metadataTtl', 60, type=int)
+        self.metadataCache = MetadataCache(metadataDir, metadataTtl * 60)
+
+        # parsed capabilities of the saved connections, shown before they are requested again
+        catalogPath = os.path.join(QgsApplication.qgisSettingsDirPath(), 'simplewcs', 'catalog.sqlite')
+        self.catalog = ServerCatalog(catalogPath)
+
+        poolSize = QSettings().value('simplewcs/poolSize', 4, type=int)
+        timeout = QSettings().value('simplewcs/timeout', 60, type=int)
+        rateLimit = QSettings().value('simplewcs/rateLimit', 0, type=int)
+        retries = QSettings().value('simplewcs/retries', 3, type=int)
+        hedge = QSettings().value('simplewcs/hedge', False, type=bool)
+        metricsSize = QSettings().value('simplewcs/metricsSize', 1000, type=int)
+        self.metrics = Metrics(metricsSize)
+        globals()['metrics'] = self.metrics
+
+        # sizes of the responses per server and encoding, the next requests get the smallest encoding
+        encodingPath = os.path.join(QgsApplication.qgisSettingsDirPath(), 'simplewcs', 'encodings.json')
+        encoding = QSettings().value('simplewcs/encoding', 0, type=int)
+        self.negotiator = EncodingNegotiator(encodingPath, encodingModes[encoding])
+
+        # every request runs on one event loop thread, the dialog never waits for the network
+        self.client = AsyncHttpClient(poolSize, timeout, self.metrics, rateLimit, RetryPolicy(retries + 1), hedge, self.negotiator)
+        self.loopThread = EventLoopThread()
+        self.summaries = queue.Queue()
+
+        # GetCoverage requests wait in the scheduler, finished ones are handed to the GUI thread by the job timer
+        maxJobs = QSettings().value('simplewcs/maxJobs', 2, type=int)
+        self.finishedJobs = queue.Queue()
+        self.scheduler = Scheduler(self.loopThread, maxJobs, self.finishedJobs.put)
+        self.jobCallbacks = {}
+        self.barJob = None
+        self.barWidget = None
+
+        prefetchWorkers = QSettings().value('simplewcs/prefetchWorkers', 2, type=int)
+        prefetchBandwidth = QSettings().value('simplewcs/prefetchBandwidth', 0, type=int)
+        self.prefetcher = Prefetcher(self.loopThread, self.cache, prefetchWorkers, prefetchBandwidth * 1000 * 1000 // 8)
+
 
     def tr(self, message):
         """
@@ -126,6 +204,19 @@ class SimpleWCS:
         Removes the plugin menu item and icon from QGIS GUI.
         """
 
+        if self.firstStart == False:
+            self.liveTimer.stop()
+            self.jobTimer.stop()
+            self.iface.mapCanvas().extentsChanged.disconnect(self.scheduleLiveCoverage)
+            self.iface.mapCanvas().extentsChanged.disconnect(self.filterCoverageList)
+
+        self.prefetcher.cancel()
+        self.scheduler.shutdown()
+        self.loopThread.wait(self.client.close())
+        self.loopThread.stop()
+        self.catalog.close()
+        logger.removeHandler(self.logHandler)
+
         for action in self.actions:
             self.iface.removePluginRasterMenu(self.menu, action)
             #self.iface.removePluginRasterMenu(self.tr(u'&Simple WCS 2'),action)
@@ -147,20 +238,203 @@ class SimpleWCS:
             self.dlg.btnGetCapabilities.clicked.connect(self.getCapabilities)
             self.dlg.btnGetCapabilities.setEnabled(False)
 
+            self.summaryTimer = QTimer()
+            self.summaryTimer.timeout.connect(self.addSummaries)
+
             self.dlg.leUrl.textChanged.connect(self.enableBtnGetCapabilities)
 
-            globals()['btnGetCoverage'] = self.dlg.btnGetCoverage
+            self.dlg.lwServers.itemDoubleClicked.connect(self.openSelectedServer)
+            self.dlg.btnOpenServer.clicked.connect(self.openSelectedServer)
+            self.dlg.btnRemoveServer.clicked.connect(self.removeServer)
+
             self.dlg.btnGetCoverage.clicked.connect(self.getCovTask)
             self.dlg.btnGetCoverage.setEnabled(False)
+            self.dlg.btnQueueCoverage.clicked.connect(self.queueCovTask)
+            self.dlg.btnQueueCoverage.setEnabled(False)
 
             self.iface.mapCanvas().extentsChanged.connect(self.setExtentLabel)
 
+            self.coverageList = []
+            self.iface.mapCanvas().extentsChanged.connect(self.filterCoverageList)
+            self.dlg.cbInView.toggled.connect(self.setCoverageList)
+            self.dlg.cbCoverage.currentIndexChanged.connect(self.setBandList)
+
+            self.dlg.btnClearCache.clicked.connect(self.clearCache)
+
+            self.dlg.btnRefreshMetrics.clicked.connect(self.setMetricsText)
+            self.dlg.btnClearMetrics.clicked.connect(self.clearMetrics)
+            self.dlg.btnExportMetrics.clicked.connect(self.exportMetrics)
+            self.dlg.tabWidget.currentChanged.connect(self.setMetricsText)
+
+            self.dlg.cbScaling.addItems(scalingModes)
+            self.dlg.cbScaling.currentIndexChanged.connect(self.enableScaleValue)
+
+            self.dlg.cbEncoding.addItems(encodingModes)
+
+            self.dlg.cbCogCompression.addItems(cogCompressions)
+            self.dlg.cbCogResampling.addItems(cogResamplings)
+            self.dlg.cbCog.toggled.connect(self.enableCogOptions)
+
+            globals()['livetasks'] = []
+            globals()['liveGeneration'] = 0
+            globals()['liveShownGeneration'] = 0
+            globals()['liveBars'] = {}
+            self.liveTimer = QTimer()
+            self.liveTimer.setSingleShot(True)
+            self.liveTimer.timeout.connect(self.getLiveCoverage)
+            self.iface.mapCanvas().extentsChanged.connect(self.scheduleLiveCoverage)
+            self.dlg.cbLive.toggled.connect(self.scheduleLiveCoverage)
+
+            self.jobTimer = QTimer()
+            self.jobTimer.timeout.connect(self.updateQueue)
+            self.jobTimer.start(500)
+            self.dlg.sbMaxJobs.valueChanged.connect(self.scheduler.setMaxJobs)
+            self.dlg.btnCancelJob.clicked.connect(self.cancelJob)
+            self.dlg.btnCancelAll.clicked.connect(self.scheduler.cancelAll)
+            self.dlg.btnClearJobs.clicked.connect(self.clearJobs)
+
+            self.loadSettings()
+
+            # the last used server is shown at once from the catalog
+            self.setServerList()
+            lastUsed = self.catalog.getLastUsed()
+            if lastUsed is not None:
+                self.openServer(lastUsed)
+
         self.dlg.show()
 
         result = self.dlg.exec_()
 
+        self.saveSettings()
+
+
+    def loadSettings(self):
+        """
+        Restores the options of the settings tab
+        """
+
+        settings = QSettings()
+        self.dlg.cbTiled.setChecked(settings.value('simplewcs/tiled', False, type=bool))
+        self.dlg.sbTiles.setValue(settings.value('simplewcs/tiles', 2, type=int))
+        self.dlg.sbWorkers.setValue(settings.value('simplewcs/workers', 4, type=int))
+        self.dlg.sbCacheSize.setValue(settings.value('simplewcs/cacheSize', 1024, type=int))
+        self.dlg.sbMetadataTtl.setValue(settings.value('simplewcs/metadataTtl', 60, type=int))
+        self.dlg.sbPoolSize.setValue(settings.value('simplewcs/poolSize', 4, type=int))
+        self.dlg.sbTimeout.setValue(settings.value('simplewcs/timeout', 60, type=int))
+        self.dlg.sbRateLimit.setValue(settings.value('simplewcs/rateLimit', 0, type=int))
+        self.dlg.sbRetries.setValue(settings.value('simplewcs/retries', 3, type=int))
+        self.dlg.cbHedge.setChecked(settings.value('simplewcs/hedge', False, type=bool))
+        self.dlg.sbMaxJobs.setValue(settings.value('simplewcs/maxJobs', 2, type=int))
+        self.dlg.cbScaling.setCurrentIndex(settings.value('simplewcs/scaling', 0, type=int))
+        self.dlg.sbScaleValue.setValue(settings.value('simplewcs/scaleValue', 1.0, type=float))
+        self.enableScaleValue()
+        self.dlg.sbDebounce.setValue(settings.value('simplewcs/debounce', 750, type=int))
+        self.dlg.sbMetricsSize.setValue(settings.value('simplewcs/metricsSize', 1000, type=int))
+        self.dlg.cbEncoding.setCurrentIndex(settings.value('simplewcs/encoding', 0, type=int))
+        self.dlg.cbCog.setChecked(settings.value('simplewcs/cog', False, type=bool))
+        self.dlg.cbCogCompression.setCurrentIndex(settings.value('simplewcs/cogCompression', 0, type=int))
+        self.dlg.cbCogResampling.setCurrentIndex(settings.value('simplewcs/cogResampling', 0, type=int))
+        self.enableCogOptions()
+        self.dlg.cbStream.setChecked(settings.value('simplewcs/stream', False, type=bool))
+        self.dlg.sbStreamRetries.setValue(settings.value('simplewcs/streamRetries', 3, type=int))
+        self.dlg.sbStreamRetryDelay.setValue(settings.value('simplewcs/streamRetryDelay', 1, type=int))
+        self.dlg.cbPrefetch.setChecked(settings.value('simplewcs/prefetch', False, type=bool))
+        self.dlg.sbPrefetchWorkers.setValue(settings.value('simplewcs/prefetchWorkers', 2, type=int))
+        self.dlg.sbPrefetchBandwidth.setValue(settings.value('simplewcs/prefetchBandwidth', 0, type=int))
+        self.setCacheLabel()
+
+
+    def saveSettings(self):
+        """
+        Stores the options of the settings tab
+        """
+
+        settings = QSettings()
+        settings.setValue('simplewcs/tiled', self.dlg.cbTiled.isChecked())
+        settings.setValue('simplewcs/tiles', self.dlg.sbTiles.value())
+        settings.setValue('simplewcs/workers', self.dlg.sbWorkers.value())
+        settings.setValue('simplewcs/cacheSize', self.dlg.sbCacheSize.value())
+        settings.setValue('simplewcs/metadataTtl', self.dlg.sbMetadataTtl.value())
+        settings.setValue('simplewcs/poolSize', self.dlg.sbPoolSize.value())
+        settings.setValue('simplewcs/timeout', self.dlg.sbTimeout.value())
+        settings.setValue('simplewcs/rateLimit', self.dlg.sbRateLimit.value())
+        settings.setValue('simplewcs/retries', self.dlg.sbRetries.value())
+        settings.setValue('simplewcs/hedge', self.dlg.cbHedge.isChecked())
+        settings.setValue('simplewcs/maxJobs', self.dlg.sbMaxJobs.value())
+        settings.setValue('simplewcs/scaling', self.dlg.cbScaling.currentIndex())
+        settings.setValue('simplewcs/scaleValue', self.dlg.sbScaleValue.value())
+        settings.setValue('simplewcs/debounce', self.dlg.sbDebounce.value())
+        settings.setValue('simplewcs/metricsSize', self.dlg.sbMetricsSize.value())
+        settings.setValue('simplewcs/encoding', self.dlg.cbEncoding.currentIndex())
+        settings.setValue('simplewcs/cog', self.dlg.cbCog.isChecked())
+        settings.setValue('simplewcs/cogCompression', self.dlg.cbCogCompression.currentIndex())
+        settings.setValue('simplewcs/cogResampling', self.dlg.cbCogResampling.currentIndex())
+        settings.setValue('simplewcs/stream', self.dlg.cbStream.isChecked())
+        settings.setValue('simplewcs/streamRetries', self.dlg.sbStreamRetries.value())
+        settings.setValue('simplewcs/streamRetryDelay', self.dlg.sbStreamRetryDelay.value())
+        settings.setValue('simplewcs/prefetch', self.dlg.cbPrefetch.isChecked())
+        settings.setValue('simplewcs/prefetchWorkers', self.dlg.sbPrefetchWorkers.value())
+        settings.setValue('simplewcs/prefetchBandwidth', self.dlg.sbPrefetchBandwidth.value())
+
+        self.cache.setQuota(self.dlg.sbCacheSize.value() * 1024 * 1024)
+        self.metadataCache.setTtl(self.dlg.sbMetadataTtl.value() * 60)
+        self.client.setPoolSize(self.dlg.sbPoolSize.value())
+        self.client.setTimeout(self.dlg.sbTimeout.value())
+        self.client.setRateLimit(self.dlg.sbRateLimit.value())
+        self.client.retryPolicy.setAttempts(self.dlg.sbRetries.value() + 1)
+        self.client.setHedging(self.dlg.cbHedge.isChecked())
+        self.metrics.setSize(self.dlg.sbMetricsSize.value())
+        self.negotiator.setMode(encodingModes[self.dlg.cbEncoding.currentIndex()])
+        self.prefetcher.setWorkers(self.dlg.sbPrefetchWorkers.value())
+        self.prefetcher.setBandwidth(self.dlg.sbPrefetchBandwidth.value() * 1000 * 1000 // 8)
+
+
+    def clearCache(self):
+        self.cache.clear()
+        self.metadataCache.clear()
+        self.setCacheLabel()
+
+
+    def setCacheLabel(self):
+        size = self.cache.getSize() / (1024 * 1024)
+        self.dlg.lblCacheUsage.setText('Used: ' + str(round(size, 1)) + ' MB')
+
+
+    def setMetricsText(self):
+        lines = self.metrics.getSummaryLines()
+        encodings = self.negotiator.getSummaryLines()
+        if encodings:
+            lines += ['', 'GeoTIFF encodings:'] + encodings
+        self.dlg.pteMetrics.setPlainText('\n'.join(lines) if lines else 'No requests yet')
+
+
+    def clearMetrics(self):
+        self.metrics.clear()
+        self.setMetricsText()
+
+
+    def exportMetrics(self):
+        """
+        Writes every recorded request as JSON or CSV, chosen by the file extension
+        """
+
+        path, filter = QFileDialog.getSaveFileName(self.dlg, 'Export metrics', 'simplewcs-metrics.json', 'JSON (*.json);;CSV (*.csv)')
+        if not path:
+            return
+
+        try:
+            self.metrics.export(path)
+        except OSError as e:
+            self.logWarnMessage('Could not export metrics: ' + str(e))
+            self.openLog()
+
 
     def getCapabilities(self):
+        """
+        Requests the capabilities in a QgsTask, the coverage list
+        is filled while the coverage summaries arrive
+        """
+
         self.cleanTabGetCoverage()
 
         self.wcs = ''
@@ -169,13 +443,39 @@ class SimpleWCS:
 
         version = self.dlg.cbVersion.currentText()
 
-        params = {"REQUEST": "GetCapabilities", "SERVICE": "WCS", "Version": version}
-        querystring = urllib.parse.urlencode(params)
-        url = self.checkUrlSyntax(baseUrl)
-        xmlResponse = self.requestXML(url + querystring)
+        self.wcsClient = AsyncWcsClient(baseUrl, version, self.client, self.metadataCache)
+
+        self.summaries = queue.Queue()
+        self.summaryTimer.start(200)
+        self.dlg.btnGetCapabilities.setEnabled(False)
+
+        onFinished = functools.partial(capabilitiesLoaded, self, version)
+        globals()['captask'] = QgsTask.fromFunction(u'GetCapabilities', requestCapabilities, self.loopThread, self.wcsClient, self.summaries.put, on_finished=onFinished)
+        QgsApplication.taskManager().addTask(globals()['captask'])
 
-        capabilities = xml.etree.ElementTree.parse(xmlResponse).getroot()
-        self.wcs = WCS(capabilities)
+
+    def setCapabilities(self, version, exception, wcs, saved=False):
+        """
+        Shows the capabilities once the task has finished
+
+        :param version: version requested by the user
+        :param wcs: WCS or None if the request failed
+        :param saved: True if wcs comes from the catalog, otherwise it is saved there
+        """
+
+        self.summaryTimer.stop()
+        self.addSummaries()
+        self.enableBtnGetCapabilities()
+
+        if exception is not None and not isinstance(exception, DownloadCanceled):
+            self.logWarnMessage('Could not read capabilities: ' + str(exception))
+
+        if wcs is None:
+            self.wcsClient = None
+            self.openLog()
+            return
+
+        self.wcs = wcs
 
         versions = self.wcs.getVersions()
 
@@ -197,6 +497,186 @@ class SimpleWCS:
         if versionsOk is False:
             self.logWarnMessage('WCS does not support one of the following Versions: ' + ', '.join(self.acceptedVersions))
             self.openLog()
+        elif not saved:
+            self.catalog.put(self.wcsClient.url, version, wcs)
+            self.setServerList()
+
+
+    def setServerList(self):
+        """
+        Fills the list of saved connections, the last used first
+        """
+
+        self.dlg.lwServers.clear()
+        for server in self.catalog.getServers():
+            text = server['title'] + ' (' + str(server['coverages']) + ' coverages)' if server['title'] else server['url']
+            item = QListWidgetItem(text)
+            item.setData(Qt.UserRole, server['url'])
+            item.setToolTip(server['url'])
+            self.dlg.lwServers.addItem(item)
+
+
+    def getSelectedServer(self):
+        item = self.dlg.lwServers.currentItem()
+
+        return item.data(Qt.UserRole) if item is not None else None
+
+
+    def openSelectedServer(self):
+        url = self.getSelectedServer()
+        if url is not None:
+            self.openServer(url)
+
+
+    def removeServer(self):
+        url = self.getSelectedServer()
+        if url is not None:
+            self.catalog.remove(url)
+            self.setServerList()
+
+
+    def openServer(self, url):
+        """
+        Shows the saved capabilities of a connection without waiting
+        for the network, they are refreshed in the background
+        """
+
+        entry = self.catalog.get(url)
+        if entry is None:
+            self.setServerList()
+            return
+
+        self.dlg.leUrl.setText(url)
+        index = self.dlg.cbVersion.findText(entry['version'])
+        if index >= 0:
+            self.dlg.cbVersion.setCurrentIndex(index)
+
+        self.cleanTabGetCoverage()
+
+        self.wcsClient = AsyncWcsClient(url, entry['version'], self.client, self.metadataCache)
+        self.wcsClient.wcs = entry['wcs']
+        self.catalog.touch(url)
+        self.setCapabilities(entry['version'], None, entry['wcs'], saved=True)
+        self.setServerList()
+
+        onFinished = functools.partial(capabilitiesRefreshed, self, self.wcsClient, entry['version'])
+        globals()['refreshtask'] = QgsTask.fromFunction(u'Refresh capabilities', requestCapabilities, self.loopThread, self.wcsClient, None, on_finished=onFinished)
+        QgsApplication.taskManager().addTask(globals()['refreshtask'])
+
+
+    def updateCapabilities(self, wcsClient, version, wcs):
+        """
+        Saves refreshed capabilities and shows them if their server
+        is still open, the chosen coverage, crs and format are kept
+
+        :param wcsClient: AsyncWcsClient the refresh was requested with
+        :param wcs: WCS or None if the refresh failed
+        """
+
+        if wcs is None:
+            return
+
+        self.catalog.put(wcsClient.url, version, wcs)
+        self.setServerList()
+
+        if wcsClient is not self.wcsClient or dumpCapabilities(wcs) == dumpCapabilities(self.wcs):
+            return
+
+        logger.info('Capabilities changed: ' + wcsClient.url)
+
+        self.wcs = wcs
+        self.dlg.lblTitle.setText(wcs.getTitle())
+        self.setCoverageList()
+        self.setComboItems(self.dlg.cbCRS, wcs.getCRS())
+        self.setComboItems(self.dlg.cbFormat, getTiffFormats(wcs.getFormats()))
+        self.setTabInformation()
+
+
+    def setComboItems(self, combo, items):
+        """
+        Replaces the items of a combo box, the current one is kept if it is still there
+        """
+
+        current = combo.currentText()
+        combo.clear()
+        combo.addItems(items)
+
+        index = combo.findText(current)
+        if index >= 0:
+            combo.setCurrentIndex(index)
+
+
+    def addSummaries(self):
+        """
+        Moves the coverage ids parsed so far into the coverage list,
+        only those intersecting the map view if chosen
+        """
+
+        bbox = self.getViewBoundingBox() if self.dlg.cbInView.isChecked() else None
+
+        batch = []
+        while True:
+            try:
+                summary = self.summaries.get_nowait()
+            except queue.Empty:
+                break
+
+            if bbox is None or summary['bbox'] is None or intersects(summary['bbox'], bbox):
+                batch.append(summary['id'])
+
+        self.coverageList += batch
+        self.dlg.cbCoverage.addItems(batch)
+
+
+    def setCoverageList(self):
+        """
+        Fills the coverage list with all coverages of the WCS or, if chosen,
+        with those whose WGS84BoundingBox intersects the map view.
+        The selected coverage is kept if it is still in the list.
+        """
+
+        if self.wcs == '':
+            return
+
+        coverages = self.wcs.getCoverageIds()
+        if self.dlg.cbInView.isChecked():
+            bbox = self.getViewBoundingBox()
+            if bbox is not None:
+                coverages = self.wcs.getCoverageIdsInExtent(bbox)
+
+        if coverages == self.coverageList:
+            return
+
+        covId = self.dlg.cbCoverage.currentText()
+
+        self.coverageList = list(coverages)
+        self.dlg.cbCoverage.clear()
+        self.dlg.cbCoverage.addItems(self.coverageList)
+
+        index = self.dlg.cbCoverage.findText(covId)
+        if index >= 0:
+            self.dlg.cbCoverage.setCurrentIndex(index)
+
+
+    def filterCoverageList(self):
+        if self.dlg.cbInView.isChecked():
+            self.setCoverageList()
+
+
+    def getViewBoundingBox(self):
+        """
+        :return: extent of the map canvas in WGS84 as [minLon, minLat, maxLon, maxLat], None if it can not be transformed
+        """
+
+        canvas = self.iface.mapCanvas()
+        transform = QgsCoordinateTransform(canvas.mapSettings().destinationCrs(), QgsCoordinateReferenceSystem('EPSG:4326'), QgsProject.instance())
+
+        try:
+            extent = transform.transformBoundingBox(canvas.extent())
+        except QgsCsException:
+            return None
+
+        return [extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()]
 
 
     def cleanTabGetCoverage(self):
@@ -204,12 +684,16 @@ class SimpleWCS:
         self.dlg.lblTitle.clear()
 
         self.dlg.cbCoverage.clear()
+        self.coverageList = []
 
         self.dlg.cbCRS.clear()
 
         self.dlg.cbFormat.clear()
 
+        self.dlg.lwBands.clear()
+
         self.dlg.btnGetCoverage.setEnabled(False)
+        self.dlg.btnQueueCoverage.setEnabled(False)
 
         self.dlg.lblExtent.clear()
 
@@ -217,38 +701,118 @@ class SimpleWCS:
     def setTabGetCoverage(self, version):
         """
         Collects information about the wcs and shows them in GUI
-        - supports only tiff at the moment!
+        - supports only tiff at the moment, the GeoTIFF formats come first
         """
 
         title = self.wcs.getTitle()
         self.dlg.lblTitle.setText(title)
 
         self.dlg.lblVersion.setText(version)
+        self.wcsClient.setVersion(version)
 
-        coverages = self.wcs.getCoverageIds()
-        for coverage in coverages:
-            self.dlg.cbCoverage.addItem(coverage)
+        # already filled while parsing, unless the capabilities came from memory
+        self.setCoverageList()
+        self.setBandList()
 
         crsx = self.wcs.getCRS()
         for crs in crsx:
             self.dlg.cbCRS.addItem(crs)
 
-        formats = self.wcs.getFormats()
+        formats = getTiffFormats(self.wcs.getFormats())
         for format in formats:
-            if 'tiff' in format:
-                self.dlg.cbFormat.addItem(format)
+            self.dlg.cbFormat.addItem(format)
 
-        if any('tiff' in format for format in formats):
+        if formats:
             self.dlg.btnGetCoverage.setEnabled(True)
+            self.dlg.btnQueueCoverage.setEnabled(True)
         else:
             self.dlg.cbFormat.addItem('no tiff available')
             self.dlg.cbFormat.setEnabled(False)
 
+        # without the scaling extension coverages come in native resolution
+        self.dlg.cbScaling.setEnabled(self.wcs.supportsScaling())
+        self.enableScaleValue()
+
         self.setExtentLabel()
 
         self.dlg.tabWidget.setCurrentIndex(1)
 
 
+    def setBandList(self):
+        """
+        Describes the chosen coverage in a QgsTask, its bands
+        are listed once the description has arrived
+        """
+
+        self.dlg.lwBands.clear()
+
+        covId = self.dlg.cbCoverage.currentText()
+        if self.wcs == '' or covId == '':
+            return
+
+        onFinished = functools.partial(descriptionLoaded, self, covId)
+        globals()['desctask'] = QgsTask.fromFunction(u'DescribeCoverage', requestDescription, self.loopThread, self.wcsClient, covId, on_finished=onFinished)
+        QgsApplication.taskManager().addTask(globals()['desctask'])
+
+
+    def setBands(self, covId, coverage):
+        """
+        Lists the range fields of a coverage, all checked.
+        Without the Range Subsetting extension every band is
+        downloaded, the list is shown but can not be changed.
+
+        :param coverage: Coverage or None if the request failed
+        """
+
+        if coverage is None or covId != self.dlg.cbCoverage.currentText():
+            return
+
+        self.dlg.lwBands.clear()
+        for band in coverage.getRange():
+            item = QListWidgetItem(band)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked)
+            self.dlg.lwBands.addItem(item)
+
+        self.dlg.lwBands.setEnabled(self.wcs.supportsRangeSubsetting())
+
+
+    def getBands(self):
+        """
+        :return: names of the checked bands, None if all are checked, empty if none is
+        """
+
+        items = [self.dlg.lwBands.item(i) for i in range(self.dlg.lwBands.count())]
+        bands = [item.text() for item in items if item.checkState() == Qt.Checked]
+
+        return None if len(bands) == len(items) else bands
+
+
+    def enableScaleValue(self):
+        """
+        Ground resolution and scale factor need a value
+        """
+
+        mode = self.dlg.cbScaling.currentIndex()
+        self.dlg.sbScaleValue.setEnabled(self.dlg.cbScaling.isEnabled() and mode in (2, 3))
+
+
+    def enableCogOptions(self):
+        self.dlg.cbCogCompression.setEnabled(self.dlg.cbCog.isChecked())
+        self.dlg.cbCogResampling.setEnabled(self.dlg.cbCog.isChecked())
+
+
+    def getCogOptions(self):
+        """
+        :return: compression and resampling of the COG conversion, None if the files are added as downloaded
+        """
+
+        if not self.dlg.cbCog.isChecked():
+            return None
+
+        return (self.dlg.cbCogCompression.currentText(), self.dlg.cbCogResampling.currentText())
+
+
     def setTabInformation(self):
         provider = self.wcs.getProvider()
         self.dlg.lblProvider.setText(provider)
@@ -288,110 +852,397 @@ class SimpleWCS:
         return coordinates
 
 
-    def describeCoverage(self, covId):
-        params = {"REQUEST": "DescribeCoverage", "SERVICE": "WCS", "VERSION": "2.0.1", "COVERAGEID": covId}
-        querystring = urllib.parse.urlencode(params)
+    def getCovTask(self):
+        """
+        Queues the GetCoverage of the current map extent before
+        all background requests and shows its progress
+        """
 
-        describeCoverageUrl = self.wcs.getDescribeCoverageUrl()
-        url = self.checkUrlSyntax(describeCoverageUrl)
-        xmlResponse = self.requestXML(url + querystring)
+        # requests of the user come before the prefetch
+        self.prefetcher.cancel()
 
-        describeCoverageRoot = xml.etree.ElementTree.parse(xmlResponse).getroot()
-        coverage = Coverage(describeCoverageRoot)
+        job = self.submitCovJob(userPriority)
+        if job is None:
+            return
 
-        return coverage
+        self.popMessageBar(self.barWidget)
+        self.barJob = job
+        self.barWidget = self.getCovProgressBar(job.cancel)
 
 
-    def getCovTask(self):
+    def queueCovTask(self):
         """
-        Create an asynchronous QgsTask and add it to the taskManager.
-        Task variable is declared as 'global' because of a
-        bug in QgsTask or taskManager which prevents the
-        'on_finished' function to be executed correctly
+        Queues the GetCoverage of the current map extent behind the
+        requests of the user, e.g. to collect several coverages
         """
 
-        self.getCovProgressBar()
+        self.submitCovJob(backgroundPriority)
+        self.setQueueList()
 
-        url, covId = self.getCovQueryStr()
-        globals()['gctask'] = QgsTask.fromFunction(u'GetCoverage', getCoverage, url, covId, on_finished=addRLayer)
-        QgsApplication.taskManager().addTask(globals()['gctask'])
-        self.dlg.btnGetCoverage.setEnabled(False)
 
+    def submitCovJob(self, priority):
+        """
+        :return: Job of the scheduler or None
+        """
 
-    def getCovQueryStr(self):
-        version = self.dlg.lblVersion.text()
+        covJob = self.getCovJob()
+        if covJob is None:
+            return None
 
-        covId = self.dlg.cbCoverage.currentText()
-        coverage = self.describeCoverage(covId)
+        download, args, progress, name, onCompleted = covJob
+
+        host = urlparse(self.wcsClient.url).netloc
+        job = self.scheduler.submit(name, host, priority, download, (self.loopThread, self.wcsClient) + args, progress)
+        if onCompleted is not None and priority <= userPriority:
+            self.jobCallbacks[job.id] = onCompleted
+
+        return job
+
+
+    def createCovTask(self, onFinished):
+        """
+        Creates the GetCoverage task for the current map extent in live mode,
+        its requests come before those of the queue, and shows its progress
+        in the message bar
+
+        :param onFinished: global function called with the result of the task
+        :return: (QgsTask, its message bar item) or None
+        """
+
+        self.prefetcher.cancel()
+
+        covJob = self.getCovJob()
+        if covJob is None:
+            return None
+
+        download, args, progress, name, onCompleted = covJob
+
+        task = QgsTask.fromFunction(u'GetCoverage', runWithPriority, visiblePriority, download, self.loopThread, self.wcsClient, *args, on_finished=onFinished)
+        progress.setTask(task)
+
+        bar = self.getCovProgressBar(task.cancel)
+        task.progressChanged.connect(lambda value: self.setProgress(value, progress))
+
+        return task, bar
+
+
+    def getCovJob(self):
+        """
+        Collects the GetCoverage of the current map extent
+
+        :return: (download, args after wcsClient, Progress, layer name, function to call
+            after the download) or None if there is nothing to request
+        """
+
+        workers = self.dlg.sbWorkers.value()
+        cog = self.getCogOptions()
+        onCompleted = None
+
+        if self.getBands() == []:
+            self.logWarnMessage('No band is checked, check at least one band of the coverage')
+            self.openLog()
+            return None
+
+        if self.dlg.cbMosaic.isChecked():
+            params = self.getMosaicParams()
+            if params is None:
+                return None
+
+            progress = Progress(downloads=len(params['windows']))
+            download = getMosaic
+            args = (params, workers, self.cache, progress, cog)
+            name = getMosaicName(params['windows'])
+        else:
+            if self.dlg.cbTiled.isChecked():
+                tiles = self.dlg.sbTiles.value()
+            else:
+                tiles = 1
+
+            params = self.getCovParams()
+
+            progress = Progress(downloads=tiles * tiles)
+            download = getCoverage
+            args = (params, tiles, workers, self.cache, progress, cog)
+            name = params['covId']
+            onCompleted = functools.partial(self.prefetch, self.wcsClient, params, tiles)
+
+        if self.dlg.cbStream.isChecked():
+            options = getStreamingOptions(self.dlg.sbStreamRetries.value(), self.dlg.sbStreamRetryDelay.value(), self.dlg.sbTimeout.value())
+            return (streamCoverage, (download, args, self.cache, options), progress, name, None)
+
+        return (download, args, progress, name, onCompleted)
+
+
+    def updateQueue(self):
+        """
+        Adds the layers of the finished jobs and refreshes the queue tab
+        """
+
+        while True:
+            try:
+                job = self.finishedJobs.get_nowait()
+            except queue.Empty:
+                break
+
+            addRLayer(job.exception, job.result)
+
+            onCompleted = self.jobCallbacks.pop(job.id, None)
+            if onCompleted is not None and job.state == 'finished':
+                onCompleted()
+
+            if job is self.barJob:
+                self.barJob = None
+                self.popMessageBar(self.barWidget)
+                self.barWidget = None
+
+        if self.barJob is not None and self.barJob.state == 'running':
+            self.setProgress(self.barJob.getPercent(), self.barJob.progress)
+
+        if self.dlg.isVisible():
+            self.setQueueList()
+
+
+    def setQueueList(self):
+        """
+        Shows the jobs of the scheduler, the selected job stays selected
+        """
+
+        jobs = self.scheduler.getJobs()
+        lwQueue = self.dlg.lwQueue
+
+        if [lwQueue.item(i).data(Qt.UserRole) for i in range(lwQueue.count())] == [job.id for job in jobs]:
+            for i, job in enumerate(jobs):
+                lwQueue.item(i).setText(job.getDescription())
+            return
+
+        selected = self.getSelectedJobId()
+        lwQueue.clear()
+        for job in jobs:
+            item = QListWidgetItem(job.getDescription())
+            item.setData(Qt.UserRole, job.id)
+            lwQueue.addItem(item)
+            if job.id == selected:
+                lwQueue.setCurrentItem(item)
+
+
+    def getSelectedJobId(self):
+        item = self.dlg.lwQueue.currentItem()
 
-        #range = coverage.getRange()
-        #self.logInfoMessage(str(range))
+        return item.data(Qt.UserRole) if item is not None else None
 
-        labels = coverage.getAxisLabels()
-        label0 = labels[0]
-        label1 = labels[1]
+
+    def cancelJob(self):
+        job = self.scheduler.getJob(self.getSelectedJobId())
+        if job is not None:
+            job.cancel()
+
+
+    def clearJobs(self):
+        self.scheduler.clearDone()
+        self.setQueueList()
+
+
+    def prefetch(self, wcsClient, params, tiles):
+        """
+        Fetches the neighbouring extents and the next zoom level out of the
+        coverage just loaded into the cache, the extents sharing a side first
+        """
+
+        if not self.dlg.cbPrefetch.isChecked():
+            return
+
+        neighbours = getNeighbourExtents(params['coordinates'])
+        extents = neighbours[:4] + [getZoomOutExtent(params['coordinates'])] + neighbours[4:]
+
+        self.prefetcher.start(wcsClient, params['covId'], extents, params['outputCrs'], params['subsettingCrs'], params['format'], tiles, params['scaling'], params['bands'])
+
+
+    def scheduleLiveCoverage(self):
+        """
+        (Re)starts the debounce timer in live mode, so
+        panning only requests the extent the map rests on
+        """
+
+        if self.dlg.cbLive.isChecked() and self.wcs != '':
+            self.liveTimer.start(self.dlg.sbDebounce.value())
+
+
+    def getLiveCoverage(self):
+        """
+        Requests the coverage for the new extent in live mode.
+        Running requests of extents which are no longer visible are canceled,
+        the others finish and fill the cache.
+        """
+
+        if not self.dlg.cbLive.isChecked() or self.wcs == '':
+            return
+
+        extent = self.iface.mapCanvas().extent()
+
+        livetasks = []
+        pending = False
+        for task, taskExtent in globals()['livetasks']:
+            try:
+                if task.status() in (QgsTask.Complete, QgsTask.Terminated):
+                    continue
+                if not taskExtent.intersects(extent):
+                    task.cancel()
+                    continue
+            except RuntimeError:
+                # task was already deleted by the task manager
+                continue
+            livetasks.append((task, taskExtent))
+            if taskExtent == extent:
+                pending = True
+
+        globals()['livetasks'] = livetasks
+
+        # the visible extent is already on the way
+        if pending:
+            return
+
+        globals()['liveGeneration'] += 1
+        generation = globals()['liveGeneration']
+        onFinished = functools.partial(replaceRLayer, generation)
+        created = self.createCovTask(onFinished)
+        if created is None:
+            return
+
+        task, globals()['liveBars'][generation] = created
+        globals()['livetasks'].append((task, extent))
+        QgsApplication.taskManager().addTask(task)
+
+
+    def getCovParams(self):
+        """
+        Collects the GetCoverage parameters of the current map extent,
+        the urls are built in the task after DescribeCoverage
+
+        :return: dict of the arguments of AsyncWcsClient.getCoverage
+        """
+
+        covId = self.dlg.cbCoverage.currentText()
 
         extent = self.iface.mapCanvas().extent().toString()
         coordinates = self.roundExtent(extent)
-        subset0 = label0 + '(' + str(coordinates[0]) + ',' + str(coordinates[2]) + ')'
-        subset1 = label1 + '(' + str(coordinates[1]) + ',' + str(coordinates[3]) + ')'
 
         outputcrs = self.dlg.cbCRS.currentText()
         mapcrs = self.iface.mapCanvas().mapSettings().destinationCrs().authid()
         format = self.dlg.cbFormat.currentText()
 
-        params = [('REQUEST', 'GetCoverage'), ('SERVICE', 'WCS'), ('VERSION', version), ('COVERAGEID', covId), ('OUTPUTCRS', outputcrs), ('SUBSETTINGCRS', mapcrs), ('FORMAT', format), ('SUBSET', subset0), ('SUBSET', subset1)]
+        return {'covId': covId, 'coordinates': coordinates, 'outputCrs': outputcrs, 'subsettingCrs': mapcrs, 'format': format, 'scaling': self.getScaling(), 'bands': self.getBands()}
 
-        querystring = urllib.parse.urlencode(params)
 
-        getCoverageUrl = self.wcs.getGetCoverageUrl()
-        url = self.checkUrlSyntax(getCoverageUrl)
-        url = url + querystring
+    def getMosaicParams(self):
+        """
+        Finds the coverages whose WGS84BoundingBox intersects the map extent.
+        Every coverage is requested for the part of the extent it covers,
+        coverages without bounding box are left out.
 
-        return url, covId
+        :return: dict of the arguments of AsyncWcsClient.getCoverages, None if there is nothing to request
+        """
 
+        bbox = self.getViewBoundingBox()
+        if bbox is None:
+            self.logWarnMessage('Map extent can not be transformed to WGS84')
+            self.openLog()
+            return None
 
-    def getCovProgressBar(self):
-        self.progress = QProgressBar()
-        self.progress.setRange(0, 0)
-        self.progress.setAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+        canvas = self.iface.mapCanvas()
+        extent = canvas.extent()
+        transform = QgsCoordinateTransform(QgsCoordinateReferenceSystem('EPSG:4326'), canvas.mapSettings().destinationCrs(), QgsProject.instance())
+        bboxes = self.wcs.getBoundingBoxes()
 
-        progressMessageBar = self.iface.messageBar().createMessage("GetCoverage Request")
-        progressMessageBar.layout().addWidget(self.progress)
-        globals()['iface'].messageBar().pushWidget(progressMessageBar, Qgis.Info)
+        windows = {}
+        for covId in self.wcs.getCoverageIdsInExtent(bbox):
+            if bboxes.get(covId) is None:
+                continue
 
+            try:
+                window = transform.transformBoundingBox(QgsRectangle(*bboxes[covId])).intersect(extent)
+            except QgsCsException:
+                window = extent
 
-    def requestXML(self, url):
-        self.logInfoMessage('Requested URL: ' + url)
+            if window.isEmpty():
+                continue
 
-        try:
-            xmlReponse = urllib.request.urlopen(url)
-        except HTTPError as e:
-            self.logWarnMessage(str(e))
-            self.logWarnMessage(str(e.read().decode()))
+            windows[covId] = self.roundExtent(window.toString())
+
+        if not windows:
+            self.logWarnMessage('No coverage with a bounding box intersects the map extent')
             self.openLog()
             return None
-        except URLError as e:
-            self.logWarnMessage(str(e))
-            self.logWarnMessage(str(e.read().decode()))
+
+        if len(windows) > maxMosaicCoverages:
+            self.logWarnMessage(str(len(windows)) + ' coverages intersect the map extent, at most ' + str(maxMosaicCoverages) + ' are requested at once. Zoom in.')
             self.openLog()
             return None
 
-        return xmlReponse
+        params = self.getCovParams()
+        del params['covId']
+        params['windows'] = windows
 
+        return params
 
-    def checkUrlSyntax(self, url):
-        if '?' in url:
-            if url.endswith('?'):
-                newUrl = url
-            elif url.endswith('&'):
-                newUrl = url
-            else:
-                newUrl = url + '&'
+
+    def getScaling(self):
+        """
+        Scaling chosen in the dialog, see WcsClient.getCoverageUrls
+        """
+
+        mode = self.dlg.cbScaling.currentIndex()
+
+        if mode == 1:
+            size = self.iface.mapCanvas().mapSettings().outputSize()
+            return ('size', size.width(), size.height())
+        elif mode == 2:
+            return ('resolution', self.dlg.sbScaleValue.value())
+        elif mode == 3:
+            return ('factor', self.dlg.sbScaleValue.value())
+
+        return None
+
+
+    def getCovProgressBar(self, cancel):
+        """
+        Shows progress, received bytes and throughput of a download in the message bar.
+        The bar stays indeterminate until the server sends a Content-Length.
+
+        :param cancel: function called by the cancel button
+        :return: the message bar item, to remove exactly this one later
+        """
+
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 0)
+        self.progress.setAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+
+        self.progressLabel = QLabel()
+
+        cancelButton = QPushButton('Cancel')
+        cancelButton.clicked.connect(cancel)
+
+        progressMessageBar = self.iface.messageBar().createMessage("GetCoverage Request")
+        progressMessageBar.layout().addWidget(self.progress)
+        progressMessageBar.layout().addWidget(self.progressLabel)
+        progressMessageBar.layout().addWidget(cancelButton)
+        globals()['iface'].messageBar().pushWidget(progressMessageBar, Qgis.Info)
+
+        return progressMessageBar
+
+
+    def setProgress(self, value, progress):
+        received = progress.getReceived() / (1024 * 1024)
+        throughput = progress.getThroughput() / (1024 * 1024)
+        expected = progress.getExpected()
+
+        if expected:
+            self.progress.setRange(0, 100)
+            self.progress.setValue(int(value))
+            text = str(round(received, 1)) + ' of ' + str(round(expected / (1024 * 1024), 1)) + ' MB'
         else:
-            newUrl = url + '?'
+            text = str(round(received, 1)) + ' MB'
 
-        return newUrl
+        self.progressLabel.setText(text + ', ' + str(round(throughput, 2)) + ' MB/s')
 
 
     def enableBtnGetCapabilities(self):
@@ -399,11 +1250,6 @@ class SimpleWCS:
             self.dlg.btnGetCapabilities.setEnabled(True)
 
 
-    @classmethod
-    def enableBtnGetCoverage(self):
-        globals()['btnGetCoverage'].setEnabled(True)
-
-
     @classmethod
     def logInfoMessage(self, msg):
         QgsMessageLog.logMessage(msg, logheader, Qgis.Info)
@@ -414,49 +1260,258 @@ class SimpleWCS:
         QgsMessageLog.logMessage(msg, logheader, Qgis.Warning)
 
 
+    @classmethod
+    def logRequestError(self, e):
+        """
+        Logs a failed request, with the exception report of the server if there is one
+        """
+
+        self.logWarnMessage(str(e))
+        if isinstance(e, HTTPError):
+            self.logWarnMessage(str(e.read().decode(errors='replace')))
+
+
+    @classmethod
+    def logMetrics(self):
+        for line in globals()['metrics'].getSummaryLines():
+            self.logInfoMessage(line)
+
+
     @classmethod
     def openLog(self):
         globals()['iface'].mainWindow().findChild(QDockWidget, 'MessageLog').show()
 
 
     @classmethod
-    def cancelMessageBar(self):
-        globals()['iface'].messageBar().clearWidgets()
+    def popMessageBar(self, widget):
+        """
+        Removes one item of the message bar, the bars of other requests stay
+        """
+
+        if widget is None:
+            return
+
+        try:
+            globals()['iface'].messageBar().popWidget(widget)
+        except RuntimeError:
+            # the item was already closed by the user and deleted
+            pass
+
 
+def requestCapabilities(task, loopThread, wcsClient, onSummary):
+    """
+    Requests and parses the capabilities on the event loop
 
-def getCoverage(task, url, covId):
-    SimpleWCS.logInfoMessage('Requested URL: ' + url)
+    :param onSummary: called with every coverage summary while parsing
+    :return: WCS or None
+    """
 
     try:
-        file, header = urllib.request.urlretrieve(url)
-    except HTTPError as e:
-        SimpleWCS.logWarnMessage(str(e))
-        SimpleWCS.logWarnMessage(str(e.read().decode()))
+        return loopThread.wait(wcsClient.getCapabilities(onSummary), task.isCanceled)
+    except (HTTPError, URLError) as e:
+        SimpleWCS.logRequestError(e)
         return None
-    except URLError as e:
-        SimpleWCS.logWarnMessage(str(e))
-        SimpleWCS.logWarnMessage(str(e.read().decode()))
+
+
+def capabilitiesLoaded(plugin, version, exception, values=None):
+    """
+    Works only with QgsTask if this function is global...
+    """
+
+    plugin.setCapabilities(version, exception, values)
+
+
+def capabilitiesRefreshed(plugin, wcsClient, version, exception, values=None):
+    """
+    Works only with QgsTask if this function is global...
+    """
+
+    plugin.updateCapabilities(wcsClient, version, values)
+
+
+def requestDescription(task, loopThread, wcsClient, covId):
+    """
+    Requests the description of a coverage on the event loop
+
+    :return: Coverage or None
+    """
+
+    try:
+        return loopThread.wait(wcsClient.describeCoverage(covId), task.isCanceled)
+    except (HTTPError, URLError) as e:
+        SimpleWCS.logRequestError(e)
         return None
 
-    return {'file': file, 'coverage': covId}
+
+def descriptionLoaded(plugin, covId, exception, values=None):
+    """
+    Works only with QgsTask if this function is global...
+    """
+
+    plugin.setBands(covId, values)
+
+
+def getCoverage(task, loopThread, wcsClient, params, tiles, workers, cache, progress, cog=None):
+    """
+    Describes the coverage and downloads the extent on the event loop,
+    the tiles of a tiled download at the same time, mosaicked as VRT
+    :param params: dict from SimpleWCS.getCovParams
+    :param tiles: number of tiles per side, 1 requests the whole extent
+    :param workers: max number of parallel downloads
+    :param cache: TileCache for tiles and vrt
+    :param progress: Progress shared by all tiles
+    :param cog: compression and resampling to convert the file to COG, None to keep it as downloaded
+    """
+
+    try:
+        file = loopThread.wait(wcsClient.getCoverage(params['covId'], params['coordinates'], params['outputCrs'], params['subsettingCrs'], params['format'], cache, progress, tiles, params['scaling'], workers, params['bands']), task.isCanceled)
+    except (HTTPError, URLError) as e:
+        SimpleWCS.logRequestError(e)
+        return None
+
+    if file is None:
+        return None
+
+    if cog is not None:
+        file = getCachedCog(file, cache, cog[0], cog[1], globals()['metrics'], wcsClient.url, task.isCanceled)
+
+    return {'file': file, 'coverage': params['covId'], 'url': wcsClient.url}
+
+
+def getMosaic(task, loopThread, wcsClient, params, workers, cache, progress, cog=None):
+    """
+    Describes all coverages of the mosaic in one batch and downloads
+    them at the same time on the event loop, mosaicked as VRT
+    :param params: dict from SimpleWCS.getMosaicParams
+    :param workers: max number of parallel downloads
+    :param cache: TileCache for the coverages and the vrt
+    :param progress: Progress shared by all coverages
+    :param cog: compression and resampling to convert the mosaic to COG, None to keep the VRT
+    """
+
+    windows = params['windows']
+
+    try:
+        file = loopThread.wait(wcsClient.getCoverages(windows, params['coordinates'], params['outputCrs'], params['subsettingCrs'], params['format'], cache, progress, params['scaling'], workers, params['bands']), task.isCanceled)
+    except (HTTPError, URLError) as e:
+        SimpleWCS.logRequestError(e)
+        return None
+
+    if file is None:
+        return None
+
+    if cog is not None:
+        file = getCachedCog(file, cache, cog[0], cog[1], globals()['metrics'], wcsClient.url, task.isCanceled)
+
+    return {'file': file, 'coverage': getMosaicName(windows), 'url': wcsClient.url}
+
+
+def getMosaicName(windows):
+    """
+    Layer name of a mosaic, the coverage id if there is only one
+    """
+
+    return next(iter(windows)) if len(windows) == 1 else 'Mosaic of ' + str(len(windows)) + ' coverages'
+
+
+def streamCoverage(task, loopThread, wcsClient, download, args, cache, options):
+    """
+    Builds the GetCoverage urls without downloading them, the layer reads
+    them through GDAL's /vsicurl/ with range requests. Several coverages
+    of a mosaic are put together in a VRT of the streamed urls, kept in
+    the tile cache.
+    Falls back to the download if the server ignores range requests.
+    :param download: getCoverage or getMosaic
+    :param args: arguments of download after wcsClient, the first is the dict of the parameters
+    :param cache: TileCache
+    :param options: /vsicurl? options from getStreamingOptions
+    """
+
+    params = args[0]
+
+    try:
+        if 'windows' in params:
+            urls = loopThread.wait(wcsClient.getMosaicUrls(params['windows'], params['coordinates'], params['outputCrs'], params['subsettingCrs'], params['format'], params['scaling'], params['bands']), task.isCanceled)
+        else:
+            urls = loopThread.wait(wcsClient.getCoverageUrls(params['covId'], params['coordinates'], params['outputCrs'], params['subsettingCrs'], params['format'], 1, params['scaling'], params['bands']), task.isCanceled)
+
+        ranges = loopThread.wait(supportsRanges(wcsClient.httpClient, urls[0]), task.isCanceled)
+    except (HTTPError, URLError) as e:
+        SimpleWCS.logRequestError(e)
+        return None
+
+    if not ranges:
+        SimpleWCS.logInfoMessage('Server does not answer range requests, the coverage is downloaded')
+        return download(task, loopThread, wcsClient, *args)
+
+    paths = [getVsiCurlPath(url, options) for url in urls]
+    if len(paths) == 1:
+        file = paths[0]
+    else:
+        # the options are part of the paths, so they are part of the key as well
+        key = cache.getDerivedKey(cache.getMosaicKey([cache.getKey(url) for url in urls]), 'vsicurl', *paths)
+        file = buildCachedVrt(paths, cache, key)
+        if file is None:
+            return None
+
+    name = params['covId'] if 'covId' in params else getMosaicName(params['windows'])
+
+    return {'file': file, 'coverage': name, 'url': wcsClient.url}
 
 
 def addRLayer(exception, values=None):
     """
-    Add the response layer to MapCanvas
-    Works only with QgsTask if this function is global...
-    :param exception: useless
+    Add the response layer to MapCanvas, called with the result of a finished job
+    :param exception: DownloadCanceled if the user canceled the job
     :param values: filepath and coverage as string, set to None by default
     :return:
     """
 
-    if values != None:
-        rlayer = QgsRasterLayer(values['file'], values['coverage'], 'gdal')
-        QgsProject.instance().addMapLayer(rlayer)
+    if isinstance(exception, DownloadCanceled):
+        SimpleWCS.logInfoMessage('GetCoverage canceled')
+    elif values != None:
+        measurement = globals()['metrics'].begin('LoadLayer', values['url'], values['coverage'])
+        with measurement.phase('load'):
+            rlayer = QgsRasterLayer(values['file'], values['coverage'], 'gdal')
+            QgsProject.instance().addMapLayer(rlayer)
+        measurement.finish(None if rlayer.isValid() else 'invalid layer')
+        SimpleWCS.logMetrics()
     else:
         SimpleWCS.openLog()
         SimpleWCS.logWarnMessage('Error while loading Coverage!')
 
-    SimpleWCS.enableBtnGetCoverage()
-    SimpleWCS.cancelMessageBar()
 
+def replaceRLayer(generation, exception, values=None):
+    """
+    Live mode: replaces the data source of the live layer in place instead of
+    adding a new layer. Results older than the shown one are dropped.
+    :param generation: number of the live request, newer requests have higher numbers
+    :param exception: DownloadCanceled if the request became stale
+    :param values: filepath and coverage as string, set to None by default
+    """
+
+    # only the bar of this request is removed, newer requests may still be running
+    SimpleWCS.popMessageBar(globals()['liveBars'].pop(generation, None))
+
+    if isinstance(exception, DownloadCanceled):
+        return
+
+    if values == None:
+        SimpleWCS.logWarnMessage('Error while loading Coverage!')
+        return
+
+    if generation < globals()['liveShownGeneration']:
+        return
+    globals()['liveShownGeneration'] = generation
+
+    measurement = globals()['metrics'].begin('LoadLayer', values['url'], values['coverage'])
+    with measurement.phase('load'):
+        rlayer = QgsProject.instance().mapLayer(globals().get('liveLayerId', ''))
+        if rlayer is not None:
+            rlayer.setDataSource(values['file'], values['coverage'], 'gdal', QgsDataProvider.ProviderOptions())
+            rlayer.triggerRepaint()
+        else:
+            rlayer = QgsRasterLayer(values['file'], values['coverage'], 'gdal')
+            QgsProject.instance().addMapLayer(rlayer)
+            globals()['liveLayerId'] = rlayer.id()
+    measurement.finish()
@@ -0,0 +1,106 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import math
+
+
+class SpatialIndex:
+    """
+    Packed R-tree of bounding boxes, built once with Sort-Tile-Recursive.
+    The leaves are ordered in vertical slices, every node covers
+    nodeSize consecutive entries of the level below.
+    """
+
+
+    def __init__(self, items, nodeSize=16):
+        """
+        :param items: iterable of ([xmin, ymin, xmax, ymax], value)
+        :param nodeSize: max number of children of a node
+        """
+
+        self.nodeSize = nodeSize
+
+        items = sortTileRecursive(list(items), nodeSize)
+        self.values = [value for bbox, value in items]
+
+        # levels[0] are the boxes of the items, levels[-1] the boxes of the root's children
+        self.levels = [[tuple(bbox) for bbox, value in items]]
+        while len(self.levels[-1]) > nodeSize:
+            level = self.levels[-1]
+            self.levels.append([getUnion(level[i:i + nodeSize]) for i in range(0, len(level), nodeSize)])
+
+
+    def query(self, bbox):
+        """
+        :param bbox: [xmin, ymin, xmax, ymax]
+        :return: list of the values whose boxes intersect bbox, in index order
+        """
+
+        nodeSize = self.nodeSize
+        top = len(self.levels) - 1
+
+        result = []
+        stack = [(top, i) for i in reversed(range(len(self.levels[top])))]
+
+        while stack:
+            levelIndex, i = stack.pop()
+            if not intersects(self.levels[levelIndex][i], bbox):
+                continue
+
+            if levelIndex == 0:
+                result.append(self.values[i])
+            else:
+                end = min((i + 1) * nodeSize, len(self.levels[levelIndex - 1]))
+                stack.extend((levelIndex - 1, child) for child in reversed(range(i * nodeSize, end)))
+
+        return result
+
+
+    def __len__(self):
+        return len(self.values)
+
+
+def sortTileRecursive(items, nodeSize):
+    """
+    Orders the items in vertical slices by x and by y within every slice,
+    so runs of nodeSize items form compact leaves
+
+    :param items: list of (bbox, value)
+    """
+
+    leaves = math.ceil(len(items) / nodeSize)
+    slices = max(math.ceil(math.sqrt(leaves)), 1)
+    sliceSize = slices * nodeSize
+
+    items.sort(key=lambda item: item[0][0] + item[0][2])
+
+    ordered = []
+    for start in range(0, len(items), sliceSize):
+        ordered += sorted(items[start:start + sliceSize], key=lambda item: item[0][1] + item[0][3])
+
+    return ordered
+
+
+def getUnion(boxes):
+    return (
+        min(box[0] for box in boxes),
+        min(box[1] for box in boxes),
+        max(box[2] for box in boxes),
+        max(box[3] for box in boxes)
+    )
+
+
+def intersects(a, b):
+    """
+    True if the boxes [xmin, ymin, xmax, ymax] overlap or touch
+    """
+
+    return a[0] <= b[2] and a[2] >= b[0] and a[1] <= b[3] and a[3] >= b[1]
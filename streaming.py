@@ -0,0 +1,51 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import urllib.parse
+
+from .httpclient import userAgent
+
+
+def getVsiCurlPath(url, options=None):
+    """
+    GDAL path which reads a GetCoverage response with HTTP range requests
+    instead of downloading it. The url is passed as option, so its query
+    string is kept as it is and GDAL does not list the 'directory'.
+
+    :param options: dict of /vsicurl? options from getStreamingOptions, the defaults if None
+    """
+
+    options = getStreamingOptions() if options is None else options
+
+    return '/vsicurl?' + urllib.parse.urlencode(options, quote_via=urllib.parse.quote) + '&url=' + urllib.parse.quote(url, safe='')
+
+
+def getStreamingOptions(retries=3, retryDelay=1, timeout=60):
+    """
+    Options of a /vsicurl? path. They only apply to the layer reading
+    that path, the GDAL configuration of QGIS stays as it is.
+
+    :param retries: retries of a failed range request
+    :param retryDelay: seconds before the first retry
+    :param timeout: a range request is aborted when no byte arrived for so many seconds
+    :return: dict of option and value
+    """
+
+    return {
+        # WCS answer GET only, a HEAD request could generate the coverage twice
+        'use_head': 'no',
+        'list_dir': 'no',
+        'max_retry': str(retries),
+        'retry_delay': str(retryDelay),
+        'low_speed_time': str(timeout),
+        'low_speed_limit': '1',
+        'useragent': userAgent
+    }
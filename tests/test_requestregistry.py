@@ -0,0 +1,139 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import asyncio, unittest
+
+from ..asyncclient import RequestRegistry
+from ..download import Progress
+
+
+class Transfer:
+    """
+    Stand-in for a download, runs until it is let go
+    """
+
+
+    def __init__(self, result=b'coverage'):
+        self.result = result
+        self.started = 0
+        self.canceled = False
+        self.done = None
+
+
+    async def run(self, progress):
+        self.started += 1
+        progress.begin('url', 100)
+        progress.update('url', 40)
+
+        try:
+            await self.done.wait()
+        except asyncio.CancelledError:
+            self.canceled = True
+            raise
+
+        progress.update('url', 60)
+        progress.finish('url')
+
+        return self.result
+
+
+class RequestRegistryTest(unittest.TestCase):
+
+
+    def testIdenticalRequestsShareOneTransfer(self):
+        async def main():
+            registry = RequestRegistry()
+            transfer = Transfer()
+            transfer.done = asyncio.Event()
+
+            first = asyncio.ensure_future(registry.run('key', transfer.run))
+            second = asyncio.ensure_future(registry.run('key', transfer.run))
+            await asyncio.sleep(0)
+            self.assertTrue(registry.isRunning('key'))
+
+            transfer.done.set()
+            results = await asyncio.gather(first, second)
+
+            self.assertEqual(results, [b'coverage', b'coverage'])
+            self.assertEqual(transfer.started, 1)
+            self.assertFalse(registry.isRunning('key'))
+
+        asyncio.run(main())
+
+
+    def testTransferIsCanceledAfterTheLastWaiter(self):
+        async def main():
+            registry = RequestRegistry()
+            transfer = Transfer()
+            transfer.done = asyncio.Event()
+
+            first = asyncio.ensure_future(registry.run('key', transfer.run))
+            second = asyncio.ensure_future(registry.run('key', transfer.run))
+            await asyncio.sleep(0)
+
+            first.cancel()
+            await asyncio.sleep(0)
+            self.assertFalse(transfer.canceled)
+            self.assertTrue(registry.isRunning('key'))
+
+            second.cancel()
+            await asyncio.gather(first, second, return_exceptions=True)
+            await asyncio.sleep(0)
+            self.assertTrue(transfer.canceled)
+            self.assertFalse(registry.isRunning('key'))
+
+        asyncio.run(main())
+
+
+    def testLateCallerGetsTheBytesReceivedSoFar(self):
+        async def main():
+            registry = RequestRegistry()
+            transfer = Transfer()
+            transfer.done = asyncio.Event()
+
+            first = asyncio.ensure_future(registry.run('key', transfer.run, Progress()))
+            await asyncio.sleep(0)
+
+            progress = Progress()
+            second = asyncio.ensure_future(registry.run('key', transfer.run, progress))
+            await asyncio.sleep(0)
+            self.assertEqual(progress.getReceived(), 40)
+            self.assertEqual(progress.getExpected(), 100)
+
+            transfer.done.set()
+            await asyncio.gather(first, second)
+            self.assertEqual(progress.getReceived(), 100)
+            self.assertEqual(progress.getPercent(), 100)
+
+        asyncio.run(main())
+
+
+    def testErrorReachesEveryCaller(self):
+        async def main():
+            registry = RequestRegistry()
+            started = []
+
+            async def fail(progress):
+                started.append(progress)
+                await asyncio.sleep(0)
+                raise OSError('refused')
+
+            results = await asyncio.gather(registry.run('key', fail), registry.run('key', fail), return_exceptions=True)
+
+            self.assertEqual(len(started), 1)
+            self.assertTrue(all(isinstance(result, OSError) for result in results))
+            self.assertFalse(registry.isRunning('key'))
+
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
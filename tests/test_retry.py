@@ -0,0 +1,99 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import asyncio, email.message, email.utils, time, unittest
+from unittest import mock
+from urllib.error import HTTPError, URLError
+
+from ..retry import RetryPolicy
+
+
+def newHttpError(code, retryAfter=None):
+    headers = email.message.Message()
+    if retryAfter is not None:
+        headers['Retry-After'] = retryAfter
+
+    return HTTPError('http://localhost/wcs', code, 'error', headers, None)
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+
+    def testDelaysStayWithinTheDoublingBound(self):
+        policy = RetryPolicy(attempts=8, baseDelay=0.5, maxDelay=4)
+
+        for attempt in range(8):
+            bound = min(4, 0.5 * 2 ** attempt)
+            delays = [policy.getDelay(attempt) for i in range(200)]
+            self.assertTrue(all(0 <= delay <= bound for delay in delays))
+            # full jitter, not a fixed delay
+            self.assertGreater(max(delays) - min(delays), bound / 4)
+
+
+    def testDelayIsDrawnFromZeroToTheBound(self):
+        policy = RetryPolicy(baseDelay=0.5, maxDelay=30)
+
+        with mock.patch('random.uniform', side_effect=lambda low, high: (low, high)):
+            self.assertEqual(policy.getDelay(0), (0, 0.5))
+            self.assertEqual(policy.getDelay(3), (0, 4))
+            self.assertEqual(policy.getDelay(10), (0, 30))
+
+
+    def testRetryAfterIsFollowed(self):
+        policy = RetryPolicy(maxDelay=30)
+
+        self.assertEqual(policy.getDelay(0, newHttpError(503, '7')), 7)
+        self.assertEqual(policy.getDelay(0, newHttpError(503, '120')), 30)
+
+        date = email.utils.formatdate(time.time() + 10, usegmt=True)
+        self.assertAlmostEqual(policy.getDelay(0, newHttpError(429, date)), 10, delta=2)
+
+        # an unreadable Retry-After falls back to the backoff
+        self.assertLessEqual(policy.getDelay(0, newHttpError(503, 'soon')), policy.baseDelay)
+
+
+    def testOnlyTransientErrorsAreRetried(self):
+        policy = RetryPolicy(attempts=3)
+
+        self.assertTrue(policy.shouldRetry(0, newHttpError(503)))
+        self.assertTrue(policy.shouldRetry(0, URLError(ConnectionRefusedError())))
+        self.assertFalse(policy.shouldRetry(0, newHttpError(404)))
+        self.assertFalse(policy.shouldRetry(0, URLError('unsupported scheme: ftp')))
+        self.assertFalse(policy.shouldRetry(2, newHttpError(503)))
+
+
+    def testCallRetriesUntilSuccess(self):
+        policy = RetryPolicy(attempts=3, baseDelay=0)
+        errors = [newHttpError(502), URLError(TimeoutError())]
+
+        def function():
+            if errors:
+                raise errors.pop(0)
+            return 'capabilities'
+
+        self.assertEqual(policy.call(function), 'capabilities')
+
+
+    def testRunGivesUpAfterTheLastAttempt(self):
+        policy = RetryPolicy(attempts=2, baseDelay=0)
+        calls = []
+
+        async def fail():
+            calls.append(1)
+            raise newHttpError(503)
+
+        with self.assertRaises(HTTPError):
+            asyncio.run(policy.run(fail))
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import asyncio, threading, time, unittest
+
+from ..asyncclient import EventLoopThread
+from ..download import DownloadCanceled, Progress
+from ..scheduler import PriorityLimit, Scheduler, backgroundPriority, userPriority, visiblePriority
+
+
+async def holdLimit(limit, priority, name, admitted, done):
+    await limit.acquire(priority)
+    admitted.append(name)
+    try:
+        await done.wait()
+    finally:
+        limit.release()
+
+
+class PriorityLimitTest(unittest.TestCase):
+
+
+    def testWaitingCoroutinesAreLetInByPriority(self):
+        async def main():
+            limit = PriorityLimit(1)
+            admitted = []
+            done = asyncio.Event()
+
+            await limit.acquire()
+            tasks = [
+                asyncio.ensure_future(holdLimit(limit, backgroundPriority, 'background', admitted, done)),
+                asyncio.ensure_future(holdLimit(limit, userPriority, 'user', admitted, done)),
+                asyncio.ensure_future(holdLimit(limit, visiblePriority, 'visible', admitted, done)),
+                asyncio.ensure_future(holdLimit(limit, visiblePriority, 'visible later', admitted, done))
+            ]
+            await asyncio.sleep(0)
+            self.assertEqual(limit.getWaiting(), 4)
+
+            done.set()
+            limit.release()
+            await asyncio.gather(*tasks)
+
+            self.assertEqual(admitted, ['visible', 'visible later', 'user', 'background'])
+            self.assertEqual(limit.active, 0)
+
+        asyncio.run(main())
+
+
+    def testCanceledWaitersAreSkipped(self):
+        async def main():
+            limit = PriorityLimit(1)
+            admitted = []
+            done = asyncio.Event()
+
+            await limit.acquire()
+            canceled = asyncio.ensure_future(holdLimit(limit, visiblePriority, 'canceled', admitted, done))
+            waiting = asyncio.ensure_future(holdLimit(limit, backgroundPriority, 'waiting', admitted, done))
+            await asyncio.sleep(0)
+
+            canceled.cancel()
+            await asyncio.sleep(0)
+            self.assertEqual(limit.getWaiting(), 1)
+
+            limit.release()
+            await asyncio.sleep(0)
+            self.assertEqual(admitted, ['waiting'])
+            self.assertEqual(limit.active, 1)
+
+            done.set()
+            await waiting
+            self.assertEqual(limit.active, 0)
+
+        asyncio.run(main())
+
+
+    def testSetSizeLetsWaitersIn(self):
+        async def main():
+            limit = PriorityLimit(1)
+            admitted = []
+            done = asyncio.Event()
+
+            tasks = [asyncio.ensure_future(holdLimit(limit, userPriority, i, admitted, done)) for i in range(4)]
+            await asyncio.sleep(0)
+            self.assertEqual(admitted, [0])
+
+            limit.setSize(3)
+            await asyncio.sleep(0)
+            self.assertEqual(admitted, [0, 1, 2])
+            self.assertEqual(limit.active, 3)
+
+            # a smaller limit lets nobody in until enough holders left
+            limit.setSize(1)
+            self.assertEqual(limit.active, 3)
+
+            done.set()
+            await asyncio.gather(*tasks)
+            self.assertEqual(admitted, [0, 1, 2, 3])
+            self.assertEqual(limit.active, 0)
+
+        asyncio.run(main())
+
+
+class SchedulerTest(unittest.TestCase):
+
+
+    def setUp(self):
+        self.loopThread = EventLoopThread()
+
+
+    def tearDown(self):
+        self.loopThread.stop()
+
+
+    def testJobCanceledWhileQueuedEndsWithDownloadCanceled(self):
+        release = threading.Event()
+        finished = threading.Event()
+        scheduler = Scheduler(self.loopThread, 1, lambda job: finished.set() if job.name == 'queued' else None)
+
+        running = scheduler.submit('running', 'host', userPriority, lambda task: release.wait(10), (), Progress())
+        queued = scheduler.submit('queued', 'host', userPriority, lambda task: 'file', (), Progress())
+
+        # canceled once it waits for a slot
+        for i in range(1000):
+            if scheduler.slots.getWaiting():
+                break
+            time.sleep(0.01)
+
+        queued.cancel()
+        self.assertTrue(finished.wait(10))
+        self.assertEqual(queued.state, 'canceled')
+        self.assertIsInstance(queued.exception, DownloadCanceled)
+
+        release.set()
+        running.future.result(10)
+        self.assertEqual(running.state, 'finished')
+        scheduler.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
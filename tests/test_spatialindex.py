@@ -0,0 +1,56 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import random, unittest
+
+from ..spatialindex import SpatialIndex, intersects
+
+
+def newBox(generator, size):
+    x = generator.uniform(-180, 180)
+    y = generator.uniform(-90, 90)
+
+    return [x, y, x + generator.uniform(0, size), y + generator.uniform(0, size)]
+
+
+class SpatialIndexTest(unittest.TestCase):
+
+
+    def testQueryMatchesBruteForce(self):
+        generator = random.Random(15)
+
+        for count, nodeSize in [(0, 16), (1, 16), (15, 4), (17, 16), (1000, 16), (5000, 9)]:
+            items = [(newBox(generator, 20), i) for i in range(count)]
+            index = SpatialIndex(items, nodeSize)
+            self.assertEqual(len(index), count)
+
+            for i in range(100):
+                bbox = newBox(generator, 60)
+                expected = sorted(value for box, value in items if intersects(box, bbox))
+                self.assertEqual(sorted(index.query(bbox)), expected)
+
+
+    def testTouchingBoxesIntersect(self):
+        index = SpatialIndex([([0, 0, 10, 10], 'a'), ([20, 0, 30, 10], 'b')])
+
+        self.assertEqual(index.query([10, 10, 20, 20]), ['a', 'b'])
+        self.assertEqual(index.query([11, 0, 19, 10]), [])
+
+
+    def testPointBoxesAreFound(self):
+        items = [([x, y, x, y], (x, y)) for x in range(50) for y in range(50)]
+        index = SpatialIndex(items)
+
+        self.assertEqual(sorted(index.query([9.5, 19.5, 11.5, 21.5])), [(10, 20), (10, 21), (11, 20), (11, 21)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import asyncio, unittest
+
+from ..asyncclient import AsyncHttpClient, supportsRanges
+from ..benchmark.server import StandInServer
+
+
+class SupportsRangesTest(unittest.TestCase):
+    """
+    The Range probe decides whether a coverage is streamed or downloaded
+    """
+
+
+    def setUp(self):
+        self.server = StandInServer(coverages=2, payloadSize=64 * 1024).start()
+        self.url = self.server.getUrl()
+
+
+    def tearDown(self):
+        self.server.stop()
+
+
+    def probe(self, url):
+        async def main():
+            httpClient = AsyncHttpClient()
+            try:
+                ranges = await supportsRanges(httpClient, url)
+
+                # the connection stays usable after the probe
+                response = await httpClient.request(url)
+                body = await response.read()
+            finally:
+                await httpClient.close()
+
+            return ranges, body
+
+        return asyncio.run(main())
+
+
+    def testServerAnsweringPartialContent(self):
+        ranges, body = self.probe(self.url + '?SERVICE=WCS&VERSION=2.0.1&REQUEST=GetCoverage&COVERAGEID=coverage1')
+
+        self.assertTrue(ranges)
+        self.assertEqual(len(body), len(self.server.getPayload()))
+
+
+    def testServerIgnoringRange(self):
+        ranges, body = self.probe(self.url + '?SERVICE=WCS&VERSION=2.0.1&REQUEST=GetCapabilities')
+
+        self.assertFalse(ranges)
+        self.assertIn(b'Capabilities', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+        Simple WCS 2 - QGIS Plugin
+        Basic support for OGC WCS 2.X
+
+        created by Landesvermessung und Geobasisinformation Brandenburg
+        email: marcus.mohr@geobasis-bb.de
+        licence: GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+
+        Functions are written in mixedCase, see https://docs.qgis.org/testing/en/docs/developers_guide/codingstandards.html
+"""
+
+import math, os.path, tempfile
+
+
+def splitExtent(coordinates, rows, cols):
+    """
+    Splits an extent into a grid of rows x cols windows.
+    Neighbouring windows share their edges, so the mosaic has no gaps.
+
+    :param coordinates: [xmin, ymin, xmax, ymax]
+    :param rows: number of windows in y direction
+    :param cols: number of windows in x direction
+    :return: list of windows as [xmin, ymin, xmax, ymax]
+    """
+
+    xmin, ymin, xmax, ymax = coordinates
+
+    xs = [round(xmin + (xmax - xmin) * i / cols, 7) for i in range(cols)] + [xmax]
+    ys = [round(ymin + (ymax - ymin) * j / rows, 7) for j in range(rows)] + [ymax]
+
+    windows = []
+    for j in range(rows):
+        for i in range(cols):
+            windows.append([xs[i], ys[j], xs[i + 1], ys[j + 1]])
+
+    return windows
+
+
+def gridExtent(coordinates, size):
+    """
+    Covers an extent with square cells, the last row and column are clipped
+
+    :param coordinates: [xmin, ymin, xmax, ymax]
+    :param size: edge length of a cell in map units
+    :return: list of cells as [xmin, ymin, xmax, ymax]
+    """
+
+    xmin, ymin, xmax, ymax = coordinates
+
+    cells = []
+    for j in range(math.ceil((ymax - ymin) / size)):
+        for i in range(math.ceil((xmax - xmin) / size)):
+            x = xmin + i * size
+            y = ymin + j * size
+            cells.append([round(x, 7), round(y, 7), round(min(x + size, xmax), 7), round(min(y + size, ymax), 7)])
+
+    return cells
+
+
+def getNeighbourExtents(coordinates):
+    """
+    The eight extents of the same size around an extent,
+    the ones sharing a side first, then the diagonals
+
+    :param coordinates: [xmin, ymin, xmax, ymax]
+    """
+
+    xmin, ymin, xmax, ymax = coordinates
+    width = xmax - xmin
+    height = ymax - ymin
+
+    offsets = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)]
+
+    return [
+        [round(xmin + dx * width, 7), round(ymin + dy * height, 7), round(xmax + dx * width, 7), round(ymax + dy * height, 7)]
+        for dx, dy in offsets
+    ]
+
+
+def getZoomOutExtent(coordinates, factor=2):
+    """
+    Extent with the same center, factor times as wide and high
+    """
+
+    xmin, ymin, xmax, ymax = coordinates
+    dx = (xmax - xmin) * (factor - 1) / 2
+    dy = (ymax - ymin) * (factor - 1) / 2
+
+    return [round(xmin - dx, 7), round(ymin - dy, 7), round(xmax + dx, 7), round(ymax + dy, 7)]
+
+
+def buildVrt(files, path=None):
+    """
+    Puts the downloaded tiles together as one GDAL VRT
+
+    :param files: list of raster files
+    :param path: path of the vrt, a temporary file is used by default
+    :return: path of the vrt or None if GDAL failed
+    """
+
+    # GDAL is only needed for mosaics, the command line works without
+    from osgeo import gdal
+
+    if path is None:
+        handle, path = tempfile.mkstemp(suffix='.vrt')
+        os.close(handle)
+
+    vrt = gdal.BuildVRT(path, files)
+    if vrt is None:
+        return None
+
+    # dereferencing the dataset writes the vrt to disk
+    vrt = None
+
+    return path
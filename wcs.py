@@ -11,59 +11,63 @@
 
 import os.path, urllib, xml.etree.ElementTree
 
-class WCS:
-
-
-    def __init__(self, capabilities):
-        ows = '{http://www.opengis.net/ows/2.0}'
-        wcs = '{http://www.opengis.net/wcs/2.0}'
-        crs = '{http://www.opengis.net/wcs/crs/1.0}'
-        crs_nonstandard = '{http://www.opengis.net/wcs/service-extension/crs/1.0}'
-        xlink = '{http://www.w3.org/1999/xlink}'
-
-        self.capabilities = capabilities
-
-        self.describeCoverageUrl = self.capabilities.find(ows + 'OperationsMetadata/' + ows + 'Operation[@name="DescribeCoverage"]/' + ows + 'DCP/' + ows + 'HTTP/' + ows + 'Get').attrib[xlink + 'href']
+from .spatialindex import SpatialIndex
 
-        self.getCoverageUrl = self.capabilities.find(ows + 'OperationsMetadata/' + ows + 'Operation[@name="GetCoverage"]/' + ows + 'DCP/' + ows + 'HTTP/' + ows + 'Get').attrib[xlink + 'href']
+class WCS:
 
-        self.title = self.capabilities.find(ows + 'ServiceIdentification/' + ows + 'Title')
 
-        self.provider = self.capabilities.find(ows + 'ServiceProvider/' + ows + 'ProviderName')
+    def __init__(self, capabilities=None):
+        """
+        :param capabilities: file or file-like object of a GetCapabilities response
+        """
 
-        self.fees = self.capabilities.find(ows + 'ServiceIdentification/' + ows + 'Fees')
+        self.describeCoverageUrl = None
+        self.getCoverageUrl = None
+        self.title = ''
+        self.provider = ''
+        self.fees = ''
+        self.constraints = ''
+        self.versions = []
+        self.profiles = []
+        self.crsx = []
+        self.formats = []
+        self.geotiffParameters = {}
+        self.covIds = []
+        self.bboxes = {}
+        self.coverageIndex = None
+        self.unindexed = []
 
-        self.constraints = self.capabilities.find(ows + 'ServiceIdentification/' + ows + 'AccessConstraints')
+        if capabilities is not None:
+            for summary in self.parse(capabilities):
+                pass
 
-        self.versions = []
-        contents = self.capabilities.find(ows + 'ServiceIdentification')
-        for version in contents.findall('.//' + ows + 'ServiceTypeVersion'):
-            self.versions.append(version.text)
 
-        self.crsx = []
-        contents = self.capabilities.find(wcs + 'ServiceMetadata')
-        for crs in contents.findall('.//' + wcs + 'Extension/' + crs + 'CrsMetadata/' + crs + 'crsSupported'):
-            self.crsx.append(crs.text)
+    def parse(self, capabilities):
+        """
+        Reads a GetCapabilities response in a single pass.
+        Elements are dropped as soon as they are processed, so even catalogs
+        with tens of thousands of coverages need little memory.
+        Yields a dict for every CoverageSummary as soon as it arrives.
 
-        # in case of wrong crs extension implementation
-        if not self.crsx:
-            contents = self.capabilities.find(wcs + 'ServiceMetadata')
-            for crs in contents.findall('.//' + wcs + 'Extension/' + crs_nonstandard + 'crsSupported'):
-                self.crsx.append(crs.text)
+        :param capabilities: file or file-like object
+        """
 
-        self.formats = []
-        contents = self.capabilities.find(wcs + 'ServiceMetadata')
-        for format in contents.findall('.//' + wcs + 'formatSupported'):
-            self.formats.append(format.text)
+        if isinstance(capabilities, str):
+            with open(capabilities, 'rb') as f:
+                yield from self.parse(f)
+            return
 
-        self.covIds = []
-        contents = self.capabilities.find(wcs + 'Contents')
-        for coverage in contents.findall('.//' + wcs + 'CoverageSummary/' + wcs + 'CoverageId'):
-            self.covIds.append(coverage.text)
+        reader = CapabilitiesReader(self)
+        while True:
+            data = capabilities.read(64 * 1024)
+            if not data:
+                break
+            yield from reader.feed(data)
+        reader.close()
 
 
     def getTitle(self):
-        return self.title.text
+        return self.title
 
 
     def setTitle(self, title):
@@ -71,7 +75,7 @@ class WCS:
 
 
     def getProvider(self):
-        return self.provider.text
+        return self.provider
 
 
     def setProvider(self, provider):
@@ -79,7 +83,7 @@ class WCS:
 
 
     def getFees(self):
-        return self.fees.text
+        return self.fees
 
 
     def setFees(self, fees):
@@ -87,7 +91,7 @@ class WCS:
 
 
     def getConstraints(self):
-        return self.constraints.text
+        return self.constraints
 
 
     def setConstraints(self, constraints):
@@ -118,12 +122,44 @@ class WCS:
         self.versions = versions
 
 
+    def getProfiles(self):
+        return self.profiles
+
+
+    def setProfiles(self, profiles):
+        self.profiles = profiles
+
+
+    def supportsScaling(self):
+        """
+        True if the WCS implements the Scaling extension
+        """
+
+        return any('WCS_service-extension_scaling' in profile for profile in self.profiles)
+
+
+    def supportsRangeSubsetting(self):
+        """
+        True if the WCS implements the Range Subsetting extension
+        """
+
+        return any('WCS_service-extension_range-subsetting' in profile for profile in self.profiles)
+
+
+    def supportsGeotiffEncoding(self):
+        """
+        True if the WCS takes the encoding parameters of the GeoTIFF coverage profile
+        """
+
+        return bool(self.geotiffParameters) or any('geotiff-coverage' in profile for profile in self.profiles)
+
+
     def getCRS(self):
         return self.crsx
 
 
     def setCRS(self, crs):
-        self.crs = crs
+        self.crsx = crs
 
 
     def getFormats(self):
@@ -134,9 +170,204 @@ class WCS:
         self.formats = formats
 
 
+    def getGeotiffParameters(self):
+        """
+        :return: dict of GeoTIFF encoding parameter, e.g. 'compression', and its advertised values
+        """
+
+        return self.geotiffParameters
+
+
+    def setGeotiffParameters(self, geotiffParameters):
+        self.geotiffParameters = geotiffParameters
+
+
     def getCoverageIds(self):
         return self.covIds
 
 
     def setCoverageIds(self, covIds):
         self.covIds = covIds
+        self.coverageIndex = None
+
+
+    def getBoundingBoxes(self):
+        """
+        :return: dict of coverage id and WGS84BoundingBox as [minLon, minLat, maxLon, maxLat]
+        """
+
+        return self.bboxes
+
+
+    def setBoundingBoxes(self, bboxes):
+        self.bboxes = bboxes
+        self.coverageIndex = None
+
+
+    def getCoverageIndex(self):
+        """
+        Spatial index of the coverage summaries, built on first use.
+        Values are positions in the list of coverage ids.
+        """
+
+        if self.coverageIndex is None:
+            bboxes = self.bboxes
+            self.coverageIndex = SpatialIndex(
+                (bboxes[covId], i) for i, covId in enumerate(self.covIds) if bboxes.get(covId) is not None
+            )
+            self.unindexed = [i for i, covId in enumerate(self.covIds) if bboxes.get(covId) is None]
+
+        return self.coverageIndex
+
+
+    def getCoverageIdsInExtent(self, bbox):
+        """
+        Coverages whose WGS84BoundingBox intersects bbox, in the order of the
+        capabilities. Coverages without bounding box are always included.
+
+        :param bbox: [minLon, minLat, maxLon, maxLat]
+        """
+
+        positions = self.getCoverageIndex().query(bbox) + self.unindexed
+
+        return [self.covIds[i] for i in sorted(positions)]
+
+
+class CapabilitiesReader:
+    """
+    Incremental parser of a GetCapabilities response which fills a WCS.
+    The document is fed in chunks, e.g. as they arrive from the network.
+    """
+
+
+    def __init__(self, wcs=None):
+        self.wcs = wcs if wcs is not None else WCS()
+        self.parser = xml.etree.ElementTree.XMLPullParser(events=('start', 'end'))
+        self.stack = []
+        self.crsx = []
+        self.crsNonstandard = []
+
+
+    def feed(self, data):
+        """
+        :param data: next chunk of the document
+        :return: list of dicts of the coverage summaries completed by the chunk
+        """
+
+        self.parser.feed(data)
+
+        return list(self.readEvents())
+
+
+    def close(self):
+        """
+        :return: WCS
+        """
+
+        self.parser.close()
+        for summary in self.readEvents():
+            pass
+
+        self.wcs.setCRS(self.crsx or self.crsNonstandard)
+
+        return self.wcs
+
+
+    def readEvents(self):
+        ows = '{http://www.opengis.net/ows/2.0}'
+        wcs = '{http://www.opengis.net/wcs/2.0}'
+        crs = '{http://www.opengis.net/wcs/crs/1.0}'
+        crs_nonstandard = '{http://www.opengis.net/wcs/service-extension/crs/1.0}'
+        xlink = '{http://www.w3.org/1999/xlink}'
+
+        service = self.wcs
+        stack = self.stack
+
+        for event, elem in self.parser.read_events():
+            if event == 'start':
+                stack.append(elem)
+                continue
+
+            stack.pop()
+            parent = stack[-1] if stack else None
+            parentTag = parent.tag if parent is not None else None
+            tag = elem.tag
+
+            if tag == ows + 'Operation' and parentTag == ows + 'OperationsMetadata':
+                get = elem.find(ows + 'DCP/' + ows + 'HTTP/' + ows + 'Get')
+                if elem.get('name') == 'DescribeCoverage' and get is not None:
+                    service.describeCoverageUrl = get.attrib[xlink + 'href']
+                elif elem.get('name') == 'GetCoverage' and get is not None:
+                    service.getCoverageUrl = get.attrib[xlink + 'href']
+
+            elif parentTag == ows + 'ServiceIdentification':
+                if tag == ows + 'Title':
+                    service.title = elem.text
+                elif tag == ows + 'Fees':
+                    service.fees = elem.text
+                elif tag == ows + 'AccessConstraints':
+                    service.constraints = elem.text
+                elif tag == ows + 'ServiceTypeVersion':
+                    service.versions.append(elem.text)
+                elif tag == ows + 'Profile':
+                    service.profiles.append(elem.text)
+
+            elif tag == ows + 'ProviderName' and parentTag == ows + 'ServiceProvider':
+                service.provider = elem.text
+
+            elif tag == crs + 'crsSupported' and parentTag == crs + 'CrsMetadata':
+                self.crsx.append(elem.text)
+
+            # in case of wrong crs extension implementation
+            elif tag == crs_nonstandard + 'crsSupported' and parentTag == wcs + 'Extension':
+                self.crsNonstandard.append(elem.text)
+
+            elif tag == wcs + 'formatSupported':
+                service.formats.append(elem.text)
+
+            # values of the GeoTIFF encoding extension, as list or as repeated elements
+            elif tag.startswith('{') and 'geotiff' in tag[1:tag.index('}')] and len(elem) == 0 and elem.text:
+                name = tag[tag.index('}') + 1:].lower()
+                service.geotiffParameters.setdefault(name, []).extend(elem.text.replace(',', ' ').split())
+
+            elif tag == wcs + 'CoverageSummary':
+                summary = {
+                    'id': elem.findtext(wcs + 'CoverageId'),
+                    'subtype': elem.findtext(wcs + 'CoverageSubtype'),
+                    'bbox': getBoundingBox(elem.find(ows + 'WGS84BoundingBox'), ows)
+                }
+                service.covIds.append(summary['id'])
+                service.bboxes[summary['id']] = summary['bbox']
+                service.coverageIndex = None
+                parent.remove(elem)
+                yield summary
+                continue
+
+            # sections of the document are not needed any more
+            if parent is not None and len(stack) == 1:
+                parent.remove(elem)
+
+
+def getBoundingBox(elem, ows):
+    """
+    :param elem: ows:WGS84BoundingBox or None
+    :return: [minLon, minLat, maxLon, maxLat], None if missing or invalid
+    """
+
+    if elem is None:
+        return None
+
+    try:
+        lower = [float(value) for value in elem.findtext(ows + 'LowerCorner').split()]
+        upper = [float(value) for value in elem.findtext(ows + 'UpperCorner').split()]
+    except (AttributeError, ValueError):
+        return None
+
+    if len(lower) != 2 or len(upper) != 2:
+        return None
+
+    # a box across the antimeridian has the greater longitude in the lower corner
+    if lower[0] > upper[0]:
+        return [-180.0, min(lower[1], upper[1]), 180.0, max(lower[1], upper[1])]
+
+    return [lower[0], min(lower[1], upper[1]), upper[0], max(lower[1], upper[1])]